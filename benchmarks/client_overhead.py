@@ -0,0 +1,61 @@
+"""
+    Per-request cost of building the GCP clients a /dbt request uses, fresh for every request (before)
+    versus taken from the process-wide registry in dbt_server.lib.clients (after).
+
+    Needs Application Default Credentials, e.g. `gcloud auth application-default login`:
+
+        python benchmarks/client_overhead.py --iterations 20
+"""
+import argparse
+import statistics
+import time
+
+from google.cloud import firestore, run_v2, storage
+from google.cloud.logging import Client as LoggingClient
+from google.cloud.scheduler_v1 import CloudSchedulerClient
+
+from dbt_server.lib import clients
+
+
+FRESH_CLIENTS = {
+    "storage": storage.Client,
+    "firestore": firestore.Client,
+    "logging": LoggingClient,
+    "scheduler": CloudSchedulerClient,
+    "jobs": run_v2.JobsClient,
+}
+
+SHARED_CLIENTS = {
+    "storage": clients.get_storage_client,
+    "firestore": clients.get_firestore_client,
+    "logging": clients.get_logging_client,
+    "scheduler": clients.get_scheduler_client,
+    "jobs": clients.get_jobs_client,
+}
+
+
+def timed(build_clients, iterations: int) -> list:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for build_client in build_clients.values():
+            build_client()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    clients.init_clients()
+    print(f"{'clients':<10}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}")
+    for name, build_clients in [("fresh", FRESH_CLIENTS), ("shared", SHARED_CLIENTS)]:
+        durations = timed(build_clients, args.iterations)
+        print(f"{name:<10}{statistics.mean(durations):>10.2f}{statistics.median(durations):>10.2f}{max(durations):>10.2f}")
+    clients.close_clients()
+
+
+if __name__ == "__main__":
+    main()
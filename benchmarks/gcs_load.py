@@ -0,0 +1,74 @@
+"""
+    Latency of CloudStorage.load, as used by every log poll, against the previous three-request
+    implementation (get_bucket, get_blob for the size, then download).
+
+    Runs against a local fake GCS, e.g. https://github.com/fsouza/fake-gcs-server:
+
+        docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http
+        STORAGE_EMULATOR_HOST=http://localhost:4443 python benchmarks/gcs_load.py
+"""
+import argparse
+import os
+import statistics
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage
+
+from dbt_server.lib.gcs import CloudStorage
+
+
+BUCKET_NAME = "dbt-server-benchmark"
+BLOB_NAME = "logs/benchmark/00000000000000000000-bench.txt"
+
+
+def legacy_load(client: storage.Client, file_name: str, start_byte: int = 0) -> bytes:
+    bucket = client.get_bucket(BUCKET_NAME)
+    blob = bucket.blob(file_name)
+    existing_blob = bucket.get_blob(file_name)
+    blob_size = existing_blob.size if existing_blob is not None else None
+    if blob_size is not None and blob_size > start_byte:
+        return blob.download_as_bytes(client=None, start=start_byte)
+    return b''
+
+
+def timed(function, iterations: int) -> list:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    if "STORAGE_EMULATOR_HOST" not in os.environ:
+        raise SystemExit("Set STORAGE_EMULATOR_HOST to the fake GCS server url")
+
+    client = storage.Client(project="benchmark", credentials=AnonymousCredentials())
+    bucket = client.bucket(BUCKET_NAME)
+    if not bucket.exists():
+        bucket = client.create_bucket(BUCKET_NAME)
+    log_lines = "".join(f"2024-01-01T00:00:00Z\tINFO\tlog line {i}\n" for i in range(1000))
+    bucket.blob(BLOB_NAME).upload_from_string(log_lines)
+    gcs = CloudStorage(bucket_name=BUCKET_NAME, client=client)
+
+    cases = {
+        "new data, legacy": lambda: legacy_load(client, BLOB_NAME, 100),
+        "new data, ranged GET": lambda: gcs.load(BLOB_NAME, 100),
+        "no new data, legacy": lambda: legacy_load(client, BLOB_NAME, len(log_lines)),
+        "no new data, ranged GET": lambda: gcs.load(BLOB_NAME, len(log_lines)),
+    }
+    print(f"{'case':<26}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, function in cases.items():
+        durations = timed(function, args.iterations)
+        p95 = statistics.quantiles(durations, n=20)[-1]
+        print(f"{name:<26}{statistics.mean(durations):>10.2f}{statistics.median(durations):>10.2f}{p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
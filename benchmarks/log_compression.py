@@ -0,0 +1,102 @@
+"""
+    Bytes stored and transferred for the logs of a large run, plain (before) versus gzipped (after):
+    log segments as the LogShipper writes them, /job/{uuid}/logs pages and the /job/{uuid}/stream event stream.
+    The run's logs are synthetic dbt debug JSON lines; runs offline:
+
+        python -m benchmarks.log_compression --nodes 2000 --page-size 1000
+"""
+import argparse
+import gzip
+import json
+import random
+import zlib
+
+from dbt_server.lib.state import LOG_COMPRESSION_LEVEL
+
+
+EVENTS = [
+    ("NodeStart", "debug", "Began running node {node}"),
+    ("SQLQuery", "debug", "On {node}: /* {{\"app\": \"dbt\", \"node_id\": \"{node}\"}} */ create or replace table `project`.`dataset`.`{name}` as (select * from `project`.`raw`.`{name}`)"),
+    ("SQLQueryStatus", "debug", "BigQuery adapter: https://console.cloud.google.com/bigquery?project=project&j=bq:EU:{job_id}&page=queryresults"),
+    ("LogModelResult", "info", "{index} of {total} OK created sql table model dataset.{name} [CREATE TABLE (1.2k rows, 35.4 KiB processed) in {duration:.2f}s]"),
+    ("NodeFinished", "debug", "Finished running node {node}"),
+]
+
+
+def run_logs(nodes: int) -> list:
+    random_ = random.Random(0)
+    logs = []
+    for index in range(1, nodes + 1):
+        name = f"model_{index}"
+        for event, level, msg in EVENTS:
+            logs.append(json.dumps({
+                "info": {
+                    "name": event, "level": level, "ts": f"2024-01-01T12:{index // 60 % 60:02d}:{index % 60:02d}.{random_.randrange(10**6):06d}Z",
+                    "invocation_id": "6a9d3b5e-6b0e-4c5b-9c3e-2f3d1a7b8c9d", "thread": f"Thread-{index % 8 + 1}",
+                    "msg": msg.format(node=f"model.project.{name}", name=name, index=index, total=nodes,
+                                      job_id=f"{random_.getrandbits(128):032x}", duration=random_.uniform(1, 30)),
+                },
+                "data": {"node_info": {"unique_id": f"model.project.{name}", "resource_type": "model", "materialized": "table"}},
+            }))
+    return logs
+
+
+def segments(logs: list, flush_size_bytes: int) -> list:
+    segments, pending, pending_bytes = [], [], 0
+    for log in logs:
+        pending.append(log)
+        pending_bytes += len(log.encode('utf-8')) + 1
+        if pending_bytes >= flush_size_bytes:
+            segments.append("".join(f"{log}\n" for log in pending).encode('utf-8'))
+            pending, pending_bytes = [], 0
+    if pending:
+        segments.append("".join(f"{log}\n" for log in pending).encode('utf-8'))
+    return segments
+
+
+def pages(logs: list, page_size: int) -> list:
+    return [
+        json.dumps({"run_logs": logs[start:start + page_size], "next_offset": 0, "run_status": "success", "uuid": "uuid"}).encode('utf-8')
+        for start in range(0, len(logs), page_size)
+    ]
+
+
+def event_stream(logs: list, lines_per_poll: int) -> list:
+    return [
+        "".join(f"id: {index}\ndata: {log}\n\n" for index, log in enumerate(logs[start:start + lines_per_poll], start)).encode('utf-8')
+        for start in range(0, len(logs), lines_per_poll)
+    ]
+
+
+def gzipped_stream(chunks: list) -> list:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    return [compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) for chunk in chunks] + [compressor.flush()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--flush-size-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--lines-per-poll", type=int, default=50)
+    args = parser.parse_args()
+
+    logs = run_logs(args.nodes)
+    stored = segments(logs, args.flush_size_bytes)
+    logs_pages = pages(logs, args.page_size)
+    stream = event_stream(logs, args.lines_per_poll)
+
+    results = [
+        ("segments", stored, [gzip.compress(segment, compresslevel=LOG_COMPRESSION_LEVEL, mtime=0) for segment in stored]),
+        ("/logs", logs_pages, [gzip.compress(page, compresslevel=6) for page in logs_pages]),
+        ("/stream", stream, gzipped_stream(stream)),
+    ]
+    print(f"{len(logs)} log lines")
+    print(f"{'':<10}{'plain KiB':>12}{'gzip KiB':>12}{'ratio':>8}")
+    for name, plain, compressed in results:
+        plain_bytes, compressed_bytes = sum(map(len, plain)), sum(map(len, compressed))
+        print(f"{name:<10}{plain_bytes / 1024:>12.1f}{compressed_bytes / 1024:>12.1f}{plain_bytes / compressed_bytes:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+    Compares the job's two manifest loading paths, from manifest.json and from the msgpack form the
+    server pre-serializes, on synthetic manifests of increasing size.
+
+    Synthetic manifests are built by duplicating the models of a base manifest, e.g. the one of the
+    test project (`cd tests/dbt_project && dbt parse`):
+
+        python benchmarks/manifest_loading.py --manifest tests/dbt_project/target/manifest.json
+
+    Each load runs in a fresh process to measure cold-start parse time and peak RSS.
+
+    With dbt-core 1.7.9 on a single CPU, from the test project's manifest:
+
+        size       nodes   json MB  loader     seconds   peak RSS MB  RSS delta MB
+        small        108       0.7  json          0.04            69             4
+        small        108       0.7  msgpack       0.02            68             3
+        medium      2008       4.9  json          0.51           108            43
+        medium      2008       4.9  msgpack       0.37            92            27
+        large      20008      44.7  json          5.37           477           263
+        large      20008      44.7  msgpack       3.63           332           118
+"""
+import argparse
+import copy
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+
+import msgpack
+
+
+SIZES = {"small": 100, "medium": 2_000, "large": 20_000}
+
+LOADER = """
+import resource, sys, time
+from dbt_server.lib.manifest import load_manifest_from_json, load_manifest_from_msgpack
+loader = load_manifest_from_msgpack if sys.argv[1].endswith(".msgpack") else load_manifest_from_json
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+manifest = loader(sys.argv[1])
+duration = time.perf_counter() - start
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(duration, rss_before, rss_after)
+"""
+
+
+def build_synthetic_manifest(base_manifest: dict, nodes_count: int) -> dict:
+    manifest = copy.deepcopy(base_manifest)
+    models = [node for node in base_manifest["nodes"].values() if node["resource_type"] == "model"]
+    for i in range(nodes_count):
+        node = copy.deepcopy(models[i % len(models)])
+        node["name"] = f"{node['name']}_{i}"
+        node["unique_id"] = f"model.{node['package_name']}.{node['name']}"
+        node["fqn"] = node["fqn"][:-1] + [node["name"]]
+        manifest["nodes"][node["unique_id"]] = node
+        manifest["parent_map"][node["unique_id"]] = node["depends_on"]["nodes"]
+        manifest["child_map"][node["unique_id"]] = []
+    return manifest
+
+
+def measure(manifest_path: Path) -> dict:
+    repo_root = Path(__file__).parent.parent
+    output = subprocess.check_output([sys.executable, "-c", LOADER, str(manifest_path)], cwd=repo_root, text=True)
+    duration, rss_before, rss_after = output.split()
+    return {"seconds": float(duration), "peak_rss_mb": int(rss_after) / 1024, "rss_delta_mb": (int(rss_after) - int(rss_before)) / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", required=True, help="Base manifest.json whose models are duplicated")
+    args = parser.parse_args()
+
+    with open(args.manifest, "r") as f:
+        base_manifest = json.load(f)
+
+    print(f"{'size':<8}{'nodes':>8}{'json MB':>10}  {'loader':<8}{'seconds':>10}{'peak RSS MB':>14}{'RSS delta MB':>14}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size, nodes_count in SIZES.items():
+            manifest = build_synthetic_manifest(base_manifest, nodes_count)
+            json_path = Path(temp_dir) / f"{size}.json"
+            json_path.write_text(json.dumps(manifest))
+            msgpack_path = Path(temp_dir) / f"{size}.msgpack"
+            msgpack_path.write_bytes(msgpack.packb(manifest))
+
+            for loader, path in [("json", json_path), ("msgpack", msgpack_path)]:
+                result = measure(path)
+                print(f"{size:<8}{len(manifest['nodes']):>8}{json_path.stat().st_size / 1e6:>10.1f}  {loader:<8}"
+                      f"{result['seconds']:>10.2f}{result['peak_rss_mb']:>14.0f}{result['rss_delta_mb']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
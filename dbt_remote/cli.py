@@ -2,8 +2,11 @@ from dbt.cli import main as dbt_cli, params as dbt_p
 from dbt.cli.main import global_flags
 import click
 from click_aliases import ClickAliasedGroup
+from pathlib import Path
 
+from dbt_remote.src.cli_artifacts import download_run_artifacts
 from dbt_remote.src.cli_local_config import LocalCliConfig
+from dbt_remote.src.cli_profile import print_profile
 from dbt_remote.src.cli_schedules import Schedules
 from dbt_remote.src.cli_utils import run_and_echo
 from dbt_remote.src.dbt_server_detector import detect_dbt_server_uri
@@ -78,6 +81,7 @@ def cli(ctx, **kwargs):
 @p.location
 @p.schedule
 @p.schedule_name
+@p.remote_state
 def dbt(ctx, args, **kwargs):
     getattr(dbt_cli, ctx.info_name).make_context(info_name=ctx.info_name, args=list(args))  # Validates user input
     cli_input = CliInput.from_click_context(ctx)
@@ -200,6 +204,51 @@ def logs(ctx, **kwargs):
         click.echo(log)
 
 
+# ------------------ PROFILE -------------------- #
+
+@cli.command(
+    "profile",
+    context_settings={"help_option_names": ["-h", "--help"]},
+    no_args_is_help=True,
+)
+@p.run_id
+@click.option("--top", default=10, show_default=True, help="Number of slowest nodes to show.")
+@p.server_url
+@p.location
+@click.pass_context
+def profile(ctx, **kwargs):
+    """Show where a run spent its time: stages, slowest nodes and critical path."""
+    server_url = detect_dbt_server_uri(ctx.params["location"]) if ctx.params["server_url"] is None else ctx.params["server_url"]
+    server = DbtServer(server_url)
+    run_profile = server.get_profile(ctx.params["run_id"])
+    if run_profile is None:
+        click.echo(f"No profile for run {ctx.params['run_id']}: the run has not finished yet")
+        return
+    print_profile(run_profile, ctx.params["top"])
+
+
+# ------------------ ARTIFACTS -------------------- #
+
+@cli.command(
+    "artifacts",
+    context_settings={"help_option_names": ["-h", "--help"]},
+    no_args_is_help=True,
+)
+@p.run_id
+@click.argument("names", nargs=-1)
+@click.option("--output-dir", default=None, help="Where to download the artifacts. Defaults to target/runs/<run-id>.")
+@p.server_url
+@p.location
+@click.pass_context
+def artifacts(ctx, **kwargs):
+    """Download a run's artifacts (run_results.json, manifest.json, compiled SQL...), e.g. to use them with --state."""
+    server_url = detect_dbt_server_uri(ctx.params["location"]) if ctx.params["server_url"] is None else ctx.params["server_url"]
+    server = DbtServer(server_url)
+    output_dir = Path(ctx.params["output_dir"] or Path("target") / "runs" / ctx.params["run_id"])
+    click.echo(click.style(f"Downloading artifacts of run {ctx.params['run_id']}:", bold=True))
+    download_run_artifacts(server, ctx.params["run_id"], ctx.params["names"], output_dir)
+
+
 if __name__ == '__main__':
     try:
         cli()
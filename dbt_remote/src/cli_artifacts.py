@@ -0,0 +1,31 @@
+from pathlib import Path
+import tarfile
+from typing import Iterable
+
+import click
+
+from dbt_remote.src.dbt_server import DbtServer
+
+
+def download_run_artifacts(server: DbtServer, run_id: str, names: Iterable[str], output_dir: Path) -> None:
+    """
+        Downloads the run's artifacts to `output_dir` (all of them if no name is given). The compiled/ and run/
+        folders are sent as tar files, which are extracted. The folder can then be used with dbt's --state.
+    """
+    names = list(names) or server.list_artifacts(run_id)
+    for name in names:
+        destination = output_dir / name
+        server.download_artifact(run_id, name, destination)
+        if name.endswith(".tar"):
+            extract_tar(destination, output_dir)
+            destination.unlink()
+        click.echo(f"   {output_dir / name.removesuffix('.tar')}")
+
+
+def extract_tar(tar_path: Path, output_dir: Path) -> None:
+    with tarfile.open(tar_path) as tar:
+        for member in tar.getmembers():
+            member_path = (output_dir / member.name).resolve()
+            if not member_path.is_relative_to(output_dir.resolve()) or not (member.isfile() or member.isdir()):
+                raise click.ClickException(f"Unexpected file in {tar_path.name}: {member.name}")
+        tar.extractall(output_dir)
@@ -29,6 +29,7 @@ class CliInput:
     artifact_registry: Optional[str] = None
     schedule: Optional[str] = None
     schedule_name: Optional[str] = None
+    remote_state: Optional[str] = None
 
     @classmethod
     def from_click_context(cls, ctx):
@@ -52,6 +53,7 @@ class CliInput:
             artifact_registry=ctx.params.get('artifact_registry'),
             schedule=ctx.params.get('schedule'),
             schedule_name=ctx.params.get('schedule_name'),
+            remote_state=ctx.params.get('remote_state'),
         )
 
     def __post_init__(self):
@@ -59,6 +61,9 @@ class CliInput:
         if self.command in ["image", "submit", "config"]:
             return
 
+        if self.remote_state is not None and any(arg == "--state" or arg.startswith("--state=") for arg in self.args):
+            raise click.UsageError("--remote-state and --state cannot be used together")
+
         self.load_local_config()
         self.profiles_dir = self.find_profiles_dir()
         self.server_url = self.get_server_url()
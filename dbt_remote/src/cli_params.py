@@ -74,6 +74,11 @@ schedule_name = click.option(
     help='Name of the cloud scheduler job. If none is given, dbt-remote-<uuid> will be used'
 )
 
+remote_state = click.option(
+    '--remote-state',
+    help='Use the manifest of the latest successful build/run/seed/snapshot on this target (ex: prod) or of this schedule (ex: schedule:nightly) as --state, for state:modified selection or --defer.'
+)
+
 artifact_registry = click.option(
     '--artifact-registry',
     envvar='ARTIFACT_REGISTRY',
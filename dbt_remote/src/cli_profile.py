@@ -0,0 +1,22 @@
+from typing import Dict
+
+import click
+
+
+def print_profile(profile: Dict, top: int = 10) -> None:
+    nodes = profile["nodes"]
+
+    click.echo(click.style(f"Run {profile['uuid']} ({profile['run_status']}): {profile['total_seconds']:.1f}s", bold=True))
+
+    click.echo(click.style("\nStages:", bold=True))
+    for stage, seconds in profile["stages"].items():
+        click.echo(f"   {stage}: {seconds:.1f}s")
+
+    slowest = sorted(nodes, key=lambda unique_id: nodes[unique_id]["duration"], reverse=True)[:top]
+    click.echo(click.style(f"\nSlowest nodes ({len(slowest)} of {len(nodes)}):", bold=True))
+    for unique_id in slowest:
+        click.echo(f"   {nodes[unique_id]['duration']:8.1f}s  {unique_id} ({nodes[unique_id]['status']})")
+
+    click.echo(click.style(f"\nCritical path: {profile['critical_path_seconds']:.1f}s", bold=True))
+    for unique_id in profile["critical_path"]:
+        click.echo(f"   {nodes[unique_id]['start']:8.1f}s  +{nodes[unique_id]['duration']:.1f}s  {unique_id}")
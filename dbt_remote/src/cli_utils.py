@@ -16,8 +16,8 @@ def run_and_echo(cli_input: CliInput) -> None:
 
     click.echo(click.style(response.message, blink=True, bold=True))
 
-    if response.links is not None and "last_logs" in response.links:
+    if response.links is not None and "stream" in response.links:
         click.echo('Waiting for job execution...')
-        logs = server.stream_logs(response.links["last_logs"])
+        logs = server.stream_logs(response.links["stream"])
         for log in logs:
             click.echo(log)
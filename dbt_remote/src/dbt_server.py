@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone
+import hashlib
 import io
+import json
 from pathlib import Path
 import re
 from subprocess import check_output
 from time import sleep
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 import zipfile
 import requests
 
@@ -16,6 +18,7 @@ from google.auth.transport.requests import Request
 from google.cloud import iam_credentials_v1
 import google.oauth2.id_token
 
+from dbt_remote.src.manifest_delta import ManifestBaseCache, compute_manifest_delta, serialize_manifest
 from dbt_remote.version import __version__
 
 @dataclass
@@ -27,9 +30,12 @@ class DbtServerCommand:
     packages: Optional[Path] | str
     manifest: Path
     seeds: Optional[Path]
+    cache_dir: Optional[Path] = None
+    artifacts: Dict[str, str] = None  # {path in the zip: sha256}
     zipped_artifacts: bytes = None
     schedule: Optional[str] = None
     schedule_name: Optional[str] = None
+    remote_state: Optional[str] = None
 
     @classmethod
     def from_cli_config(cls, cli_config):
@@ -41,39 +47,68 @@ class DbtServerCommand:
             manifest=Path(cli_config.manifest) / "manifest.json",
             packages=Path(cli_config.extra_packages) / "packages.yml" if cli_config.extra_packages is not None else None,
             seeds=Path(cli_config.seeds_path) if cli_config.seeds_path is not None else {},
+            cache_dir=Path(cli_config.project_dir) / "target" / "dbt_remote",
             schedule=cli_config.schedule,
             schedule_name=cli_config.schedule_name,
+            remote_state=cli_config.remote_state,
         )
 
     def __post_init__(self):
         self.dbt_project = self.read_file(self.dbt_project)
         self.profiles = self.read_file(self.profiles)
         self.packages = self.read_file(self.packages) if self.packages is not None else {}
-        self.zipped_artifacts = self.zip_artifacts()
-
-    def zip_artifacts(self) -> Path:
+        self.artifacts = {path: hashlib.sha256(self.artifact_bytes(path, file_path)).hexdigest() for path, file_path in self.artifact_files().items()}
+
+    def artifact_files(self) -> Dict[str, Path]:
+        files = {'manifest.json': self.manifest}
+        for seed_file in self.seeds.iterdir():
+            if seed_file.name.lower().endswith('.csv'):
+                files['seeds/' + seed_file.name] = seed_file
+        return files
+
+    def zip_artifacts(self, paths: Iterable[str]) -> io.BytesIO:
+        """
+            Zips the given artifacts only: the others are already stored on the server and are referenced by hash.
+        """
+        artifact_files = self.artifact_files()
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, 'w') as zipf:
-            zipf.writestr('manifest.json', self.read_file(self.manifest))
-            for seed_file in self.seeds.iterdir():
-                if seed_file.name.lower().endswith('.csv'):
-                    seed_name = seed_file.name
-                    seed_content = self.read_file(seed_file)
-                    zipf.writestr('seeds/' + seed_name, seed_content)
+            for path in paths:
+                zipf.writestr(path, self.artifact_bytes(path, artifact_files[path]))
         zip_buffer.seek(0)
         return zip_buffer
 
+    def artifact_bytes(self, path: str, file_path: Path) -> bytes:
+        if path == 'manifest.json':
+            with open(file_path, 'r') as f:
+                return serialize_manifest(json.load(f))
+        return self.read_bytes(file_path)
+
+    def manifest_delta(self, base: ManifestBaseCache) -> Optional[bytes]:
+        """
+            Node-level diff of the manifest against the cached base, or None when it is not smaller than the manifest.
+        """
+        with open(self.manifest, 'r') as f:
+            manifest = json.load(f)
+        delta = json.dumps(compute_manifest_delta(base.load(), manifest, base.hash)).encode('utf-8')
+        return delta if len(delta) < self.manifest.stat().st_size else None
+
     def read_file(self, file_path: Path) -> str:
         with open(file_path, 'r') as f:
             file_str = f.read()
         return file_str
 
+    def read_bytes(self, file_path: Path) -> bytes:
+        with open(file_path, 'rb') as f:
+            return f.read()
+
 
 class DbtServerResponse(BaseModel):
     status_code: Optional[str] = None
     uuid: Optional[str] = None
     message: Optional[str] = None
     detail: Optional[str] = None
+    manifest_hash: Optional[str] = None
     links: Optional[Dict[str, str]] = None
 
 
@@ -81,6 +116,7 @@ class DbtServerLogResponse(BaseModel):
     status_code: Optional[str] = None
     run_status: Optional[str] = None
     run_logs: Optional[List[str]] = None
+    next_offset: Optional[int] = None
 
 
 @dataclass
@@ -113,6 +149,36 @@ class DbtLogEntry:
 
         return f"{colored(self.log_level, level_color)}    {colored(self.message, message_color)}"
 
+@dataclass
+class ServerSentEvent:
+    event: str = "message"
+    data: str = ""
+    id: Optional[str] = None
+
+
+def parse_server_sent_events(lines: Iterator[str]) -> Iterator[ServerSentEvent]:
+    event = ServerSentEvent()
+    data_lines = []
+    for line in lines:
+        if line == "":
+            if data_lines:
+                event.data = "\n".join(data_lines)
+                yield event
+            event = ServerSentEvent(id=event.id)
+            data_lines = []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "data":
+                data_lines.append(value)
+            elif field == "event":
+                event.event = value
+            elif field == "id":
+                event.id = value
+
+
 class DbtServer:
     def __init__(self, server_url: str):
         self.server_url = server_url
@@ -127,15 +193,19 @@ class DbtServer:
             raise ServerVersionMismatch(server_version, __version__)
 
     def send_command(self, command: DbtServerCommand) -> DbtServerResponse:
-        endpoint = "dbt" if command.schedule is None else "schedule"
-        url = self.server_url + endpoint
+        manifest_base = ManifestBaseCache(command.cache_dir) if command.cache_dir is not None else None
+        base_hash = manifest_base.hash if manifest_base is not None else None
 
-        data = {
-            "server_url": self.server_url,
-            **{k: v for k, v in command.__dict__.items() if k not in ["manifest", "seeds", "zipped_artifacts"]}
-        }
+        missing_hashes = set(self.get_missing_artifacts([*command.artifacts.values(), *([base_hash] if base_hash else [])]))
+
+        manifest_delta = None
+        if command.artifacts["manifest.json"] in missing_hashes and base_hash is not None and base_hash not in missing_hashes:
+            manifest_delta = command.manifest_delta(manifest_base)
 
-        raw_response = self.auth_session.post(url=url, data=data, files={"zipped_artifacts": command.zipped_artifacts})
+        raw_response = self.post_command(command, missing_hashes, manifest_delta)
+        if manifest_delta is not None and raw_response.status_code == 400:
+            # The manifest rebuilt by the server does not match this one (or the base is gone): send it whole
+            raw_response = self.post_command(command, missing_hashes)
 
         response = DbtServerResponse.parse_raw(raw_response.text)
         response.status_code = raw_response.status_code
@@ -143,23 +213,102 @@ class DbtServer:
         if response.status_code >= 400 or response.detail is not None:
             raise Exception(f"Error {response.status_code} sending command to server: {response.detail}")
 
+        if manifest_base is not None and response.manifest_hash is not None:
+            manifest_base.save(response.manifest_hash, command.manifest)
+
         return response
 
-    def stream_logs(self, logs_link: str):
-        run_status = "pending"
-        while run_status in ["pending", "running"]:
-            sleep(1)
-            raw_response = self.auth_session.get(url=logs_link)
-            response = DbtServerLogResponse.parse_raw(raw_response.text)
-            run_status = response.run_status
+    def post_command(self, command: DbtServerCommand, missing_hashes: Iterable[str], manifest_delta: bytes = None) -> requests.Response:
+        """
+            Sends the command with the missing artifacts. With a manifest delta, the manifest is replaced by the
+            delta and its hash, which the server checks the manifest it rebuilds against.
+        """
+        endpoint = "dbt" if command.schedule is None else "schedule"
+        artifacts = dict(command.artifacts)
+        files, manifest_fields = {}, {}
+        if manifest_delta is not None:
+            manifest_fields["manifest_hash"] = artifacts.pop("manifest.json")
+            files["manifest_delta"] = manifest_delta
 
-            for log in response.run_logs:
-                yield DbtLogEntry.from_raw_entry(log)
+        command.zipped_artifacts = command.zip_artifacts(path for path, artifact_hash in artifacts.items() if artifact_hash in missing_hashes)
+        files["zipped_artifacts"] = command.zipped_artifacts
 
-    def get_logs(self, uuid: str):
-        raw_response = self.auth_session.get(url=f"{self.server_url}job/{uuid}/logs")
-        response = DbtServerLogResponse.parse_raw(raw_response.text)
-        return response.run_logs
+        data = {
+            "server_url": self.server_url,
+            "artifacts": json.dumps(artifacts),
+            **manifest_fields,
+            **{k: v for k, v in command.__dict__.items() if k not in ["manifest", "seeds", "cache_dir", "artifacts", "zipped_artifacts"]}
+        }
+        return self.auth_session.post(url=self.server_url + endpoint, data=data, files=files)
+
+    def get_missing_artifacts(self, hashes: Iterable[str]) -> List[str]:
+        raw_response = self.auth_session.post(url=f"{self.server_url}artifacts/missing", json={"hashes": list(hashes)})
+        raw_response.raise_for_status()
+        return raw_response.json()["missing"]
+
+    def stream_logs(self, stream_link: str):
+        """
+            Follows the job's Server-Sent Events log stream until the server sends the `end` event.
+            If the connection drops (e.g. the server request timeout is reached), it reconnects and
+            resumes after the last received line using the Last-Event-ID header.
+        """
+        last_event_id = None
+        while True:
+            headers = {"Accept": "text/event-stream", "Accept-Encoding": "gzip"}  # requests decompresses it
+            if last_event_id is not None:
+                headers["Last-Event-ID"] = last_event_id
+
+            try:
+                with self.auth_session.get(url=stream_link, headers=headers, stream=True, timeout=(10, 60)) as raw_response:
+                    raw_response.raise_for_status()
+                    lines = raw_response.iter_lines(chunk_size=None, decode_unicode=True, delimiter="\n")
+                    for event in parse_server_sent_events(lines):
+                        last_event_id = event.id if event.id is not None else last_event_id
+                        if event.event == "end":
+                            return
+                        yield DbtLogEntry.from_raw_entry(event.data)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.exceptions.Timeout):
+                pass
+
+            sleep(1)
+
+    def get_logs(self, uuid: str, page_size: int = 5000) -> List[str]:
+        logs, offset = [], 0
+        while True:
+            raw_response = self.auth_session.get(
+                url=f"{self.server_url}job/{uuid}/logs", params={"offset": offset, "limit": page_size}, headers={"Accept-Encoding": "gzip"},
+            )
+            response = DbtServerLogResponse.parse_raw(raw_response.text)
+            logs += response.run_logs
+            if len(response.run_logs) < page_size:
+                return logs
+            offset = response.next_offset
+
+    def get_profile(self, uuid: str) -> Optional[Dict]:
+        """
+            Stage and node timings of a finished run, None if the run has no profile (yet).
+        """
+        raw_response = self.auth_session.get(url=f"{self.server_url}job/{uuid}/profile")
+        if raw_response.status_code == 404:
+            return None
+        raw_response.raise_for_status()
+        return raw_response.json()
+
+    def list_artifacts(self, uuid: str) -> List[str]:
+        raw_response = self.auth_session.get(url=f"{self.server_url}job/{uuid}/artifacts")
+        raw_response.raise_for_status()
+        return raw_response.json()["artifacts"]
+
+    def download_artifact(self, uuid: str, name: str, destination: Path) -> None:
+        """
+            Streams a run artifact to `destination`. The server sends job outputs gzipped, requests decompresses them.
+        """
+        with self.auth_session.get(url=f"{self.server_url}job/{uuid}/artifacts/{name}", stream=True) as raw_response:
+            raw_response.raise_for_status()
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            with open(destination, 'wb') as f:
+                for chunk in raw_response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
 
     def list_schedules(self) -> Dict[str, str]:
         raw_response = self.auth_session.get(url=f"{self.server_url}schedule")
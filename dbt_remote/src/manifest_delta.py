@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+import shutil
+from typing import Dict, Optional
+
+
+def compute_manifest_delta(base_manifest: Dict, manifest: Dict, base_hash: str) -> Dict:
+    """
+        Node-level diff between two manifests. Sections that are dicts in both (nodes, sources, macros...)
+        are compared entry by entry, other top-level keys are sent whole when they changed.
+    """
+    entries, replaced = {}, {}
+    for key, value in manifest.items():
+        base_value = base_manifest.get(key)
+        if isinstance(value, dict) and isinstance(base_value, dict):
+            changed = {unique_id: entry for unique_id, entry in value.items() if unique_id not in base_value or base_value[unique_id] != entry}
+            removed = [unique_id for unique_id in base_value if unique_id not in value]
+            if changed or removed:
+                entries[key] = {"changed": changed, "removed": removed}
+        elif key not in base_manifest or value != base_value:
+            replaced[key] = value
+
+    return {
+        "base": base_hash,
+        "entries": entries,
+        "replaced": replaced,
+        "removed": [key for key in base_manifest if key not in manifest],
+    }
+
+
+def serialize_manifest(manifest: Dict) -> bytes:
+    """
+        Canonical JSON form in which the manifest is hashed and sent. The server stores the manifests it
+        rebuilds from a delta in the same form (dbt_server/lib/manifest_delta.py), so their hashes match.
+    """
+    return json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode('utf-8')
+
+
+class ManifestBaseCache:
+    """
+        Local copy of the last manifest sent to the server, with the hash the server stored it under.
+        It is the base the next command's manifest delta is computed against.
+    """
+    MANIFEST_FILE = "base_manifest.json"
+    HASH_FILE = "base_manifest.sha256"
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+
+    @property
+    def hash(self) -> Optional[str]:
+        hash_path = self.cache_dir / self.HASH_FILE
+        if not hash_path.exists() or not (self.cache_dir / self.MANIFEST_FILE).exists():
+            return None
+        return hash_path.read_text().strip()
+
+    def load(self) -> Dict:
+        with open(self.cache_dir / self.MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+
+    def save(self, manifest_hash: str, manifest_path: Path) -> None:
+        if manifest_hash == self.hash:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / self.HASH_FILE).unlink(missing_ok=True)  # Never leave a hash next to another manifest
+        shutil.copyfile(manifest_path, self.cache_dir / self.MANIFEST_FILE)
+        (self.cache_dir / self.HASH_FILE).write_text(manifest_hash)
@@ -1,9 +1,16 @@
+import atexit
+from collections import OrderedDict
+from datetime import datetime, timezone
+import json
 import logging
 import os
-from typing import List
-import msgpack
-import json
+from pathlib import Path
+import pickle
+import tarfile
+from typing import Dict, List
 import threading
+import time
+import traceback
 
 from click.parser import split_arg_string
 from dbt.cli.main import dbtRunner, dbtRunnerResult
@@ -11,34 +18,176 @@ from dbt.events.base_types import EventMsg
 from dbt.events.functions import msg_to_json
 from dbt.contracts.graph.manifest import Manifest
 from dbt.contracts.graph.nodes import SeedNode
-from fastapi import HTTPException
+import yaml
 
+from dbt_server.lib.latest_runs import STATE_PRODUCING_COMMANDS, LatestRuns, run_keys
 from dbt_server.lib.logger import DbtLogger
+from dbt_server.lib.manifest import load_manifest_from_json, load_manifest_from_msgpack
+from dbt_server.lib.log_shipper import LogShipper
+from dbt_server.lib.package_cache import PackageCache, packages_install_path
+from dbt_server.lib.run_profile import RunProfile
 from dbt_server.lib.state import State
+from dbt_server.lib.tracing import DbtNodeSpans, context_from_traceparent, flush_traces, init_tracing, tracer
 
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 DBT_COMMAND = os.getenv("DBT_COMMAND")
 UUID = os.getenv("UUID")
+TRACEPARENT = os.getenv("TRACEPARENT")
+LOG_FLUSH_INTERVAL_MS = int(os.getenv("LOG_FLUSH_INTERVAL_MS", "500"))
+LOG_FLUSH_SIZE_KB = int(os.getenv("LOG_FLUSH_SIZE_KB", "64"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+MANIFEST_CACHE_SIZE = int(os.getenv("MANIFEST_CACHE_SIZE", "2"))
+TARGET_FILES = ["run_results.json", "sources.json", "catalog.json", "manifest.json", "semantic_manifest.json", "graph_summary.json"]
+TARGET_FOLDERS = ["compiled", "run"]  # Uploaded as one tar file each
 
 
 callback_lock = threading.Lock()
-logger = DbtLogger(server=False)
-state = State.from_uuid(UUID)
-logger.state = state
+logger: DbtLogger = None
+state: State = None
+log_shipper: LogShipper = None
+run_profile: RunProfile = None
+run_status: str = None  # Outcome of the last dbt command, only written to the State when the job ends
+manifest_cache: "OrderedDict[str, bytes]" = OrderedDict()  # Pickled manifests by msgpack hash, for processes running several jobs
 
 
-def prepare_and_execute_job() -> None:
-    state.save_context_to_local()
-    manifest = get_manifest()
-    manifest = override_manifest_with_correct_seed_path(manifest)
-    install_dependencies(manifest)
-    run_dbt_command(manifest, DBT_COMMAND)
+def init_job(uuid: str) -> None:
+    """
+        Sets up the job's logger, State and log shipper. A process can run several jobs one after the other
+        (see the local executor), so they are module globals re-initialized for each job.
+    """
+    global logger, state, log_shipper, run_profile, run_status
+    init_tracing("dbt-job")
+    run_status = None
+    run_profile = RunProfile()
+    logger = DbtLogger(server=False)
+    state = State.from_uuid(uuid)
+    log_shipper = LogShipper(
+        state.run_logs,
+        flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+        flush_size_bytes=LOG_FLUSH_SIZE_KB * 1024,
+        max_queue_size=LOG_QUEUE_SIZE,
+    ).start()
+    atexit.register(log_shipper.close)
+    state.log_shipper = log_shipper
+    logger.state = state
+
+
+def run_job(uuid: str, dbt_command: str, traceparent: str = None) -> None:
+    """
+        `traceparent` is the trace context of the server request that started the job, if any.
+    """
+    init_job(uuid)
+    started_at = time.monotonic()
+    run_started_at = datetime.now(timezone.utc)
+    logger.log("INFO", f"[job] Job {uuid} started")
+    try:
+        with tracer.start_as_current_span("run_job", context=context_from_traceparent(traceparent), attributes={"dbt.uuid": uuid}):
+            prepare_and_execute_job(dbt_command)
+    finally:
+        log_shipper.close()
+        atexit.unregister(log_shipper.close)
+        logger.logger.info(f"[job] Log shipper stats: {log_shipper.stats()}")
+        with run_profile.stage("upload_artifacts"):
+            upload_target_artifacts()
+        final_status = "success" if run_status == "success" else "failed"
+        record_latest_run(dbt_command, final_status, run_started_at)
+        save_run_profile(final_status)
+        finish_run(final_status, time.monotonic() - started_at)
+        flush_traces()
+
+
+def finish_run(final_status: str, duration_seconds: float) -> None:
+    """
+        Sets the run's final status together with its summary, for the server's /metrics: the job itself
+        is not scraped, and the server reports the summary when it first reads the finished run's State.
+    """
+    shipper_stats = log_shipper.stats()
+    try:
+        state.update(run_status=final_status, metrics={
+            "run_status": final_status,
+            "duration_seconds": duration_seconds,
+            "log_lines": shipper_stats["shipped_lines"],
+            "log_bytes": shipper_stats["shipped_bytes"],
+            "dropped_log_lines": shipper_stats["dropped_lines"],
+        })
+    except Exception:
+        logger.logger.error(f"[job] Could not store the run's final status: {traceback.format_exc()}")
+
+
+def upload_target_artifacts() -> None:
+    """
+        Stores the artifacts dbt wrote to its target folder as the run's outputs, served at /job/<uuid>/artifacts/<name>,
+        since the job's container and working directory are discarded when it ends.
+    """
+    try:
+        state.save_output_files(collect_target_artifacts(target_path()))
+    except Exception:
+        logger.logger.error(f"[job] Could not upload the run's artifacts: {traceback.format_exc()}")
+
+
+def record_latest_run(dbt_command: str, final_status: str, run_started_at: datetime) -> None:
+    """
+        Makes this run the reference state of its target (and schedule) for later runs' --remote-state,
+        once it has successfully built the project's models.
+    """
+    command_name = (split_arg_string(dbt_command) or [None])[0]
+    if command_name not in STATE_PRODUCING_COMMANDS:
+        return
+    try:
+        manifest_hash = (state.artifacts or {}).get("manifest.json")
+        if final_status == "success" and manifest_hash is not None and state.concurrency_key is not None:
+            LatestRuns(state.gcs).record(run_keys(state.concurrency_key, state.schedule_name), state.uuid, manifest_hash, run_started_at)
+    except Exception:
+        logger.logger.error(f"[job] Could not record the run as its target's latest: {traceback.format_exc()}")
+
+
+def target_path() -> Path:
+    if not os.path.isfile('dbt_project.yml'):
+        return Path('target')
+    with open('dbt_project.yml', 'r') as f:
+        return Path((yaml.safe_load(f) or {}).get('target-path', 'target'))
+
+
+def collect_target_artifacts(target: Path) -> Dict[str, Path]:
+    files = {name: target / name for name in TARGET_FILES if (target / name).is_file()}
+    for folder in TARGET_FOLDERS:
+        if (target / folder).is_dir():
+            with tarfile.open(target / f"{folder}.tar", "w") as tar:
+                tar.add(target / folder, arcname=folder)
+            files[f"{folder}.tar"] = target / f"{folder}.tar"
+    return files
+
+
+def save_run_profile(final_status: str) -> None:
+    """
+        Stores the stage and node timings of the run as its profile.json output, served at /job/<uuid>/profile.
+    """
+    try:
+        profile = run_profile.to_dict(state.uuid, final_status)
+        state.save_output("profile.json", json.dumps(profile, separators=(",", ":")).encode('utf-8'))
+    except Exception:
+        logger.logger.error(f"[job] Could not store the run profile: {traceback.format_exc()}")
+
+
+@tracer.start_as_current_span("prepare_and_execute_job")
+def prepare_and_execute_job(dbt_command: str = DBT_COMMAND) -> None:
+    with run_profile.stage("context_download"):
+        state.save_context_to_local()
+    with run_profile.stage("manifest_load"):
+        manifest = get_manifest()
+        manifest = override_manifest_with_correct_seed_path(manifest)
+    run_profile.manifest = manifest
+    with run_profile.stage("deps"):
+        install_dependencies(manifest)
+    with run_profile.stage("invoke"):
+        run_dbt_command(manifest, dbt_command)
 
     with callback_lock:
         logger.log("INFO", "[job] Command successfully executed")
     logger.log("INFO", "[job] dbt-remote job finished")
 
 
+@tracer.start_as_current_span("install_dependencies")
 def install_dependencies(manifest: Manifest) -> None:
     packages_path = './packages.yml'
     check_file = os.path.isfile(packages_path)
@@ -46,15 +195,26 @@ def install_dependencies(manifest: Manifest) -> None:
         with open('packages.yml', 'r') as f:
             packages_str = f.read()
         if packages_str != '':
+            with open('dbt_project.yml', 'r') as f:
+                install_path = packages_install_path(yaml.safe_load(f))
+
+            package_cache = PackageCache(state.gcs)
+            cache_key = package_cache.key(packages_str.encode('utf-8'))
+            if package_cache.fetch(cache_key, install_path):
+                logger.log("INFO", "[job] dbt packages installed from cache")
+                return
+
             run_dbt_command(manifest, 'deps')
+            package_cache.store(cache_key, install_path)
 
 
 def run_dbt_command(manifest: Manifest, dbt_command: str) -> None:
+    global run_status
 
     state.run_status = "running"
+    run_status = None
 
     manifest.build_flat_graph()
-    dbt = dbtRunner(manifest=manifest, callbacks=[logger_callback])
 
     args_list = split_arg_string(dbt_command)
     log_selected_nodes(args_list)
@@ -69,17 +229,23 @@ def run_dbt_command(manifest: Manifest, dbt_command: str) -> None:
     )
 
     logger.log("DEBUG", f"[job] Invoking dbtRunner with args: {str(args_list)} and kwargs: {str(state.dbt_native_params_overrides)}")
-    res_dbt: dbtRunnerResult = dbt.invoke(
-        args_list,
-        **dbt_runner_kwargs_override
-    )
+    with tracer.start_as_current_span("dbt.invoke", attributes={"dbt.command": dbt_command}):
+        node_spans = DbtNodeSpans()  # One child span per executed node
+        dbt = dbtRunner(manifest=manifest, callbacks=[logger_callback, node_spans.on_event, run_profile.on_event])
+        try:
+            res_dbt: dbtRunnerResult = dbt.invoke(
+                args_list,
+                **dbt_runner_kwargs_override
+            )
+        finally:
+            node_spans.end()
 
     if res_dbt.success:
         logger.log("INFO", "[job] dbt command finished successfully")
-        state.run_status = "success"
+        run_status = "success"
     else:
         logger.log("ERROR", "[job] dbt command failed")
-        state.run_status = "failed"
+        run_status = "failed"
 
         with callback_lock:
             logger.log("INFO", "[job] dbt-remote job finished")
@@ -108,16 +274,32 @@ def logger_callback(event: EventMsg):
 def handle_exception(dbt_exception: BaseException | None):
     logger.logger.error({"error": dbt_exception})
     if dbt_exception is not None:
-        raise HTTPException(status_code=400, detail=dbt_exception)
+        raise DbtCommandFailed(str(dbt_exception))
     else:
-        raise HTTPException(status_code=404, detail="dbt command failed")
+        raise DbtCommandFailed("dbt command failed")
 
 
+@tracer.start_as_current_span("get_manifest")
 def get_manifest() -> Manifest:
-    with open('manifest.json', 'r') as f:
-        manifest_json = json.loads(f.read())
-    partial_parse = msgpack.packb(manifest_json)
-    manifest: Manifest = Manifest.from_msgpack(partial_parse)
+    """
+        Each job gets its own Manifest object: dbt mutates it while running (flat graph, injected CTEs...),
+        so the cache keeps a pickled copy of the manifest as loaded, which is quicker to restore than to decode.
+    """
+    manifest_hash = (state.artifacts or {}).get("manifest.msgpack")
+    if manifest_hash in manifest_cache:
+        logger.log("DEBUG", f"[job] Reusing manifest {manifest_hash[:12]} loaded by a previous job")
+        manifest_cache.move_to_end(manifest_hash)
+        return pickle.loads(manifest_cache[manifest_hash])
+
+    if os.path.isfile('manifest.msgpack'):
+        manifest = load_manifest_from_msgpack('manifest.msgpack')
+    else:
+        manifest = load_manifest_from_json('manifest.json')
+
+    if manifest_hash is not None and MANIFEST_CACHE_SIZE > 0:
+        manifest_cache[manifest_hash] = pickle.dumps(manifest, protocol=pickle.HIGHEST_PROTOCOL)
+        while len(manifest_cache) > MANIFEST_CACHE_SIZE:
+            manifest_cache.popitem(last=False)
     return manifest
 
 
@@ -142,6 +324,9 @@ def log_selected_nodes(args_list: List[str]):
         logger.log("DEBUG", f"models_selection: {models_selection}")
 
 
+class DbtCommandFailed(Exception):
+    pass
+
+
 if __name__ == "__main__":
-    logger.log("INFO", f"[job] Job {UUID} started")
-    prepare_and_execute_job()
+    run_job(UUID, DBT_COMMAND, TRACEPARENT)
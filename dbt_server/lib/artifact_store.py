@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from pathlib import Path, PurePosixPath
+import re
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+from dbt_server.lib.gcs import CloudStorage
+
+
+ARTIFACTS_FOLDER = "artifacts"
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ArtifactStore:
+    """
+        Content-addressed store for run artifacts: each file is saved once under artifacts/<sha256>,
+        and runs only keep a {path: sha256} mapping. Identical files sent by different runs are stored once.
+    """
+
+    def __init__(self, gcs: CloudStorage, max_workers: int = 16):
+        self.gcs = gcs
+        self.max_workers = max_workers
+
+    def blob_name(self, artifact_hash: str) -> str:
+        if not is_valid_hash(artifact_hash):
+            raise InvalidArtifact(f"Invalid artifact hash: {artifact_hash}")
+        return f"{ARTIFACTS_FOLDER}/{artifact_hash}"
+
+    def missing(self, hashes: Iterable[str]) -> List[str]:
+        hashes = list(dict.fromkeys(hashes))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            exists = list(executor.map(lambda artifact_hash: self.gcs.exists(self.blob_name(artifact_hash)), hashes))
+        return [artifact_hash for artifact_hash, found in zip(hashes, exists) if not found]
+
+    def save(self, data: bytes) -> str:
+        artifact_hash = hash_bytes(data)
+        if not self.gcs.exists(self.blob_name(artifact_hash)):
+            self.gcs.save(self.blob_name(artifact_hash), data)
+        return artifact_hash
+
+    def save_file(self, file_obj: BinaryIO, size: int = None) -> str:
+        """
+            Hashes a seekable file object, then uploads it only if the store does not have it yet.
+        """
+        artifact_hash = hash_file(file_obj)
+        if not self.gcs.exists(self.blob_name(artifact_hash)):
+            file_obj.seek(0)
+            self.gcs.save_file(self.blob_name(artifact_hash), file_obj, size=size)
+        return artifact_hash
+
+    def load(self, artifact_hash: str, start_byte: int = 0, end_byte: int = None) -> bytes:
+        return self.gcs.load(self.blob_name(artifact_hash), start_byte, end_byte=end_byte)
+
+    def size(self, artifact_hash: str) -> int:
+        return self.gcs.size(self.blob_name(artifact_hash))
+
+    def get_derived(self, artifact_hash: str, kind: str) -> Optional[str]:
+        """
+            Hash of the artifact of the given kind derived from `artifact_hash` (e.g. a manifest's msgpack form), if any.
+        """
+        derived_hash = self.gcs.load(self.derived_blob_name(artifact_hash, kind)).decode('utf-8')
+        return derived_hash if is_valid_hash(derived_hash) else None
+
+    def set_derived(self, artifact_hash: str, kind: str, derived_hash: str) -> None:
+        self.gcs.save(self.derived_blob_name(artifact_hash, kind), derived_hash)
+
+    def derived_blob_name(self, artifact_hash: str, kind: str) -> str:
+        return f"{ARTIFACTS_FOLDER}/derived/{kind}/{self.blob_name(artifact_hash).split('/')[-1]}"
+
+    def download_all(self, artifacts: Dict[str, str], destination: Path) -> None:
+        """
+            Downloads the {path: sha256} artifacts to their path under `destination`.
+        """
+        files = [(self.blob_name(artifact_hash), Path(destination) / path) for path, artifact_hash in artifacts.items()]
+        self.gcs.download_files(files, max_workers=self.max_workers)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_obj: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    file_hash = hashlib.sha256()
+    while chunk := file_obj.read(chunk_size):
+        file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def is_valid_hash(artifact_hash: str) -> bool:
+    return isinstance(artifact_hash, str) and HASH_PATTERN.match(artifact_hash) is not None
+
+
+def is_valid_path(artifact_path: str) -> bool:
+    """
+        Artifacts are written relative to the job's working directory, so paths cannot escape it.
+    """
+    path = PurePosixPath(artifact_path)
+    return artifact_path != "" and not path.is_absolute() and ".." not in path.parts
+
+
+class InvalidArtifact(Exception):
+    pass
+
+
+class MissingArtifacts(Exception):
+    pass
@@ -0,0 +1,61 @@
+"""
+    Process-wide GCP clients. Each client discovers credentials and opens its gRPC channel or HTTP
+    session once, and is then shared by all requests and threads of the process.
+"""
+from functools import cache
+import os
+
+from google.cloud import firestore, run_v2, storage
+from google.cloud.logging import Client as LoggingClient
+from google.cloud.scheduler_v1 import CloudSchedulerClient
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "64"))
+
+
+@cache
+def get_storage_client() -> storage.Client:
+    client = storage.Client()
+    # The default pool keeps 10 connections, fewer than the threads uploading and downloading artifacts
+    client._http.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+    return client
+
+
+@cache
+def get_firestore_client() -> firestore.Client:
+    return firestore.Client()
+
+
+@cache
+def get_logging_client() -> LoggingClient:
+    return LoggingClient()
+
+
+@cache
+def get_scheduler_client() -> CloudSchedulerClient:
+    return CloudSchedulerClient()
+
+
+@cache
+def get_jobs_client() -> run_v2.JobsClient:
+    return run_v2.JobsClient()
+
+
+CLIENT_GETTERS = [get_storage_client, get_firestore_client, get_logging_client, get_scheduler_client, get_jobs_client]
+
+
+def init_clients() -> None:
+    for get_client in CLIENT_GETTERS:
+        get_client()
+
+
+def close_clients() -> None:
+    for get_client in CLIENT_GETTERS:
+        if get_client.cache_info().currsize == 0:
+            continue
+        client = get_client()
+        if hasattr(client, "transport"):  # gRPC clients
+            client.transport.close()
+        elif hasattr(client, "close"):
+            client.close()
+        get_client.cache_clear()
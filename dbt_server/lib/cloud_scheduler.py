@@ -1,7 +1,8 @@
 from dataclasses import dataclass
-from google.cloud.scheduler_v1 import HttpTarget, HttpMethod, CloudSchedulerClient
+from google.cloud.scheduler_v1 import HttpTarget, HttpMethod
 from google.api_core.exceptions import AlreadyExists, NotFound
 
+from dbt_server.lib.clients import get_scheduler_client
 from dbt_server.lib.logger import DbtLogger
 
 
@@ -20,7 +21,7 @@ class CloudScheduler:
         self.service_account_email = service_account_email
 
         self.parent = f"projects/{self.project_id}/locations/{self.location}"
-        self.client = CloudSchedulerClient()
+        self.client = get_scheduler_client()
 
     def create_http_scheduled_job(self, scheduler_job_spec: SchedulerHTTPJobSpec):
         job = {
@@ -1,8 +1,15 @@
 from dataclasses import dataclass
+import hashlib
+from typing import Dict, List
+
+from google.api_core.exceptions import AlreadyExists, NotFound
 from google.cloud import run_v2
 
+from dbt_server.lib.clients import get_jobs_client
+from dbt_server.lib.metrics import CLOUD_RUN_JOB_SECONDS, timed
 from dbt_server.lib.state import State
 from dbt_server.lib.logger import DbtLogger
+from dbt_server.lib.tracing import TRACE_EXPORTER, TRACEPARENT_ENV, current_traceparent, tracer
 
 
 @dataclass
@@ -14,59 +21,121 @@ class DbtCloudRunJobConfig:
     service_account: str
     job_docker_image: str
     artifacts_bucket_name: str
+    reuse_job: bool = False
+
+
+RUNNER_JOB_PREFIX = "dbt-server-runner"
+known_runner_jobs = set()
 
 
 class DbtCloudRunJobStarter:
-    def __init__(self, dbt_job_config: DbtCloudRunJobConfig, logger: DbtLogger):
+    def __init__(self, dbt_job_config: DbtCloudRunJobConfig, logger: DbtLogger, state: State = None):
         self.dbt_job_config = dbt_job_config
-        self.state = State.from_uuid(dbt_job_config.uuid)
+        self.state = state if state is not None else State.from_uuid(dbt_job_config.uuid)
         self.logger = logger
 
     def start(self) -> None:
-        job = self.create_job()
-        self.launch_job(job)
-
+        if self.dbt_job_config.reuse_job:
+            job_name = self.get_or_create_runner_job()
+            self.launch_job(job_name, overrides=self.execution_env())
+        else:
+            job = self.create_job()
+            self.launch_job(job.name)
+
+    @tracer.start_as_current_span("DbtCloudRunJobStarter.create_job")
     def create_job(self) -> run_v2.types.Job:
         self.logger.log("INFO", f"Creating cloud run job {self.state.uuid} with command 'dbt {self.dbt_job_config.dbt_command}'")
+        job_id = f"u{self.state.uuid.replace('-', '')}" # job_id must start with a letter and cannot contain '-'
+        return self._create_job(job_id, self.base_env() + self.execution_env())
+
+    @tracer.start_as_current_span("DbtCloudRunJobStarter.get_or_create_runner_job")
+    def get_or_create_runner_job(self) -> str:
+        """
+            Returns the name of the runner job shared by all runs with the same image, service account and bucket.
+            It is created on first use; executions then only override DBT_COMMAND and UUID.
+        """
+        job_name = f"{self.parent}/jobs/{self.runner_job_id()}"
+        if job_name in known_runner_jobs:
+            return job_name
 
+        try:
+            get_jobs_client().get_job(name=job_name)
+        except NotFound:
+            self.logger.log("INFO", f"Creating cloud run runner job {self.runner_job_id()}")
+            try:
+                self._create_job(self.runner_job_id(), self.base_env())
+            except AlreadyExists:  # Created by a concurrent request
+                pass
+        except Exception:
+            raise DbtCloudRunJobCreationFailed(f"Cloud Run runner job lookup failed")
+
+        known_runner_jobs.add(job_name)
+        return job_name
+
+    def runner_job_id(self) -> str:
+        job_spec = f"{self.dbt_job_config.job_docker_image}|{self.dbt_job_config.service_account}|{self.dbt_job_config.artifacts_bucket_name}"
+        return f"{RUNNER_JOB_PREFIX}-{hashlib.sha256(job_spec.encode()).hexdigest()[:12]}"
+
+    @property
+    def parent(self) -> str:
+        return f"projects/{self.dbt_job_config.project_id}/locations/{self.dbt_job_config.location}"
+
+    def base_env(self) -> List[Dict[str, str]]:
+        return [
+            {"name": "SCRIPT", "value": "dbt_server/dbt_run_job.py"},
+            {"name": "BUCKET_NAME", "value": self.dbt_job_config.artifacts_bucket_name},
+        ]
+
+    def execution_env(self) -> List[Dict[str, str]]:
+        return [
+            {"name": "DBT_COMMAND", "value": self.dbt_job_config.dbt_command},
+            {"name": "UUID", "value": self.state.uuid},
+            {"name": TRACEPARENT_ENV, "value": current_traceparent()},
+            {"name": "TRACE_EXPORTER", "value": TRACE_EXPORTER},
+        ]
+
+    def _create_job(self, job_id: str, env: List[Dict[str, str]]) -> run_v2.types.Job:
         job = run_v2.Job()
         job.template.template.max_retries = 0
         job.template.template.service_account = self.dbt_job_config.service_account
         job.template.template.containers = [{
             "image": self.dbt_job_config.job_docker_image,
-            "env": [
-                {"name": "DBT_COMMAND", "value": self.dbt_job_config.dbt_command},
-                {"name": "UUID", "value": self.state.uuid},
-                {"name": "SCRIPT", "value": "dbt_server/dbt_run_job.py"},
-                {"name": "BUCKET_NAME", "value": self.dbt_job_config.artifacts_bucket_name},
-            ]
+            "env": env,
         }]
 
         request = run_v2.CreateJobRequest(
-            parent=f"projects/{self.dbt_job_config.project_id}/locations/{self.dbt_job_config.location}",
-            job_id=f"u{self.state.uuid.replace('-', '')}", # job_id must start with a letter and cannot contain '-'
+            parent=self.parent,
+            job_id=job_id,
             job=job
         )
 
-        try:
-            operation = run_v2.JobsClient().create_job(request=request)
-        except Exception:
-            raise DbtCloudRunJobCreationFailed(f"Cloud Run job creation failed")
-
-        response = operation.result()
+        with timed(CLOUD_RUN_JOB_SECONDS, operation="create"):
+            try:
+                operation = get_jobs_client().create_job(request=request)
+                response = operation.result()
+            except AlreadyExists:
+                raise
+            except Exception:
+                raise DbtCloudRunJobCreationFailed(f"Cloud Run job creation failed")
         self.logger.log("INFO", f"Job created: {response.name}")
 
         return response
 
 
-    def launch_job(self, job: run_v2.types.Job):
-        self.logger.log("INFO", f"Starting job: {job.name}'")
+    @tracer.start_as_current_span("DbtCloudRunJobStarter.launch_job")
+    def launch_job(self, job_name: str, overrides: List[Dict[str, str]] = None):
+        self.logger.log("INFO", f"Starting job: {job_name}'")
 
-        client = run_v2.JobsClient()
-        request = run_v2.RunJobRequest(name=job.name)
+        client = get_jobs_client()
+        request = run_v2.RunJobRequest(name=job_name)
+        if overrides is not None:
+            request.overrides = run_v2.RunJobRequest.Overrides(
+                container_overrides=[run_v2.RunJobRequest.Overrides.ContainerOverride(env=overrides)]
+            )
 
         try:
-            client.run_job(request=request)
+            with timed(CLOUD_RUN_JOB_SECONDS, operation="run"):
+                client.run_job(request=request)
         except Exception:
             raise DbtCloudRunJobStartFailed(f"Cloud Run job start failed")
 
@@ -12,13 +12,27 @@ class DbtCommand:
     dbt_project: str | Dict = Form(...)
     profiles: str | Dict = Form(...)
     packages: str | Dict = Form("{}")
-    zipped_artifacts: UploadFile = File(...)  # Manifest and seeds
+    zipped_artifacts: UploadFile = File(...)  # Manifest and seeds missing from the artifact store
+    artifacts: str | Dict = Form("{}")  # {path: sha256} of all the run's manifest and seeds
+    manifest_delta: UploadFile = File(None)  # Sent instead of the manifest when the server has its base
+    manifest_hash: str = Form(None)  # sha256 of the manifest the delta rebuilds
+    remote_state: str = Form(None)  # Target name or schedule:<name> whose latest successful run is used as --state
 
     def __post_init__(self):
         self.dbt_native_params_overrides = yaml.safe_load(self.dbt_native_params_overrides)
         self.dbt_project = yaml.safe_load(self.dbt_project)
         self.profiles = yaml.safe_load(self.profiles)
         self.packages = yaml.safe_load(self.packages)
+        self.artifacts = yaml.safe_load(self.artifacts)
+
+    @property
+    def concurrency_key(self) -> str:
+        """
+            The warehouse the run uses, its dbt profile and target, which the job queue limits concurrency by.
+        """
+        profile = (self.dbt_project or {}).get("profile", "default")
+        target = (self.dbt_native_params_overrides or {}).get("target") or (self.profiles or {}).get(profile, {}).get("target", "default")
+        return f"{profile}/{target}"
 
 @dataclass
 class ScheduledDbtCommand(DbtCommand):
@@ -0,0 +1,166 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache, partial
+import multiprocessing
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict
+
+from dbt_server.lib.dbt_cloud_run_job import DbtCloudRunJobConfig
+from dbt_server.lib.state import State
+from dbt_server.lib.logger import DbtLogger
+from dbt_server.lib.tracing import current_traceparent, tracer
+
+
+LOCAL_JOB_WORKERS = int(os.getenv("LOCAL_JOB_WORKERS", "2"))
+LOCAL_JOBS_DIR = os.getenv("LOCAL_JOBS_DIR", str(Path(tempfile.gettempdir()) / "dbt-server-jobs"))
+LOCAL_JOB_WARM_WORKERS = os.getenv("LOCAL_JOB_WARM_WORKERS", "false").lower() == "true"
+TERMINAL_RUN_STATUSES = ["success", "failed"]
+
+
+class DbtLocalJobStarter:
+    """
+        Runs the dbt job in a worker process of the server host instead of a Cloud Run job.
+        At most LOCAL_JOB_WORKERS jobs run at the same time, each in its own working directory.
+        With LOCAL_JOB_WARM_WORKERS, the workers are long-lived processes started with the server,
+        which import dbt and the BigQuery adapter before pulling their first job from the pool's queue.
+    """
+
+    def __init__(self, dbt_job_config: DbtCloudRunJobConfig, logger: DbtLogger, state: State = None):
+        self.dbt_job_config = dbt_job_config
+        self.state = state if state is not None else State.from_uuid(dbt_job_config.uuid)
+        self.logger = logger
+
+    @tracer.start_as_current_span("DbtLocalJobStarter.start")
+    def start(self) -> None:
+        self.logger.log("INFO", f"Starting local job {self.state.uuid} with command 'dbt {self.dbt_job_config.dbt_command}'")
+        working_dir = Path(LOCAL_JOBS_DIR) / self.state.uuid
+
+        self.state.run_status = "running"  # Before the job can run, and end, in a worker process
+        try:
+            job = self.submit(working_dir)
+        except Exception:
+            self.state.run_status = "failed"
+            raise DbtLocalJobStartFailed(f"Local job start failed")
+
+        job.add_done_callback(partial(on_local_job_done, self.state.uuid))
+
+    def submit(self, working_dir: Path) -> Future:
+        job_args = (self.state.uuid, self.dbt_job_config.dbt_command, str(working_dir), time.time(), current_traceparent())
+        try:
+            return get_local_pool().submit(run_local_job, *job_args)
+        except BrokenProcessPool:  # A worker process died, e.g. out of memory: replace the pool
+            get_local_pool.cache_clear()
+            return get_local_pool().submit(run_local_job, *job_args)
+
+
+def preload_dbt_runtime() -> None:
+    # Imported in the worker processes only, so that the server itself does not load dbt
+    import dbt_server.dbt_run_job  # noqa: F401, imports dbt.cli.main
+    import dbt.adapters.bigquery  # noqa: F401
+
+
+def run_local_job(uuid: str, dbt_command: str, working_dir: str, submitted_at: float, traceparent: str = None) -> Dict:
+    """
+        Runs in a worker process. Returns the job's dispatch latency, from submission until dbt is
+        loaded and the job starts, whether the worker had already loaded dbt (warm) or not (cold),
+        and whether the job failed. The job's exception is printed here rather than sent back to
+        the server: one that does not unpickle there would break the whole pool.
+    """
+    warm = "dbt_server.dbt_run_job" in sys.modules
+    preload_dbt_runtime()
+    from dbt_server import dbt_run_job
+    result = {"warm": warm, "dispatch_seconds": time.time() - submitted_at, "failed": False}
+
+    Path(working_dir).mkdir(parents=True, exist_ok=True)
+    previous_dir = os.getcwd()
+    os.chdir(working_dir)
+    try:
+        dbt_run_job.run_job(uuid, dbt_command, traceparent)
+    except BaseException:
+        traceback.print_exc()
+        result["failed"] = True
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(working_dir, ignore_errors=True)
+    return result
+
+
+def on_local_job_done(uuid: str, job: Future) -> None:
+    if job.exception() is not None:  # The worker process died
+        mark_failed_if_unfinished(uuid)
+        return
+    result = job.result()
+    dispatch_stats.record(result["warm"], result["dispatch_seconds"])
+    if result["failed"]:
+        mark_failed_if_unfinished(uuid)
+
+
+def mark_failed_if_unfinished(uuid: str) -> None:
+    """
+        A job that crashes before reaching the dbt command would otherwise stay 'running' forever.
+    """
+    state = State.from_uuid(uuid)
+    if state.refresh().run_status not in TERMINAL_RUN_STATUSES:
+        state.run_status = "failed"
+
+
+class DispatchStats:
+    """
+        Dispatch latency of local jobs, split between cold workers (dbt imported by the job) and warm ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {worker: {"jobs": 0, "total_seconds": 0.0, "max_seconds": 0.0} for worker in ["cold", "warm"]}
+
+    def record(self, warm: bool, dispatch_seconds: float) -> None:
+        with self.lock:
+            stats = self.stats["warm" if warm else "cold"]
+            stats["jobs"] += 1
+            stats["total_seconds"] += dispatch_seconds
+            stats["max_seconds"] = max(stats["max_seconds"], dispatch_seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                worker: {**stats, "mean_seconds": stats["total_seconds"] / stats["jobs"] if stats["jobs"] else 0.0}
+                for worker, stats in self.stats.items()
+            }
+
+
+dispatch_stats = DispatchStats()
+
+
+@cache
+def get_local_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=LOCAL_JOB_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=preload_dbt_runtime if LOCAL_JOB_WARM_WORKERS else None,
+    )
+
+
+def warm_up_local_pool() -> None:
+    """
+        Starts all the workers now rather than on the first jobs, so that no job pays their startup.
+    """
+    pool = get_local_pool()
+    for _ in range(LOCAL_JOB_WORKERS):
+        pool.submit(preload_dbt_runtime)
+
+
+def shutdown_local_pool() -> None:
+    if get_local_pool.cache_info().currsize > 0:
+        get_local_pool().shutdown(wait=False, cancel_futures=True)
+        get_local_pool.cache_clear()
+
+
+class DbtLocalJobStartFailed(Exception):
+    pass
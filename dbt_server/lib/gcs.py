@@ -1,53 +1,141 @@
-from functools import cache
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, List, Tuple
 
 from google.cloud import storage
 from google.api_core import exceptions
 from google.api_core.retry import Retry
 
+from dbt_server.lib.clients import get_storage_client
+from dbt_server.lib.metrics import GCP_CALL_SECONDS, timed
+
 
 class CloudStorage:
 
     def __init__(self, bucket_name: str, client: storage.Client=None):
-        self.client = client if client is not None else connect_client()
+        self.client = client if client is not None else get_storage_client()
         self.bucket_name = bucket_name
 
-    def save(self, file_name: str, data: str) -> None:
+    def save(self, file_name: str, data: str | bytes) -> None:
         storage_client = self.client
         bucket = storage_client.bucket(self.bucket_name)
         blob = bucket.blob(file_name)
         retry_policy = define_retry_policy()  # handle 429 error with exponential backoff
-        blob.upload_from_string(data, num_retries=5, retry=retry_policy)
-
-    def load(self, file_name: str, start_byte: int = 0) -> bytes:
+        with timed(GCP_CALL_SECONDS, service="gcs", operation="upload"):
+            blob.upload_from_string(data, num_retries=5, retry=retry_policy)
+
+    def create(self, file_name: str, data: str | bytes, metadata: Dict[str, str] = None) -> bool:
+        """
+            Saves the blob only if it does not exist yet (generation precondition 0). Returns False if it does.
+        """
+        return self.save_if_generation(file_name, data, 0, metadata)
+
+    def save_if_generation(self, file_name: str, data: str | bytes, generation: int, metadata: Dict[str, str] = None) -> bool:
+        """
+            Saves the blob only if its generation is still `generation`, 0 meaning that it does not exist.
+            Returns False if the blob was changed (or created) in the meantime.
+        """
+        blob = self.client.bucket(self.bucket_name).blob(file_name)
+        blob.metadata = metadata
+        retry_policy = define_retry_policy()  # handle 429 error with exponential backoff
+        try:
+            with timed(GCP_CALL_SECONDS, service="gcs", operation="upload"):
+                blob.upload_from_string(data, if_generation_match=generation, num_retries=5, retry=retry_policy)
+            return True
+        except exceptions.PreconditionFailed:
+            return False
+
+    def save_file(self, file_name: str, file_obj: BinaryIO, size: int = None) -> None:
         storage_client = self.client
-        bucket = storage_client.get_bucket(self.bucket_name)
+        bucket = storage_client.bucket(self.bucket_name)
         blob = bucket.blob(file_name)
-        blob_size = get_blob_size(bucket, file_name)
-
-        if blob_size is not None and blob_size > start_byte:
-            blob_bytes = blob.download_as_bytes(client=None, start=start_byte)
-            return blob_bytes
-        else:
+        retry_policy = define_retry_policy()  # handle 429 error with exponential backoff
+        with timed(GCP_CALL_SECONDS, service="gcs", operation="upload"):
+            blob.upload_from_file(file_obj, size=size, num_retries=5, retry=retry_policy)
+
+    def load(self, file_name: str, start_byte: int = 0, if_generation_not_match: int = None, end_byte: int = None) -> bytes:
+        """
+            Reads the blob from `start_byte` to `end_byte` (included, the end of the blob by default) in a single
+            ranged GET. A missing blob, a range past its end, or a generation equal to `if_generation_not_match`
+            (the blob did not change) all mean no new data.
+        """
+        blob = self.client.bucket(self.bucket_name).blob(file_name)
+        try:
+            with timed(GCP_CALL_SECONDS, service="gcs", operation="download"):
+                return blob.download_as_bytes(start=start_byte, end=end_byte, if_generation_not_match=if_generation_not_match)
+        except (exceptions.NotFound, exceptions.RequestRangeNotSatisfiable, exceptions.NotModified):
             return b''
 
-    def get_files_from_folder(self, folder_name: str) -> Dict[str, bytes]:
+    def load_with_generation(self, file_name: str) -> Tuple[bytes, int]:
+        """
+            Reads the blob along with its generation, for a later save_if_generation(). A missing blob is (b'', 0).
+        """
+        blob = self.client.bucket(self.bucket_name).blob(file_name)
+        try:
+            with timed(GCP_CALL_SECONDS, service="gcs", operation="download"):
+                data = blob.download_as_bytes()
+        except exceptions.NotFound:
+            return b'', 0
+        return data, int(blob.generation)
+
+    def size(self, file_name: str) -> int:
+        """
+            Size of the blob, read from its metadata. 0 for a missing blob, like load().
+        """
+        with timed(GCP_CALL_SECONDS, service="gcs", operation="get"):
+            blob = self.client.bucket(self.bucket_name).get_blob(file_name)
+        return blob.size if blob is not None else 0
+
+    def exists(self, file_name: str) -> bool:
         storage_client = self.client
-        blobs = {}
-        for blob in storage_client.list_blobs(self.bucket_name, prefix=folder_name):
-            file_name = blob.name.split('/')[-1]
-            blobs[file_name] = blob.download_as_bytes(client=None)
-        return blobs
-
-
-@cache
-def connect_client() -> storage.Client:
-    return storage.Client()
+        with timed(GCP_CALL_SECONDS, service="gcs", operation="exists"):
+            return storage_client.bucket(self.bucket_name).blob(file_name).exists()
 
-
-def get_blob_size(bucket: storage.Bucket, blob_name: str) -> int:
-    blob = bucket.get_blob(blob_name)
-    return blob.size if blob is not None else None
+    def list(self, prefix: str) -> List[storage.Blob]:
+        storage_client = self.client
+        with timed(GCP_CALL_SECONDS, service="gcs", operation="list"):
+            return sorted(storage_client.list_blobs(self.bucket_name, prefix=prefix), key=lambda blob: blob.name)
+
+    def download_files(self, files: List[Tuple[str, Path]], max_workers: int = 16) -> None:
+        """
+            Downloads the (blob name, local path) pairs concurrently, streaming each blob to disk.
+            A blob can be written to several paths.
+        """
+        bucket = self.client.bucket(self.bucket_name)
+
+        def download(blob_name: str, file_path: Path) -> None:
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            with timed(GCP_CALL_SECONDS, service="gcs", operation="download"):
+                bucket.blob(blob_name).download_to_filename(str(file_path))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            downloads = [executor.submit(download, blob_name, file_path) for blob_name, file_path in files]
+            for download_result in downloads:
+                download_result.result()
+
+    def download_folder(self, folder_name: str, destination: Path, include: List[str] = None, exclude: List[str] = None, max_workers: int = 16) -> List[Path]:
+        """
+            Downloads a folder to `destination`, keeping the blobs' paths relative to the folder.
+            `include` and `exclude` are glob patterns matched against these relative paths.
+        """
+        prefix = folder_name.rstrip('/') + '/'
+        files = []
+        for blob in self.list(prefix):
+            relative_path = blob.name[len(prefix):]
+            if relative_path == '' or relative_path.endswith('/') or '..' in PurePosixPath(relative_path).parts:
+                continue
+            if matches_filters(relative_path, include, exclude):
+                files.append((blob.name, Path(destination) / relative_path))
+
+        self.download_files(files, max_workers=max_workers)
+        return [file_path for _, file_path in files]
+
+
+def matches_filters(relative_path: str, include: List[str] = None, exclude: List[str] = None) -> bool:
+    if include is not None and not any(fnmatch(relative_path, pattern) for pattern in include):
+        return False
+    return exclude is None or not any(fnmatch(relative_path, pattern) for pattern in exclude)
 
 
 def define_retry_policy():
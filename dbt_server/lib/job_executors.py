@@ -0,0 +1,23 @@
+import os
+
+from dbt_server.lib.dbt_cloud_run_job import DbtCloudRunJobStarter
+from dbt_server.lib.dbt_local_job import DbtLocalJobStarter
+
+
+JOB_STARTERS = {
+    "cloud_run": DbtCloudRunJobStarter,
+    "local": DbtLocalJobStarter,
+}
+LOCAL_JOB_COMMANDS = os.getenv("LOCAL_JOB_COMMANDS", "compile,list,ls,parse").split(",")
+
+
+def get_job_starter(executor: str, dbt_command: str):
+    """
+        Job starter class for the executor. With "auto", short commands (LOCAL_JOB_COMMANDS) run
+        locally and the others on Cloud Run.
+    """
+    if executor == "auto":
+        executor = "local" if dbt_command.split(" ")[0] in LOCAL_JOB_COMMANDS else "cloud_run"
+    if executor not in JOB_STARTERS:
+        raise ValueError(f"Unknown job executor '{executor}', expected one of {list(JOB_STARTERS)} or 'auto'")
+    return JOB_STARTERS[executor]
@@ -0,0 +1,231 @@
+from dataclasses import dataclass, field
+import itertools
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List
+
+from dbt_server.lib.firestore import get_collection
+from dbt_server.lib.metrics import JOB_QUEUE_WAIT_SECONDS
+from dbt_server.lib.state import State
+
+
+TERMINAL_RUN_STATUSES = ["success", "failed"]
+JOB_QUEUE_COLLECTION = "dbt-job-queue"
+SCHEDULED_PRIORITY = 0
+AD_HOC_PRIORITY = 1
+
+
+@dataclass(order=True)
+class QueuedJob:
+    priority: int
+    sequence: int
+    uuid: str = field(compare=False)
+    concurrency_key: str = field(compare=False)
+    start: Callable[[], None] = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    queued_at: float = field(compare=False, default_factory=time.time)  # Wall clock, kept across server restarts
+
+    def to_document(self, status: str) -> Dict:
+        return {
+            "uuid": self.uuid,
+            "concurrency_key": self.concurrency_key,
+            "priority": self.priority,
+            "queued_at": self.queued_at,
+            "status": status,
+        }
+
+
+class JobQueue:
+    """
+        Admission control for job starts. A job starts right away when fewer than `max_running` jobs run
+        overall and fewer than `max_running_per_key` run for its concurrency key (dbt profile and target).
+        Otherwise it is queued, with the 'queued' run status, and started once a slot frees up:
+        scheduled runs before ad hoc ones, then in submission order. Limits of 0 mean no limit.
+        Running jobs are tracked through their run status, which is polled every `poll_interval` seconds.
+        Queued and running jobs are also stored in Firestore until they end, so that a restarted server
+        re-admits them with restore().
+    """
+
+    def __init__(self, max_running: int = 0, max_running_per_key: int = 0, poll_interval: float = 5, slot_timeout: float = 6 * 3600):
+        self.max_running = max_running
+        self.max_running_per_key = max_running_per_key
+        self.poll_interval = poll_interval
+        self.slot_timeout = slot_timeout
+
+        self.lock = threading.Lock()
+        self.queue: List[QueuedJob] = []
+        self.running: Dict[str, QueuedJob] = {}
+        self.running_since: Dict[str, float] = {}
+        self.sequence = itertools.count()
+        self.dispatched_jobs = 0
+        self.total_wait_seconds = 0.0
+        self.poller: threading.Thread = None
+        self.collection_name = JOB_QUEUE_COLLECTION
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_running > 0 or self.max_running_per_key > 0
+
+    def submit(self, uuid: str, concurrency_key: str, priority: int, start: Callable[[], None]) -> bool:
+        """
+            Starts the job now if it can, in the caller's thread so that start errors reach the caller.
+            Returns False when the job was queued instead.
+        """
+        if not self.enabled:
+            start()
+            return True
+
+        job = QueuedJob(priority, next(self.sequence), uuid, concurrency_key, start)
+        with self.lock:
+            admitted = not self.queue and self.has_slot(concurrency_key)
+            if admitted:
+                self.mark_running(job)
+        self.ensure_poller()
+
+        if not admitted:
+            self.persist(job, "queued")
+            State.from_uuid(uuid).run_status = "queued"  # Before the poller can see, and start, the job
+            with self.lock:
+                self.queue.append(job)
+            return False
+
+        try:
+            self.persist(job, "running")
+            start()
+        except Exception:
+            self.release(uuid)
+            raise
+        return True
+
+    def has_slot(self, concurrency_key: str) -> bool:
+        if self.max_running > 0 and len(self.running) >= self.max_running:
+            return False
+        running_for_key = sum(1 for job in self.running.values() if job.concurrency_key == concurrency_key)
+        return self.max_running_per_key <= 0 or running_for_key < self.max_running_per_key
+
+    def mark_running(self, job: QueuedJob) -> None:
+        wait_seconds = time.monotonic() - job.enqueued_at
+        self.running[job.uuid] = job
+        self.running_since[job.uuid] = time.monotonic()
+        self.dispatched_jobs += 1
+        self.total_wait_seconds += wait_seconds
+        JOB_QUEUE_WAIT_SECONDS.observe(wait_seconds)
+
+    def release(self, uuid: str) -> None:
+        with self.lock:
+            self.running.pop(uuid, None)
+            self.running_since.pop(uuid, None)
+        try:
+            get_collection(self.collection_name).document(uuid).delete()
+        except Exception:
+            print("ERROR", f"Could not remove job {uuid} from the stored queue")
+            print(traceback.format_exc())
+
+    def persist(self, job: QueuedJob, status: str) -> None:
+        get_collection(self.collection_name).document(job.uuid).set(job.to_document(status))
+
+    def restore(self, make_start: Callable[[str], Callable[[], None]]) -> int:
+        """
+            Re-admits the jobs stored by a previous server instance: running ones take their slot again
+            until they end, queued ones are queued again in their original order. `make_start` returns
+            the function starting the job of a uuid. Returns the number of re-queued jobs.
+        """
+        if not self.enabled:
+            return 0
+        documents = [document.to_dict() for document in get_collection(self.collection_name).stream()]
+        queued = 0
+        for document in sorted(documents, key=lambda document: (document["priority"], document["queued_at"])):
+            waited_seconds = max(time.time() - document["queued_at"], 0)
+            job = QueuedJob(
+                document["priority"],
+                next(self.sequence),
+                document["uuid"],
+                document["concurrency_key"],
+                make_start(document["uuid"]),
+                enqueued_at=time.monotonic() - waited_seconds,
+                queued_at=document["queued_at"],
+            )
+            with self.lock:
+                if document["status"] == "running":
+                    self.running[job.uuid] = job
+                    self.running_since[job.uuid] = time.monotonic()
+                else:
+                    self.queue.append(job)
+                    queued += 1
+        self.ensure_poller()
+        return queued
+
+    def uuids(self) -> List[str]:
+        """
+            Jobs queued or running, e.g. restored from a previous server instance.
+        """
+        with self.lock:
+            return [*self.running, *(job.uuid for job in self.queue)]
+
+    def next_admissible(self) -> QueuedJob:
+        """
+            Pops the first queued job, in priority order, whose concurrency key has a free slot.
+        """
+        with self.lock:
+            for job in sorted(self.queue):
+                if not self.has_slot(job.concurrency_key):
+                    continue
+                self.queue.remove(job)
+                self.mark_running(job)
+                return job
+        return None
+
+    def dispatch(self) -> None:
+        while (job := self.next_admissible()) is not None:
+            try:
+                self.persist(job, "running")
+                job.start()
+            except Exception:
+                print("ERROR", f"Could not start queued job {job.uuid}")
+                print(traceback.format_exc())
+                self.release(job.uuid)
+                State.from_uuid(job.uuid).run_status = "failed"
+
+    def release_finished(self) -> None:
+        with self.lock:
+            running = dict(self.running_since)
+        for uuid, running_since in running.items():
+            timed_out = time.monotonic() - running_since > self.slot_timeout
+            snapshot = State.from_uuid(uuid).refresh()
+            if timed_out or snapshot.run_status in TERMINAL_RUN_STATUSES:
+                self.release(uuid)
+
+    def ensure_poller(self) -> None:
+        with self.lock:
+            if self.poller is not None and self.poller.is_alive():
+                return
+            self.poller = threading.Thread(target=self._poll, name="dbt-job-queue", daemon=True)
+            self.poller.start()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.release_finished()
+                self.dispatch()
+            except Exception:
+                print("ERROR", "Job queue polling failed")
+                print(traceback.format_exc())
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self.lock:
+            depth_per_key: Dict[str, int] = {}
+            for job in self.queue:
+                depth_per_key[job.concurrency_key] = depth_per_key.get(job.concurrency_key, 0) + 1
+            return {
+                "enabled": self.enabled,
+                "max_running": self.max_running,
+                "max_running_per_key": self.max_running_per_key,
+                "running": len(self.running),
+                "queue_depth": len(self.queue),
+                "queue_depth_per_key": depth_per_key,
+                "oldest_wait_seconds": max((now - job.enqueued_at for job in self.queue), default=0.0),
+                "mean_wait_seconds": self.total_wait_seconds / self.dispatched_jobs if self.dispatched_jobs else 0.0,
+            }
@@ -0,0 +1,62 @@
+import threading
+import time
+import traceback
+from typing import Dict
+
+from dbt_server.lib.metrics import report_job_metrics
+from dbt_server.lib.state import State
+
+
+TERMINAL_RUN_STATUSES = ["success", "failed"]
+
+
+class JobWatcher:
+    """
+        Reports the metrics of the jobs the server started or queued once they end, whether or not anyone reads
+        their logs or status: their run status is polled every `poll_interval` seconds, for at most `timeout` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 5, timeout: float = 6 * 3600):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.watched: Dict[str, float] = {}
+        self.poller: threading.Thread = None
+
+    def watch(self, uuid: str) -> None:
+        with self.lock:
+            self.watched.setdefault(uuid, time.monotonic())
+        self.ensure_poller()
+
+    def report_finished(self) -> None:
+        with self.lock:
+            watched = dict(self.watched)
+        for uuid, watched_since in watched.items():
+            try:
+                snapshot = State.from_uuid(uuid).refresh()
+            except Exception:
+                print("ERROR", f"Could not read the run status of job {uuid}")
+                print(traceback.format_exc())
+                continue
+            if snapshot.run_status in TERMINAL_RUN_STATUSES:
+                report_job_metrics(uuid, snapshot.metrics)
+            if snapshot.run_status in TERMINAL_RUN_STATUSES or time.monotonic() - watched_since > self.timeout:
+                with self.lock:
+                    self.watched.pop(uuid, None)
+
+    def ensure_poller(self) -> None:
+        with self.lock:
+            if self.poller is not None and self.poller.is_alive():
+                return
+            self.poller = threading.Thread(target=self._poll, name="dbt-job-watcher", daemon=True)
+            self.poller.start()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.report_finished()
+            except Exception:
+                print("ERROR", "Job watcher polling failed")
+                print(traceback.format_exc())
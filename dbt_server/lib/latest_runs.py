@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+import json
+from typing import Dict, List, Optional
+
+from dbt_server.lib.gcs import CloudStorage
+
+
+LATEST_RUNS_FOLDER = "latest_runs"
+REMOTE_STATE_FOLDER = "remote-state"  # In the job's working directory, passed to dbt as --state
+STATE_PRODUCING_COMMANDS = ["build", "run", "seed", "snapshot"]
+
+
+class LatestRuns:
+    """
+        Pointers to the latest successful run of each dbt target and of each schedule, with the hash of the
+        manifest it ran with: the reference state of later runs' `state:` selectors and `--defer`.
+        Each pointer is a small JSON blob, latest_runs/target/<profile>/<target>.json or latest_runs/schedule/<name>.json.
+    """
+
+    def __init__(self, gcs: CloudStorage):
+        self.gcs = gcs
+
+    def blob_name(self, key: str) -> str:
+        return f"{LATEST_RUNS_FOLDER}/{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        latest_run = self.gcs.load(self.blob_name(key))
+        return json.loads(latest_run) if latest_run else None
+
+    def record(self, keys: List[str], uuid: str, manifest_hash: str, started_at: datetime) -> None:
+        """
+            Points the keys to this run, except those already pointing to a run started later: runs do not always
+            end in the order they started. Pointers are replaced with a generation precondition, and re-read
+            when another run replaced them in the meantime.
+        """
+        latest_run = {
+            "uuid": uuid,
+            "manifest": manifest_hash,
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+        for key in keys:
+            while True:
+                current_run, generation = self.gcs.load_with_generation(self.blob_name(key))
+                if current_run and started_later(json.loads(current_run), started_at):
+                    break
+                if self.gcs.save_if_generation(self.blob_name(key), json.dumps(latest_run), generation):
+                    break
+
+
+def started_later(latest_run: Dict, started_at: datetime) -> bool:
+    """
+        Pointers recorded without a start time are older than any run recording one.
+    """
+    return "started_at" in latest_run and datetime.fromisoformat(latest_run["started_at"]) > started_at
+
+
+def run_keys(concurrency_key: str, schedule_name: str = None) -> List[str]:
+    return [f"target/{concurrency_key}"] + ([f"schedule/{schedule_name}"] if schedule_name else [])
+
+
+def reference_key(reference: str, profile: Optional[str]) -> str:
+    """
+        `reference` is either `schedule:<name>` or the name of a target of the run's dbt profile, which
+        is unknown for runs of schedules created before concurrency keys.
+    """
+    if reference.startswith("schedule:"):
+        return f"schedule/{reference.removeprefix('schedule:')}"
+    if profile is None:
+        raise RemoteStateNotFound(f"Cannot resolve the target {reference}: the run's dbt profile is unknown")
+    return f"target/{profile}/{reference}"
+
+
+class RemoteStateNotFound(Exception):
+    pass
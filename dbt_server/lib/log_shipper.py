@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from dbt_server.lib.state import DbtRunLogs
+
+
+_STOP = object()
+
+
+class LogShipper:
+    """
+        Ships run log lines to storage from a background thread, so that callers never wait on GCS.
+        Lines are written as one log segment every `flush_interval_ms`, or as soon as `flush_size_bytes`
+        are pending. When the queue is full, the caller waits at most `max_block_ms` before the line is dropped.
+    """
+
+    def __init__(
+        self,
+        run_logs: DbtRunLogs,
+        flush_interval_ms: int = 500,
+        flush_size_bytes: int = 64 * 1024,
+        max_queue_size: int = 10000,
+        max_block_ms: int = 0,
+    ):
+        self.run_logs = run_logs
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_size_bytes = flush_size_bytes
+        self.max_block = max_block_ms / 1000
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self._counters_lock = threading.Lock()
+        self._submit_lock = threading.Lock()  # A line is either queued before _STOP or written by submit()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+
+        self.shipped_lines = 0
+        self.shipped_bytes = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.backpressure_events = 0
+        self.dropped_lines = 0
+
+    def start(self) -> "LogShipper":
+        self._thread.start()
+        return self
+
+    def submit(self, line: str) -> bool:
+        with self._submit_lock:
+            if not self._closed:
+                return self._enqueue(line)
+
+        self._flush([line])  # Closed: written synchronously
+        return True
+
+    def _enqueue(self, line: str) -> bool:
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except queue.Full:
+            self._increment("backpressure_events")
+
+        if self.max_block > 0:
+            try:
+                self.queue.put(line, timeout=self.max_block)
+                return True
+            except queue.Full:
+                pass
+
+        self._increment("dropped_lines")
+        return False
+
+    def close(self, timeout: float = 30) -> None:
+        """
+            Drains every queued line to storage, then stops the shipper thread. Safe to call several times.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._counters_lock:
+            return {
+                "shipped_lines": self.shipped_lines,
+                "shipped_bytes": self.shipped_bytes,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "backpressure_events": self.backpressure_events,
+                "dropped_lines": self.dropped_lines,
+                "queued_lines": self.queue.qsize(),
+            }
+
+    def _run(self) -> None:
+        pending, pending_bytes = [], 0
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                line = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                line = None
+
+            if line is _STOP:
+                self._flush(pending)
+                return
+
+            if line is not None:
+                pending.append(line)
+                pending_bytes += len(line.encode('utf-8')) + 1
+
+            if pending_bytes >= self.flush_size_bytes or time.monotonic() >= deadline:
+                self._flush(pending)
+                pending, pending_bytes = [], 0
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, lines: List[str]) -> None:
+        if len(lines) == 0:
+            return
+
+        shipped = self.run_logs.log(lines)
+        with self._counters_lock:
+            self.flushes += 1
+            if shipped:
+                self.shipped_lines += len(lines)
+                self.shipped_bytes += sum(len(line.encode('utf-8')) + 1 for line in lines)
+            else:
+                self.failed_flushes += 1
+                self.dropped_lines += len(lines)
+
+    def _increment(self, counter: str) -> None:
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
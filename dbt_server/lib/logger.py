@@ -1,16 +1,27 @@
+from contextvars import ContextVar
+from functools import cache
 import logging
 from logging import Logger
 import os
+from typing import Dict
 # https://stackoverflow.com/questions/2183233/how-to-add-a-custom-loglevel-to-pythons-logging-facility/35804945#35804945
 from google.cloud.logging import Client
 from google.cloud.logging.handlers import CloudLoggingHandler
 from google.cloud.logging_v2.resource import Resource
 from google.cloud.logging_v2.handlers._monitored_resources import retrieve_metadata_server, _REGION_ID, _PROJECT_NAME
 
+from dbt_server.lib.clients import get_logging_client
 from dbt_server.lib.state import State
 
 
+current_job_uuid: ContextVar[str] = ContextVar("current_job_uuid", default=None)
+
+
 class DbtLogger:
+    """
+        Cheap to create: the underlying logger and its Cloud Logging handler are set up once per process.
+        The job the logs belong to is held in a context variable, so that concurrent requests don't mix it up.
+    """
 
     def __init__(self, server: bool = False):
         self.local = bool(os.getenv("LOCAL", False))
@@ -18,9 +29,8 @@ class DbtLogger:
 
         self._state: State = None
 
-        self.logging_client = Client()
-        self.logger = self.init_logger()
-        self.logger.info(f"Initialized logger")
+        self.logging_client = get_logging_client()
+        self.logger = init_logger(self.server, self.local)
 
     @property
     def state(self):
@@ -29,6 +39,7 @@ class DbtLogger:
     @state.setter
     def state(self, new_state: State):
         self._state = new_state
+        current_job_uuid.set(new_state.uuid if new_state is not None else None)
 
     def log(self, severity: str, new_log: str):
         log_level = get_log_level(severity)
@@ -38,33 +49,56 @@ class DbtLogger:
             self.state.log(severity.upper(), new_log)
 
 
-    def init_logger(self) -> Logger:
-        _addGcloudLoggingLevel()
-        logger = logging.getLogger(__name__)
+class JobContextFilter(logging.Filter):
+    """
+        Labels each record with the uuid of the job being handled in the current context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        uuid = current_job_uuid.get()
+        if uuid is not None:
+            record.labels = {**getattr(record, "labels", {}), "uuid": uuid}
+        return True
 
-        if not self.local:
-            if self.logging_client is None:
-                raise Exception("No Cloud Logging client given and not running locally")
-            if self.server:
-                handler = server_cloud_handler(self.logging_client)
-            else:
-                handler = job_cloud_handler(self.logging_client)
-            logger.addHandler(handler)
 
-        return logger
+@cache
+def init_logger(server: bool, local: bool) -> Logger:
+    _addGcloudLoggingLevel()
+    logger = logging.getLogger(__name__)
+    logger.addFilter(JobContextFilter())
 
+    if not local:
+        logging_client = get_logging_client()
+        if logging_client is None:
+            raise Exception("No Cloud Logging client given and not running locally")
+        if server:
+            handler = server_cloud_handler(logging_client)
+        else:
+            handler = job_cloud_handler(logging_client)
+        logger.addHandler(handler)
 
-def server_cloud_handler(logging_client: Client):
+    logger.info(f"Initialized logger")
+    return logger
 
+
+@cache
+def get_resource_labels() -> Dict[str, str]:
+    """
+        Location and project from the metadata server, which is only queried once per process.
+    """
     region = retrieve_metadata_server(_REGION_ID)
     project = retrieve_metadata_server(_PROJECT_NAME)
+    return {
+        "location": region.split("/")[-1] if region else "",
+        "project_id": project,
+    }
+
+
+def server_cloud_handler(logging_client: Client):
 
     cr_job_resource = Resource(
         type="cloud_run_revision",
-        labels={
-            "location":  region.split("/")[-1] if region else "",
-            "project_id": project,
-        }
+        labels=get_resource_labels(),
     )
     handler = CloudLoggingHandler(logging_client, resource=cr_job_resource)
 
@@ -73,8 +107,6 @@ def server_cloud_handler(logging_client: Client):
 
 def job_cloud_handler(logging_client: Client):
 
-    region = retrieve_metadata_server(_REGION_ID)
-    project = retrieve_metadata_server(_PROJECT_NAME)
     uuid = os.environ.get("UUID")
     job_name = os.environ.get('CLOUD_RUN_JOB', 'unknownJobId')
 
@@ -82,8 +114,7 @@ def job_cloud_handler(logging_client: Client):
         type="cloud_run_job",
         labels={
             "job_name": job_name,
-            "location":  region.split("/")[-1] if region else "",
-            "project_id": project,
+            **get_resource_labels(),
             "uuid": uuid,
         }
     )
@@ -0,0 +1,23 @@
+import json
+import mmap
+from pathlib import Path
+
+import msgpack
+from dbt.contracts.graph.manifest import Manifest
+
+
+def load_manifest_from_json(manifest_path: Path) -> Manifest:
+    with open(manifest_path, 'r') as f:
+        manifest_json = json.loads(f.read())
+    partial_parse = msgpack.packb(manifest_json)
+    manifest: Manifest = Manifest.from_msgpack(partial_parse)
+    return manifest
+
+
+def load_manifest_from_msgpack(manifest_path: Path) -> Manifest:
+    """
+        Loads a manifest pre-serialized by the server, decoding it straight from a memory-mapped file.
+    """
+    with open(manifest_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as partial_parse:
+        manifest: Manifest = Manifest.from_msgpack(partial_parse)
+    return manifest
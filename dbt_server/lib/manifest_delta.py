@@ -0,0 +1,35 @@
+import json
+from typing import Dict
+
+
+def apply_manifest_delta(base_manifest: Dict, manifest_delta: Dict) -> Dict:
+    """
+        Rebuilds a manifest from a base manifest and a delta computed by dbt-remote:
+        - "entries": per top-level section (nodes, sources, macros...), the changed entries by unique_id and the removed ones
+        - "replaced": top-level keys whose whole value changed
+        - "removed": top-level keys that no longer exist
+    """
+    manifest = dict(base_manifest)
+
+    for key in manifest_delta.get("removed", []):
+        manifest.pop(key, None)
+
+    for key, value in manifest_delta.get("replaced", {}).items():
+        manifest[key] = value
+
+    for section, changes in manifest_delta.get("entries", {}).items():
+        entries = dict(manifest.get(section) or {})
+        for unique_id in changes.get("removed", []):
+            entries.pop(unique_id, None)
+        entries.update(changes.get("changed", {}))
+        manifest[section] = entries
+
+    return manifest
+
+
+def serialize_manifest(manifest: Dict) -> bytes:
+    """
+        Canonical JSON form of a manifest, the one dbt-remote hashes and sends (dbt_remote/src/manifest_delta.py):
+        a manifest rebuilt from a delta is then stored under the hash the client computed for its manifest.
+    """
+    return json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode('utf-8')
@@ -0,0 +1,79 @@
+"""
+    Prometheus metrics of the server, exposed on GET /metrics. Jobs running in Cloud Run (or in local
+    worker processes) cannot be scraped: they store a summary of their run in their State, which the
+    server reports once when it sees the run is over.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator
+
+from prometheus_client import Histogram
+
+
+BYTES_BUCKETS = [1024 * 4 ** power for power in range(11)]  # 1KiB to 1GiB
+JOB_SECONDS_BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400]
+REPORTED_JOBS_SIZE = 10000
+
+REQUEST_SECONDS = Histogram(
+    "dbt_server_request_duration_seconds", "HTTP request latency, until the response starts", ["method", "route", "status"],
+)
+ARTIFACT_UPLOAD_BYTES = Histogram(
+    "dbt_server_artifact_upload_bytes", "Size of the artifacts uploaded with a command", buckets=BYTES_BUCKETS,
+)
+ARTIFACT_UPLOAD_SECONDS = Histogram(
+    "dbt_server_artifact_upload_duration_seconds", "Time to store the artifacts uploaded with a command",
+)
+GCP_CALL_SECONDS = Histogram(
+    "dbt_server_gcp_call_duration_seconds", "Latency of Firestore and Cloud Storage calls", ["service", "operation"],
+)
+CLOUD_RUN_JOB_SECONDS = Histogram(
+    "dbt_server_cloud_run_job_duration_seconds", "Latency of Cloud Run job creation and execution start", ["operation"],
+)
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "dbt_server_job_queue_wait_seconds", "Time jobs wait in the admission queue", buckets=JOB_SECONDS_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    "dbt_server_job_duration_seconds", "Job execution duration, as reported by the job", ["run_status"], buckets=JOB_SECONDS_BUCKETS,
+)
+JOB_LOG_LINES = Histogram(
+    "dbt_server_job_log_lines", "Log lines shipped per job", buckets=[10 ** power for power in range(7)],
+)
+JOB_LOG_BYTES = Histogram(
+    "dbt_server_job_log_bytes", "Log bytes shipped per job", buckets=BYTES_BUCKETS,
+)
+
+reported_jobs_lock = threading.Lock()
+reported_jobs: "OrderedDict[str, None]" = OrderedDict()
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """
+        Observes the duration of the block, whether it succeeds or raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - start)
+
+
+def report_job_metrics(uuid: str, job_metrics: Dict) -> None:
+    """
+        Observes the metrics a finished job stored in its State. Each job is reported once, however many
+        times the server reads its State.
+    """
+    if not job_metrics:
+        return
+    with reported_jobs_lock:
+        if uuid in reported_jobs:
+            return
+        reported_jobs[uuid] = None
+        while len(reported_jobs) > REPORTED_JOBS_SIZE:
+            reported_jobs.popitem(last=False)
+
+    JOB_SECONDS.labels(run_status=job_metrics.get("run_status", "unknown")).observe(job_metrics.get("duration_seconds", 0))
+    JOB_LOG_LINES.observe(job_metrics.get("log_lines", 0))
+    JOB_LOG_BYTES.observe(job_metrics.get("log_bytes", 0))
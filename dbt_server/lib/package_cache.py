@@ -0,0 +1,98 @@
+import hashlib
+from importlib.metadata import version
+import io
+import logging
+import os
+from pathlib import Path
+import re
+import subprocess
+import tarfile
+import tempfile
+import time
+from typing import Dict
+
+import yaml
+
+from dbt_server.lib.gcs import CloudStorage
+
+
+PACKAGES_FOLDER = "packages"
+PACKAGE_CACHE_TTL = int(os.getenv("PACKAGE_CACHE_TTL", str(24 * 3600)))  # Seconds, for packages.yml with version ranges or branches
+
+
+class PackageCache:
+    """
+        Installed dbt packages, stored as tarballs under packages/<key>.tar.gz. The key is the sha256 of
+        the dbt version and of packages.yml, so that jobs unpack the tarball instead of running `dbt deps`.
+        When packages.yml has version ranges or git branches, the key also holds the current PACKAGE_CACHE_TTL
+        period, so that `dbt deps` resolves them again, and installs new releases, once per period.
+    """
+
+    def __init__(self, gcs: CloudStorage):
+        self.gcs = gcs
+
+    def key(self, packages_yml: bytes) -> str:
+        period = b"" if is_pinned(packages_yml) else f"\n{int(time.time() // PACKAGE_CACHE_TTL)}".encode('utf-8')
+        return hashlib.sha256(version("dbt-core").encode('utf-8') + b"\n" + packages_yml + period).hexdigest()
+
+    def blob_name(self, key: str) -> str:
+        return f"{PACKAGES_FOLDER}/{key}.tar.gz"
+
+    def fetch(self, key: str, install_path: Path) -> bool:
+        tarball = self.gcs.load(self.blob_name(key))
+        if not tarball:
+            return False
+
+        Path(install_path).mkdir(parents=True, exist_ok=True)
+        with tarfile.open(fileobj=io.BytesIO(tarball), mode='r:gz') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(install_path, filter='data')
+            else:
+                tar.extractall(install_path)
+        return True
+
+    def store(self, key: str, install_path: Path) -> None:
+        if not Path(install_path).is_dir():
+            return
+        tarball = io.BytesIO()
+        with tarfile.open(fileobj=tarball, mode='w:gz') as tar:
+            tar.add(install_path, arcname='.')
+        self.gcs.save(self.blob_name(key), tarball.getvalue())
+
+    def warm(self, dbt_project: Dict, profiles: Dict, packages_yml: bytes) -> None:
+        """
+            Runs `dbt deps` in a scratch project and stores the result, unless it is already cached.
+        """
+        key = self.key(packages_yml)
+        if self.gcs.exists(self.blob_name(key)):
+            return
+
+        with tempfile.TemporaryDirectory() as project_dir:
+            (Path(project_dir) / "dbt_project.yml").write_text(yaml.dump(dbt_project))
+            (Path(project_dir) / "profiles.yml").write_text(yaml.dump(profiles))
+            (Path(project_dir) / "packages.yml").write_bytes(packages_yml)
+            subprocess.run(["dbt", "deps", "--project-dir", project_dir, "--profiles-dir", project_dir], cwd=project_dir, check=True)
+            self.store(key, Path(project_dir) / packages_install_path(dbt_project))
+        logging.info(f"dbt packages cached under {self.blob_name(key)}")
+
+
+def is_pinned(packages_yml: bytes) -> bool:
+    """
+        Whether `dbt deps` always installs the same packages: exact hub versions, git commit SHAs, local paths and tarballs.
+    """
+    for package in (yaml.safe_load(packages_yml) or {}).get("packages") or []:
+        if "git" in package:
+            if not re.fullmatch(r"[0-9a-f]{40}", str(package.get("revision", ""))):
+                return False
+        elif "package" in package:
+            versions = package.get("version")
+            versions = versions if isinstance(versions, list) else [versions]
+            if len(versions) != 1 or not re.fullmatch(r"=?\s*\d+\.\d+\.\d+", str(versions[0]).strip()):
+                return False
+        elif "local" not in package and "tarball" not in package:
+            return False
+    return True
+
+
+def packages_install_path(dbt_project: Dict) -> str:
+    return dbt_project.get("packages-install-path", dbt_project.get("modules-path", "dbt_packages"))
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator, List
+
+
+PROFILE_VERSION = 1
+
+
+class RunProfile:
+    """
+        Timings of a job: its stages (context download, manifest load, deps, dbt invoke) and each dbt node
+        it ran, from dbt's NodeStart and NodeFinished events. Times are in seconds since the job started.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.nodes: Dict[str, Dict] = {}
+        self.manifest = None  # Set once loaded, for the nodes' dependencies
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0) + self.elapsed() - start, 3)
+
+    def on_event(self, event) -> None:
+        if event.info.name not in ("NodeStart", "NodeFinished"):
+            return
+
+        node_info = event.data.node_info
+        with self.lock:
+            if event.info.name == "NodeStart":
+                self.nodes[node_info.unique_id] = {"type": node_info.resource_type, "start": round(self.elapsed(), 3)}
+            elif node_info.unique_id in self.nodes:
+                node = self.nodes[node_info.unique_id]
+                node["duration"] = round(self.elapsed() - node["start"], 3)
+                node["status"] = node_info.node_status
+
+    def to_dict(self, uuid: str, run_status: str) -> Dict:
+        with self.lock:
+            nodes = {unique_id: {**node, "depends_on": self.dependencies(unique_id)} for unique_id, node in self.nodes.items() if "duration" in node}
+        path = critical_path(nodes)
+        return {
+            "version": PROFILE_VERSION,
+            "uuid": uuid,
+            "run_status": run_status,
+            "total_seconds": round(self.elapsed(), 3),
+            "stages": self.stages,
+            "nodes": nodes,
+            "critical_path": path,
+            "critical_path_seconds": round(sum(nodes[unique_id]["duration"] for unique_id in path), 3),
+        }
+
+    def dependencies(self, unique_id: str) -> List[str]:
+        node = self.manifest.nodes.get(unique_id) if self.manifest is not None else None
+        depends_on = getattr(getattr(node, "depends_on", None), "nodes", None) or []
+        return [dependency for dependency in depends_on if dependency in self.nodes]
+
+
+def critical_path(nodes: Dict[str, Dict]) -> List[str]:
+    """
+        Longest chain of dependent nodes, by summed duration: the nodes that bounded the run's duration.
+        dbt starts a node once its dependencies are done, so visiting nodes by start time is a topological order.
+    """
+    chain_seconds, previous = {}, {}
+    for unique_id in sorted(nodes, key=lambda unique_id: nodes[unique_id]["start"]):
+        dependencies = [dependency for dependency in nodes[unique_id]["depends_on"] if dependency in chain_seconds]
+        slowest_dependency = max(dependencies, key=chain_seconds.get, default=None)
+        previous[unique_id] = slowest_dependency
+        chain_seconds[unique_id] = nodes[unique_id]["duration"] + (chain_seconds[slowest_dependency] if slowest_dependency else 0)
+
+    path, unique_id = [], max(chain_seconds, key=chain_seconds.get, default=None)
+    while unique_id is not None:
+        path.append(unique_id)
+        unique_id = previous[unique_id]
+    return path[::-1]
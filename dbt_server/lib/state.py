@@ -1,24 +1,68 @@
 import os
-from tempfile import SpooledTemporaryFile
-import tempfile
-from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Dict, Tuple
 from datetime import date, datetime, timezone
+import gzip
+import json
 import logging
+import time
 import traceback
 from uuid import uuid4
 import zipfile
 from pathlib import Path
 
+from fastapi import UploadFile
+from google.cloud.storage import Blob
+import msgpack
 import yaml
 
+from dbt_server.lib.artifact_store import ArtifactStore, InvalidArtifact, MissingArtifacts, hash_bytes, is_valid_path
 from dbt_server.lib.firestore import get_collection
 from dbt_server.lib.dbt_command import DbtCommand
 from dbt_server.lib.gcs import CloudStorage
+from dbt_server.lib.latest_runs import REMOTE_STATE_FOLDER, LatestRuns, RemoteStateNotFound, reference_key
+from dbt_server.lib.manifest_delta import apply_manifest_delta, serialize_manifest
+from dbt_server.lib.metrics import ARTIFACT_UPLOAD_BYTES, ARTIFACT_UPLOAD_SECONDS, GCP_CALL_SECONDS, timed
+from dbt_server.lib.tracing import tracer
 
 BUCKET_NAME = os.getenv('BUCKET_NAME')
+ARTIFACT_UPLOAD_WORKERS = int(os.getenv('ARTIFACT_UPLOAD_WORKERS', '16'))
+LOG_COMPRESSION_LEVEL = int(os.getenv('LOG_COMPRESSION_LEVEL', '6'))
+
+
+@dataclass
+class StateSnapshot:
+    """
+        In-memory copy of a job's Firestore document.
+    """
+    uuid: str
+    run_status: str
+    user_command: str
+    dbt_native_params_overrides: Dict
+    cloud_storage_folder: str
+    artifacts: Dict[str, str]  # {path: sha256}, None for runs created before the artifact store
+    concurrency_key: str = None
+    metrics: Dict = None  # Summary of the run, written by the job when it ends
+    outputs: Dict[str, str] = None  # {path: sha256} of the files the job produced, gzipped in the artifact store
+    remote_state: str = None  # Target name or schedule:<name> whose latest successful run is the --state
+    schedule_name: str = None  # Set on schedules, and copied to their runs
+    log_starting_byte: int = None  # Server-side cursor of /job/<uuid>/last_logs, for older dbt-remote clients
+
+    @classmethod
+    def from_document(cls, document: Dict):
+        return cls(**{field: document.get(field) for field in cls.__dataclass_fields__})
+
+    def to_document(self) -> Dict:
+        return asdict(self)
 
 
 class State:
+    """
+        The job's Firestore document is read once, on first access, and cached in a StateSnapshot.
+        Setters write through to Firestore and to the snapshot. run_status, which the job changes,
+        is only re-read when refresh() is called.
+    """
 
     def __init__(self, dbt_command: DbtCommand = None, uuid: str = None):
         new_state = True if uuid is None else False
@@ -30,9 +74,10 @@ class State:
 
         self.run_logs = DbtRunLogs(self.uuid)
         self.gcs = CloudStorage(bucket_name=BUCKET_NAME)
+        self.artifact_store = ArtifactStore(self.gcs, max_workers=ARTIFACT_UPLOAD_WORKERS)
         self.dbt_collection = get_collection("dbt-status")
-
-        self.run_logs_buffer = []
+        self.log_shipper = None
+        self._snapshot: StateSnapshot = None
 
         if new_state:
             self.init_state()
@@ -45,188 +90,401 @@ class State:
     @classmethod
     def from_schedule_uuid(cls, uuid: str):
         base_state = cls(uuid=uuid)
-        original_state_document_contents = base_state.dbt_collection.document(uuid).get().to_dict()
+        with timed(GCP_CALL_SECONDS, service="firestore", operation="get"):
+            original_state_document_contents = base_state.dbt_collection.document(uuid).get().to_dict()
+        if original_state_document_contents is None:
+            raise JobNotFound(f"Schedule {uuid} not found")
 
         new_uuid = str(uuid4())
         new_state_document_contents = original_state_document_contents
         new_state_document_contents["uuid"] = new_uuid
 
         new_state_document = base_state.dbt_collection.document(new_uuid)
-        new_state_document.set(new_state_document_contents)
+        with timed(GCP_CALL_SECONDS, service="firestore", operation="set"):
+            new_state_document.set(new_state_document_contents)
         state = cls(uuid=new_uuid)
+        state._snapshot = StateSnapshot.from_document(new_state_document_contents)
         return state
 
     def init_state(self):
         document = self.dbt_collection.document(self.uuid)
-        initial_state = {
-            "uuid": self.uuid,
-            "run_status": "scheduled",
-            "user_command": self.dbt_command.user_command,
-            "dbt_native_params_overrides": self.dbt_command.dbt_native_params_overrides,
-            "cloud_storage_folder": "",
-            "log_starting_byte": 0
-        }
-        document.set(initial_state)
-        self.cloud_storage_folder = generate_folder_name(self.uuid)
+        initial_state = StateSnapshot(
+            uuid=self.uuid,
+            run_status="scheduled",
+            user_command=self.dbt_command.user_command,
+            dbt_native_params_overrides=self.dbt_command.dbt_native_params_overrides,
+            cloud_storage_folder=generate_folder_name(self.uuid),
+            artifacts=self.save_context_to_gcs(),
+            concurrency_key=self.dbt_command.concurrency_key,
+            remote_state=self.dbt_command.remote_state,
+        )
+        with timed(GCP_CALL_SECONDS, service="firestore", operation="set"):
+            document.set(initial_state.to_document())
+        self._snapshot = initial_state
         self.run_logs.init_log_file()
-        self.save_context_to_gcs()
 
     @property
-    def run_status(self) -> str:
+    def snapshot(self) -> StateSnapshot:
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> StateSnapshot:
+        with timed(GCP_CALL_SECONDS, service="firestore", operation="get"):
+            document = self.dbt_collection.document(self.uuid).get().to_dict()
+        if document is None:
+            raise JobNotFound(f"Job {self.uuid} not found")
+        self._snapshot = StateSnapshot.from_document(document)
+        return self._snapshot
+
+    def update(self, **fields) -> None:
         document = self.dbt_collection.document(self.uuid)
-        run_status = document.get().to_dict()["run_status"]
-        return run_status
+        with timed(GCP_CALL_SECONDS, service="firestore", operation="update"):
+            document.update(fields)
+        if self._snapshot is not None:
+            for field, value in fields.items():
+                setattr(self._snapshot, field, value)
+
+    @property
+    def run_status(self) -> str:
+        return self.snapshot.run_status
 
     @run_status.setter
     def run_status(self, new_status: str):
-        status_ref = self.dbt_collection.document(self.uuid)
-        status_ref.update({"run_status": new_status})
+        self.update(run_status=new_status)
 
     @property
     def user_command(self) -> str:
-        document = self.dbt_collection.document(self.uuid)
-        user_command = document.get().to_dict()["user_command"]
-        self._user_command = user_command
-        return user_command
+        return self.snapshot.user_command
 
     @user_command.setter
     def user_command(self, user_command: str):
-        document = self.dbt_collection.document(self.uuid)
-        document.update({"user_command": user_command})
+        self.update(user_command=user_command)
 
     @property
     def dbt_native_params_overrides(self) -> dict:
-        document = self.dbt_collection.document(self.uuid)
-        dbt_native_params_overrides = document.get().to_dict()["dbt_native_params_overrides"]
-        return dbt_native_params_overrides
+        return self.snapshot.dbt_native_params_overrides
 
     @dbt_native_params_overrides.setter
     def dbt_native_params_overrides(self, dbt_native_params_overrides: dict):
-        document = self.dbt_collection.document(self.uuid)
-        document.update({"dbt_native_params_overrides": dbt_native_params_overrides})
-
-    @property
-    def log_starting_byte(self) -> int:
-        document = self.dbt_collection.document(self.uuid)
-        log_starting_byte = document.get().to_dict()["log_starting_byte"]
-        return log_starting_byte
-
-    @log_starting_byte.setter
-    def log_starting_byte(self, new_log_starting_byte: int):
-        document = self.dbt_collection.document(self.uuid)
-        document.update({"log_starting_byte": new_log_starting_byte})
+        self.update(dbt_native_params_overrides=dbt_native_params_overrides)
 
     @property
     def cloud_storage_folder(self) -> str:
-        document = self.dbt_collection.document(self.uuid)
-        cloud_storage_folder = document.get().to_dict()["cloud_storage_folder"]
-        return cloud_storage_folder
+        return self.snapshot.cloud_storage_folder
 
     @cloud_storage_folder.setter
     def cloud_storage_folder(self, cloud_storage_folder: str):
-        document = self.dbt_collection.document(self.uuid)
-        document.update({"cloud_storage_folder": cloud_storage_folder})
+        self.update(cloud_storage_folder=cloud_storage_folder)
+
+    @property
+    def concurrency_key(self) -> str:
+        return self.snapshot.concurrency_key
 
-    def extract_artifacts(self, zipped_artifacts: SpooledTemporaryFile) -> None:
-        logging.info("cloud_storage_folder :" + self.cloud_storage_folder)
-        with tempfile.TemporaryDirectory() as temp_dir:
+    @property
+    def metrics(self) -> Dict:
+        return self.snapshot.metrics
 
-            temp_dir_path = Path(temp_dir)
-            artifacts_zip_path = temp_dir_path / 'artifacts.zip'
-            with artifacts_zip_path.open('wb') as f:
-                f.write(zipped_artifacts.file._file.getvalue())
+    @metrics.setter
+    def metrics(self, metrics: Dict):
+        self.update(metrics=metrics)
 
-            with zipfile.ZipFile(artifacts_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            artifacts_zip_path.unlink()
+    @property
+    def remote_state(self) -> str:
+        return self.snapshot.remote_state
 
-            for file_path in temp_dir_path.rglob('*'):
-                if file_path.is_file():
-                    relative_path = file_path.relative_to(temp_dir_path)
-                    with open(file_path, 'r') as file:
-                        data = file.read()
-                    self.gcs.save(str(Path(self.cloud_storage_folder) / relative_path), data)
+    @property
+    def schedule_name(self) -> str:
+        return self.snapshot.schedule_name
+
+    @schedule_name.setter
+    def schedule_name(self, schedule_name: str):
+        self.update(schedule_name=schedule_name)
+
+    def resolve_remote_state(self) -> None:
+        """
+            Adds the manifest of the latest successful run `remote_state` points to as an artifact of this run,
+            in REMOTE_STATE_FOLDER, and passes that folder to dbt as --state. Resolved when each run starts,
+            so that the runs of a schedule compare against the latest state.
+        """
+        if self.remote_state is None:
+            return
+
+        profile = self.concurrency_key.split("/")[0] if self.concurrency_key is not None else None  # <profile>/<target>
+        latest_run = LatestRuns(self.gcs).get(reference_key(self.remote_state, profile))
+        if latest_run is None:
+            raise RemoteStateNotFound(f"No successful build, run, seed or snapshot found for {self.remote_state}")
+
+        self.update(
+            artifacts={**self.artifacts, f"{REMOTE_STATE_FOLDER}/manifest.json": latest_run["manifest"]},
+            user_command=f"{self.user_command} --state {REMOTE_STATE_FOLDER}",
+        )
 
-    def save_context_to_gcs(self) -> None:
-        logging.info("cloud_storage_folder :" + self.cloud_storage_folder)
-        self.gcs.save(self.cloud_storage_folder + "/dbt_project.yml", str(yaml.dump(self.dbt_command.dbt_project)))
-        self.gcs.save(self.cloud_storage_folder + "/profiles.yml", str(yaml.dump(self.dbt_command.profiles)))
-        self.gcs.save(self.cloud_storage_folder + "/packages.yml", str(yaml.dump(self.dbt_command.packages)))
+    @property
+    def outputs(self) -> Dict[str, str]:
+        return self.snapshot.outputs or {}
+
+    def save_output(self, path: str, data: bytes) -> str:
+        output_hash = self.artifact_store.save(gzip.compress(data, mtime=0))
+        self.update(outputs={**self.outputs, path: output_hash})
+        return output_hash
+
+    @tracer.start_as_current_span("State.save_output_files")
+    def save_output_files(self, files: Dict[str, Path]) -> None:
+        """
+            Gzips and stores the job's output files in parallel, then records them in a single State update.
+            gzip's header has no timestamp (mtime=0), so an unchanged file is stored once across runs.
+        """
+        def save(file_path: Path) -> str:
+            return self.artifact_store.save(gzip.compress(Path(file_path).read_bytes(), mtime=0))
+
+        with ThreadPoolExecutor(max_workers=ARTIFACT_UPLOAD_WORKERS) as executor:
+            hashes = list(executor.map(save, files.values()))
+        self.update(outputs={**self.outputs, **dict(zip(files, hashes))})
+
+    def load_output(self, path: str) -> bytes:
+        """
+            Returns None if the job did not produce the file (yet).
+        """
+        output_hash = self.outputs.get(path)
+        return gzip.decompress(self.artifact_store.load(output_hash)) if output_hash is not None else None
 
+    @property
+    def artifacts(self) -> Dict[str, str]:
+        return self.snapshot.artifacts
+
+    @artifacts.setter
+    def artifacts(self, artifacts: Dict[str, str]):
+        self.update(artifacts=artifacts)
+
+    @tracer.start_as_current_span("State.extract_artifacts")
+    def extract_artifacts(self, zipped_artifacts: UploadFile, declared_artifacts: Dict[str, str] = None) -> None:
+        """
+            Streams each member of the uploaded zip to the artifact store, without extracting it to disk.
+            At most ARTIFACT_UPLOAD_WORKERS files are uploaded at the same time.
+            `declared_artifacts` maps the paths of all the run's artifacts to their sha256: the client
+            only zips those the store does not already have, the others are referenced by hash.
+        """
+        declared_artifacts = declared_artifacts or {}
+        zipped_artifacts.file.seek(0)
+        with zipfile.ZipFile(zipped_artifacts.file, 'r') as zip_ref:
+            members = [member for member in zip_ref.infolist() if not member.is_dir()]
+            invalid_paths = [path for path in [*declared_artifacts, *(member.filename for member in members)] if not is_valid_path(path)]
+            if invalid_paths:
+                raise InvalidArtifact(f"Invalid artifact paths: {invalid_paths}")
+
+            ARTIFACT_UPLOAD_BYTES.observe(sum(member.file_size for member in members))
+            with timed(ARTIFACT_UPLOAD_SECONDS), ThreadPoolExecutor(max_workers=ARTIFACT_UPLOAD_WORKERS) as executor:
+                hashes = list(executor.map(lambda member: self.upload_artifact(zip_ref, member), members))
+        uploaded_artifacts = {member.filename: artifact_hash for member, artifact_hash in zip(members, hashes)}
+
+        artifacts = {**declared_artifacts, **uploaded_artifacts}
+        missing_hashes = self.artifact_store.missing(
+            artifact_hash for path, artifact_hash in declared_artifacts.items() if path not in uploaded_artifacts
+        )
+        if missing_hashes:
+            raise MissingArtifacts(f"Artifacts referenced but neither uploaded nor stored: {missing_hashes}")
+
+        self.artifacts = {**self.artifacts, **artifacts}
+
+    @tracer.start_as_current_span("State.apply_manifest_delta")
+    def apply_manifest_delta(self, manifest_delta: UploadFile, manifest_hash: str) -> None:
+        """
+            Rebuilds the run's manifest from a delta against a manifest already in the artifact store.
+            The rebuilt manifest must have the hash the client computed for its manifest, `manifest_hash`.
+        """
+        manifest_delta.file.seek(0)
+        delta = json.load(manifest_delta.file)
+        base_hash = delta.get("base")
+        if self.artifact_store.missing([base_hash]):
+            raise MissingArtifacts(f"Manifest delta base {base_hash} is not stored")
+
+        base_manifest = json.loads(self.artifact_store.load(base_hash))
+        manifest = apply_manifest_delta(base_manifest, delta)
+        manifest_data = serialize_manifest(manifest)
+        if hash_bytes(manifest_data) != manifest_hash:
+            raise InvalidArtifact(f"Manifest rebuilt from the delta does not have the expected hash {manifest_hash}")
+        self.artifact_store.save(manifest_data)
+        self.artifacts = {**self.artifacts, "manifest.json": manifest_hash}
+        self.save_manifest_msgpack(manifest)
+
+    @tracer.start_as_current_span("State.save_manifest_msgpack")
+    def save_manifest_msgpack(self, manifest: Dict = None) -> None:
+        """
+            Stores the manifest in the msgpack form Manifest.from_msgpack reads, so that the job skips
+            the JSON parsing and re-encoding. It is computed once per manifest hash.
+        """
+        manifest_hash = self.artifacts.get("manifest.json")
+        if manifest_hash is None:
+            return
+
+        msgpack_hash = self.artifact_store.get_derived(manifest_hash, "msgpack")
+        if msgpack_hash is None or self.artifact_store.missing([msgpack_hash]):
+            if manifest is None:
+                manifest = json.loads(self.artifact_store.load(manifest_hash))
+            msgpack_hash = self.artifact_store.save(msgpack.packb(manifest))
+            self.artifact_store.set_derived(manifest_hash, "msgpack", msgpack_hash)
+        self.artifacts = {**self.artifacts, "manifest.msgpack": msgpack_hash}
+
+    def upload_artifact(self, zip_ref: zipfile.ZipFile, member: zipfile.ZipInfo) -> str:
+        with zip_ref.open(member) as file:
+            return self.artifact_store.save_file(file, size=member.file_size)
+
+    def save_context_to_gcs(self) -> Dict[str, str]:
+        return {
+            "dbt_project.yml": self.artifact_store.save(yaml.dump(self.dbt_command.dbt_project).encode('utf-8')),
+            "profiles.yml": self.artifact_store.save(yaml.dump(self.dbt_command.profiles).encode('utf-8')),
+            "packages.yml": self.artifact_store.save(yaml.dump(self.dbt_command.packages).encode('utf-8')),
+        }
 
+    @tracer.start_as_current_span("State.save_context_to_local")
     def save_context_to_local(self) -> None:
         logging.info(f"load data from folder {self.cloud_storage_folder}")
 
-        blob_context_files = self.gcs.get_files_from_folder(self.cloud_storage_folder)
-        write_files(blob_context_files)
+        if self.artifacts is not None:
+            artifacts = {path: artifact_hash for path, artifact_hash in self.artifacts.items()
+                         if not (path == "manifest.json" and "manifest.msgpack" in self.artifacts)}
+            self.artifact_store.download_all(artifacts, Path('.'))
+            return
+
+        self.gcs.download_folder(self.cloud_storage_folder, Path('.'), max_workers=ARTIFACT_UPLOAD_WORKERS)
 
-        blob_seed_files = self.gcs.get_files_from_folder(self.cloud_storage_folder + '/seeds')
-        write_files(blob_seed_files, 'seeds/')
+    def get_logs(self, offset: int = 0, limit: int = None) -> Tuple[List[str], int]:
+        """
+            Returns at most `limit` log lines starting at byte `offset`, and the offset of the next line.
+            This is a pure read: the cursor is held by the caller.
+        """
+        logs, byte_length = self.run_logs.get(offset, limit)
+        return logs, offset + byte_length
 
     def get_last_logs(self) -> List[str]:
-        logs, byte_length = self.run_logs.get(self.log_starting_byte)
-        if byte_length != 0:
-            self.log_starting_byte += byte_length + 1
+        """
+            The logs written since the previous call, for dbt-remote clients predating the `offset` of /logs.
+            Their cursor is kept in the State, as they expect.
+        """
+        logs, next_offset = self.get_logs(self.snapshot.log_starting_byte or 0)
+        if logs:
+            self.update(log_starting_byte=next_offset)
         return logs
 
     def log(self, severity: str, new_log: str) -> None:
-        if self.run_logs_buffer == []:
-            all_previous_logs = self.get_all_logs()
-            self.run_logs_buffer = all_previous_logs
-
         dt_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
         new_log = (f"{dt_time}\t{severity}\t{new_log}")
-
-        self.run_logs_buffer.append(new_log)
-        self.run_logs.log(self.run_logs_buffer)
-
-    def get_all_logs(self) -> List[str]:
-        logs, _ = self.run_logs.get(0)
-        return logs
+        if self.log_shipper is not None:
+            self.log_shipper.submit(new_log)
+        else:
+            self.run_logs.log([new_log])
 
 
 class DbtRunLogs:
+    """
+        Run logs are stored as append-only segments under logs/<uuid>/, one object per write, and byte
+        offsets are computed over the concatenation of all segments in name order.
+        Segments are numbered in sequence rather than by the writers' clocks, and a number is only taken once
+        (see create_segment), so that a segment written late by the server or the job can never be inserted
+        before ones already read. Segments are gzipped, with their uncompressed size in their metadata, so that offsets
+        are computed from the listing alone. Runs created before segments have a single logs/<uuid>.txt file
+        instead, still read as their only segment.
+    """
 
     def __init__(self, uuid: str):
         self.uuid = uuid
 
-        self.log_file = f'logs/{uuid}.txt'
+        self.log_folder = f'logs/{uuid}/'
+        self.legacy_log_file = f'logs/{uuid}.txt'
+        self.writer_id = uuid4().hex[:8]
+        self.next_segment = 0
         self.gcs = CloudStorage(bucket_name=BUCKET_NAME)
 
     def init_log_file(self) -> None:
         dt_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        self.gcs.save(self.log_file, dt_time+"\tINFO\tInit")
-
-    def get(self, starting_byte: int = 0) -> Tuple[List[str], int]:
-        current_log_file = self.gcs.load(self.log_file, starting_byte)
-        byte_length = len(current_log_file)
-        if byte_length == 0:
-            return [], byte_length
-        run_logs = current_log_file.decode('utf-8').split('\n')
+        self.log([dt_time+"\tINFO\tInit"])
+
+    def get(self, starting_byte: int = 0, limit: int = None) -> Tuple[List[str], int]:
+        run_logs, byte_length = [], 0
+        for chunk in self.read_segments(starting_byte):
+            chunk_logs = chunk.decode('utf-8').split('\n')[:-1]  # Not splitlines(), which also splits on \r, \x85, \u2028...
+            if limit is not None and len(run_logs) + len(chunk_logs) >= limit:
+                chunk_logs = chunk_logs[:limit - len(run_logs)]
+                run_logs += chunk_logs
+                byte_length += sum(len(log.encode('utf-8')) + 1 for log in chunk_logs)
+                break
+            run_logs += chunk_logs
+            byte_length += len(chunk)
         return run_logs, byte_length
 
-    def log(self, logs: List[str]) -> None:
-        new_log_file = '\n'.join(logs)
+    def read_segments(self, starting_byte: int = 0) -> Iterator[bytes]:
+        """
+            Yields the log segments' contents from `starting_byte`, downloading them one at a time.
+            Offsets always fall on a line boundary, so every chunk is made of whole lines.
+        """
+        segments = self.gcs.list(self.log_folder)
+        if not segments:  # New runs always have the Init segment
+            yield from self.read_legacy_log_file(starting_byte)
+            return
+
+        segment_start = 0
+        for segment in segments:
+            segment_end = segment_start + segment_size(segment)
+            if segment_end > starting_byte:
+                # Segments are small, read whole then sliced
+                yield gzip.decompress(self.gcs.load(segment.name))[max(starting_byte - segment_start, 0):]
+            segment_start = segment_end
+
+    def read_legacy_log_file(self, starting_byte: int = 0) -> Iterator[bytes]:
+        """
+            The single log file of older runs, whose lines are joined by newlines without a trailing one.
+        """
+        logs = self.gcs.load(self.legacy_log_file)
+        if logs and not logs.endswith(b"\n"):
+            logs += b"\n"
+        if len(logs) > starting_byte:
+            yield logs[starting_byte:]
+
+    def log(self, logs: List[str]) -> bool:
+        if len(logs) == 0:
+            return True
+        segment = ''.join(f"{log}\n" for log in logs).encode('utf-8')
+        data = gzip.compress(segment, compresslevel=LOG_COMPRESSION_LEVEL, mtime=0)
         try:
-            self.gcs.save(self.log_file, new_log_file)
+            self.create_segment(data, {"size": str(len(segment)), "writer": self.writer_id})
+            return True
         except Exception:
             traceback_str = traceback.format_exc()
             print("Error", "Error uploading log to bucket")
             print(traceback_str)
+            return False
 
+    def create_segment(self, data: bytes, metadata: Dict[str, str]) -> None:
+        """
+            Creates the segment after the last one this writer knows of. If another writer created it first,
+            retries after the last listed segment, unless it is this writer's own: an upload retried after it succeeded.
+        """
+        while not self.gcs.create(self.segment_name(self.next_segment), data, metadata):
+            segments = {segment.name: segment for segment in self.gcs.list(self.log_folder)}
+            taken = segments.get(self.segment_name(self.next_segment))
+            if taken is not None and (taken.metadata or {}).get("writer") == self.writer_id:
+                break
+            self.next_segment = int(max(segments).removeprefix(self.log_folder).split(".")[0]) + 1
+        self.next_segment += 1
+
+    def segment_name(self, number: int) -> str:
+        return f"{self.log_folder}{number:020d}.txt.gz"
+
+
+def segment_size(segment: Blob) -> int:
+    """
+        Uncompressed size of a log segment, stored in its metadata.
+    """
+    return int(segment.metadata["size"])
 
-def write_files(files: Dict[str, bytes], prefix: str = ""):
-    for filename in files.keys():
-        try:
-            with open(prefix + filename, 'wb') as f:
-                f.write(files[filename])
-        except Exception:
-            traceback_str = traceback.format_exc()
-            print("ERROR", f"Couldn't write file {filename}")
-            print(traceback_str)
 
 def generate_folder_name(uuid: str) -> str:
     today = date.today()
     today_str = today.strftime("%Y-%m-%d")
     cloud_storage_folder = f"{today_str}-{uuid}"
     return cloud_storage_folder
+
+
+class JobNotFound(Exception):
+    pass
@@ -0,0 +1,111 @@
+"""
+    OpenTelemetry tracing of a run, from the command's submission to the dbt nodes' execution.
+    The server passes the trace context to the job in the TRACEPARENT environment variable
+    (W3C Trace Context format), so that the job's spans are children of the server's.
+"""
+from functools import cache
+import os
+import sys
+import threading
+from typing import Callable, Dict
+
+from opentelemetry import context, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")  # none, console or file
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACEPARENT_ENV = "TRACEPARENT"
+
+
+tracer = trace.get_tracer("dbt_server")
+propagator = TraceContextTextMapPropagator()
+
+
+@cache
+def init_tracing(service_name: str) -> None:
+    """
+        Sets the process' tracer provider once. Spans are exported as one JSON object per line,
+        to stdout with TRACE_EXPORTER=console or to TRACE_FILE with TRACE_EXPORTER=file.
+    """
+    if TRACE_EXPORTER == "none":
+        return
+
+    out = open(TRACE_FILE, "a") if TRACE_EXPORTER == "file" else sys.stdout
+    exporter = ConsoleSpanExporter(
+        service_name=service_name, out=out, formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def flush_traces() -> None:
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.force_flush()
+
+
+def current_traceparent() -> str:
+    carrier = {}
+    propagator.inject(carrier)
+    return carrier.get("traceparent", "")
+
+
+def context_from_traceparent(traceparent: str = None) -> context.Context:
+    return propagator.extract({"traceparent": traceparent} if traceparent else {})
+
+
+def with_current_context(function: Callable) -> Callable:
+    """
+        Binds `function` to the current trace context, for calls made later from another thread (e.g. the job queue).
+    """
+    trace_context = context.get_current()
+
+    def run_in_context(*args, **kwargs):
+        token = context.attach(trace_context)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            context.detach(token)
+
+    return run_in_context
+
+
+class DbtNodeSpans:
+    """
+        Turns dbt's NodeStart and NodeFinished events into one span per node, children of the span
+        current when it is created. dbt sends these events from its worker threads, hence the explicit parent.
+    """
+
+    def __init__(self):
+        self.parent_context = context.get_current()
+        self.lock = threading.Lock()
+        self.spans: Dict[str, trace.Span] = {}
+
+    def on_event(self, event) -> None:
+        if event.info.name not in ("NodeStart", "NodeFinished"):
+            return
+
+        node_info = event.data.node_info
+        with self.lock:
+            if event.info.name == "NodeStart":
+                self.spans[node_info.unique_id] = tracer.start_span(
+                    node_info.unique_id,
+                    context=self.parent_context,
+                    attributes={"dbt.resource_type": node_info.resource_type, "dbt.materialized": node_info.materialized},
+                )
+            elif (span := self.spans.pop(node_info.unique_id, None)) is not None:
+                span.set_attribute("dbt.node_status", node_info.node_status)
+                span.end()
+
+    def end(self) -> None:
+        """
+            Ends the spans of the nodes dbt started but never finished, e.g. when the run was interrupted.
+        """
+        with self.lock:
+            for span in self.spans.values():
+                span.end()
+            self.spans.clear()
@@ -1,14 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+import gzip
+import json
 import os
+import re
+import time
 import traceback
+import zlib
+from typing import AsyncIterator, Callable, Dict, List, Tuple
 
+from anyio import to_thread
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import BackgroundTasks, Body, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from cron_descriptor import get_description
-
-from dbt_server.lib.dbt_cloud_run_job import DbtCloudRunJobStarter, DbtCloudRunJobConfig, DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed
+from opentelemetry import trace
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import yaml
+
+from dbt_server.lib.clients import close_clients, init_clients
+from dbt_server.lib.artifact_store import ArtifactStore, InvalidArtifact, MissingArtifacts
+from dbt_server.lib.dbt_cloud_run_job import DbtCloudRunJobConfig, DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed
+from dbt_server.lib.dbt_local_job import LOCAL_JOB_WARM_WORKERS, DbtLocalJobStartFailed, dispatch_stats, shutdown_local_pool, warm_up_local_pool
+from dbt_server.lib.job_executors import get_job_starter
+from dbt_server.lib.job_queue import AD_HOC_PRIORITY, SCHEDULED_PRIORITY, JobQueue
+from dbt_server.lib.job_watcher import JobWatcher
+from dbt_server.lib.latest_runs import RemoteStateNotFound
 from dbt_server.lib.dbt_command import DbtCommand, ScheduledDbtCommand
+from dbt_server.lib.gcs import CloudStorage
+from dbt_server.lib.metrics import REQUEST_SECONDS
+from dbt_server.lib.package_cache import PackageCache
 from dbt_server.lib.cloud_scheduler import CloudScheduler, SchedulerHTTPJobSpec
-from dbt_server.lib.state import State
+from dbt_server.lib.state import LOG_COMPRESSION_LEVEL, JobNotFound, State
+from dbt_server.lib.tracing import init_tracing, tracer, with_current_context
 from dbt_server.lib.logger import DbtLogger
 from dbt_server.version import __version__
 
@@ -20,37 +45,100 @@ LOCATION = os.getenv("LOCATION")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 PORT = os.environ.get("PORT", "8001")
 SCHEDULED_JOB_DESC_PREFIX = "[dbt-server job] "
+TERMINAL_RUN_STATUSES = ["success", "failed"]
+LOG_STREAM_POLL_INTERVAL = float(os.getenv("LOG_STREAM_POLL_INTERVAL", "0.5"))
+LOG_STREAM_MAX_POLL_INTERVAL = float(os.getenv("LOG_STREAM_MAX_POLL_INTERVAL", "5"))
+LOG_STREAM_END_GRACE = float(os.getenv("LOG_STREAM_END_GRACE", "3"))
+LOG_STREAM_HEARTBEAT = float(os.getenv("LOG_STREAM_HEARTBEAT", "15"))
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "40"))
+REUSE_CLOUD_RUN_JOB = os.getenv("REUSE_CLOUD_RUN_JOB", "false").lower() == "true"
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "cloud_run")
+MAX_RUNNING_JOBS = int(os.getenv("MAX_RUNNING_JOBS", "0"))
+MAX_RUNNING_JOBS_PER_TARGET = int(os.getenv("MAX_RUNNING_JOBS_PER_TARGET", "0"))
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv("JOB_QUEUE_POLL_INTERVAL", "5"))
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Endpoints calling the GCP SDKs are sync functions, run by FastAPI in this bounded thread pool
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    init_tracing("dbt-server")
+    await run_in_threadpool(init_clients)
+    try:
+        restored = await run_in_threadpool(job_queue.restore, restored_job_start)
+        if restored:
+            print("INFO", f"Re-queued {restored} jobs queued before the server restarted")
+        for uuid in job_queue.uuids():
+            job_watcher.watch(uuid)
+    except Exception:
+        print("ERROR", "Could not restore the job queue")
+        print(traceback.format_exc())
+    if JOB_EXECUTOR != "cloud_run" and LOCAL_JOB_WARM_WORKERS:
+        warm_up_local_pool()
+    yield
+    shutdown_local_pool()
+    close_clients()
+
+
+job_queue = JobQueue(
+    max_running=MAX_RUNNING_JOBS,
+    max_running_per_key=MAX_RUNNING_JOBS_PER_TARGET,
+    poll_interval=JOB_QUEUE_POLL_INTERVAL,
+)
+job_watcher = JobWatcher(poll_interval=JOB_QUEUE_POLL_INTERVAL)
+
 
 app = FastAPI(
     title="dbt-server",
     description="A server to run dbt commands in the cloud",
     version="0.0.1",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan,
 )
 
+
+@app.exception_handler(JobNotFound)
+async def job_not_found(request: Request, exc: JobNotFound):
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": exc.args[0]})
+
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        method=request.method,
+        route=route.path if route is not None else "unmatched",  # The path template, to keep the label's cardinality low
+        status=response.status_code,
+    ).observe(time.perf_counter() - start)
+    return response
+
+
 @app.post("/dbt", status_code=status.HTTP_202_ACCEPTED)
-async def run_command(dbt_command: DbtCommand = Depends()):
+@tracer.start_as_current_span("run_command")
+def run_command(dbt_command: DbtCommand = Depends()):
     try:
         logger = DbtLogger(server=True)
         logger.log("INFO", f"Received command: {dbt_command.user_command}")
 
         state = State(dbt_command)
+        trace.get_current_span().set_attribute("dbt.uuid", state.uuid)
         logger.log("INFO", f"Assigned job id: '{state.uuid}'")
         logger.state = state
-        state.extract_artifacts(dbt_command.zipped_artifacts)
-
-        job_conf = DbtCloudRunJobConfig(
-            uuid=state.uuid,
-            dbt_command=dbt_command.user_command,
-            project_id=PROJECT_ID,
-            location=LOCATION,
-            service_account=SERVICE_ACCOUNT,
-            job_docker_image=DOCKER_IMAGE,
-            artifacts_bucket_name=BUCKET_NAME
-        )
-        DbtCloudRunJobStarter(job_conf, logger).start()
-
-    except (DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed) as e:
+        state.extract_artifacts(dbt_command.zipped_artifacts, dbt_command.artifacts)
+        if dbt_command.manifest_delta is not None:
+            state.apply_manifest_delta(dbt_command.manifest_delta, dbt_command.manifest_hash)
+        else:
+            state.save_manifest_msgpack()
+        state.resolve_remote_state()
+
+        job_starter = get_job_starter_for(state, logger)
+        started = job_queue.submit(state.uuid, dbt_command.concurrency_key, AD_HOC_PRIORITY, with_current_context(job_starter.start))
+        job_watcher.watch(state.uuid)
+
+    except (DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed, DbtLocalJobStartFailed, InvalidArtifact, MissingArtifacts, RemoteStateNotFound) as e:
         traceback_str = traceback.format_exc()
         raise HTTPException(status_code=400, detail=f"{e.args[0]}\n{traceback_str}")
 
@@ -60,46 +148,291 @@ async def run_command(dbt_command: DbtCommand = Depends()):
 
     return {
         "uuid": state.uuid,
-        "message": f"Job created with uuid: {state.uuid}",
+        "message": f"Job {'created' if started else 'queued'} with uuid: {state.uuid}",
+        "manifest_hash": state.artifacts.get("manifest.json"),
         "links": {
             "run_status": f"{dbt_command.server_url}job/{state.uuid}",
+            "logs": f"{dbt_command.server_url}job/{state.uuid}/logs",
+            "stream": f"{dbt_command.server_url}job/{state.uuid}/stream",
             "last_logs": f"{dbt_command.server_url}job/{state.uuid}/last_logs",
         }
     }
 
 
+def get_job_starter_for(state: State, logger: DbtLogger):
+    job_conf = DbtCloudRunJobConfig(
+        uuid=state.uuid,
+        dbt_command=state.user_command,
+        project_id=PROJECT_ID,
+        location=LOCATION,
+        service_account=SERVICE_ACCOUNT,
+        job_docker_image=DOCKER_IMAGE,
+        artifacts_bucket_name=BUCKET_NAME,
+        reuse_job=REUSE_CLOUD_RUN_JOB,
+    )
+    return get_job_starter(JOB_EXECUTOR, state.user_command)(job_conf, logger, state)
+
+
+def restored_job_start(uuid: str) -> Callable[[], None]:
+    """
+        Starts a job queued before the server restarted, once the job queue admits it.
+    """
+    def start() -> None:
+        state = State.from_uuid(uuid)
+        logger = DbtLogger(server=True)
+        logger.state = state
+        logger.log("INFO", f"Starting job {uuid}, queued before the server restarted")
+        get_job_starter_for(state, logger).start()
+    return start
+
+
 @app.get("/job/{uuid}", status_code=status.HTTP_200_OK)
-async def get_job_status(uuid: str):
+def get_job_status(uuid: str):
     job_state = State.from_uuid(uuid)
-    run_status = job_state.run_status
-    return {"run_status": run_status}
+    return {"run_status": job_state.run_status}
 
 
-@app.get("/job/{uuid}/last_logs", status_code=status.HTTP_200_OK)
-async def get_last_logs(uuid: str):
+@app.get("/job/{uuid}/logs", status_code=status.HTTP_200_OK)
+def get_logs(
+    uuid: str,
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, gt=0),
+    accept_encoding: str | None = Header(None),
+):
     job_state = State.from_uuid(uuid)
-    logs = job_state.get_last_logs()
-    run_status = job_state.run_status
-    return {"run_logs": logs, "run_status": run_status, "uuid": uuid}
+    logs, next_offset = job_state.get_logs(offset, limit)
+
+    # Log segments are append-only: a full page never changes, while a short one may still grow. Full pages
+    # are cached, so they leave out the run status, which changes: it is in the last page and at /job/<uuid>
+    page_is_final = limit is not None and len(logs) == limit
+    page = {"run_logs": logs, "next_offset": next_offset, "uuid": uuid}
+    if not page_is_final:
+        page["run_status"] = job_state.run_status
+    headers = {"Cache-Control": "private, max-age=86400, immutable" if page_is_final else "no-cache", "Vary": "Accept-Encoding"}
+    content = json.dumps(page).encode('utf-8')
+    if accepts_gzip(accept_encoding) and len(content) >= GZIP_MIN_SIZE:
+        content = gzip.compress(content, compresslevel=LOG_COMPRESSION_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content, media_type="application/json", headers=headers)
 
 
-@app.get("/job/{uuid}/logs", status_code=status.HTTP_200_OK)
-async def get_all_logs(uuid: str):
+@app.get("/job/{uuid}/last_logs", status_code=status.HTTP_200_OK)
+def get_last_logs(uuid: str):
+    """
+        The logs written since the previous call, for dbt-remote clients predating /logs offsets and /stream.
+    """
+    job_state = State.from_uuid(uuid)
+    logs = job_state.get_last_logs()
+    return {"run_logs": logs, "run_status": job_state.run_status, "uuid": uuid}
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+        Whether the Accept-Encoding header accepts gzip, by name or through `*`, with a quality above 0.
+    """
+    qualities = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *parameters = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+@app.get("/job/{uuid}/profile", status_code=status.HTTP_200_OK)
+def get_run_profile(uuid: str):
+    profile = State.from_uuid(uuid).load_output("profile.json")
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for job {uuid}: the job has not finished yet")
+    # Outputs are content-addressed, a stored profile never changes
+    return Response(profile, media_type="application/json", headers={"Cache-Control": "private, max-age=86400, immutable"})
+
+
+@app.get("/job/{uuid}/artifacts", status_code=status.HTTP_200_OK)
+def list_run_artifacts(uuid: str):
+    job_state = State.from_uuid(uuid)
+    return {"artifacts": sorted(run_artifacts(job_state)), "run_status": job_state.run_status}
+
+
+@app.get("/job/{uuid}/artifacts/{name:path}", status_code=status.HTTP_200_OK)
+def get_run_artifact(
+    uuid: str,
+    name: str,
+    range_header: str | None = Header(None, alias="Range"),
+    if_none_match: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+):
+    """
+        Serves a file produced by the job (run_results.json, compiled.tar...) or the manifest the run was sent.
+        Job outputs are stored gzipped and sent as such to clients accepting gzip. Blobs are content-addressed,
+        so their hash is a strong ETag. Single byte ranges are supported, on the representation sent: only the
+        range is read from Cloud Storage when the stored bytes are sent, while a gzipped output sent decompressed
+        is read whole, as a gzip stream cannot be decompressed from the middle.
+    """
     job_state = State.from_uuid(uuid)
-    logs = job_state.get_all_logs()
-    run_status = job_state.run_status
-    return {"run_logs": logs, "run_status": run_status, "uuid": uuid}
+    gzipped = name in job_state.outputs
+    artifact_hash = run_artifacts(job_state).get(name)
+    if artifact_hash is None:
+        raise HTTPException(status_code=404, detail=f"Job {uuid} has no artifact {name}")
+
+    send_gzipped = gzipped and accepts_gzip(accept_encoding)
+    etag = f'"{artifact_hash}"' if send_gzipped or not gzipped else f'"{artifact_hash}-identity"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding", "Cache-Control": "private, max-age=86400, immutable"}
+    if send_gzipped:
+        headers["Content-Encoding"] = "gzip"
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = "application/json" if name.endswith(".json") else "application/octet-stream"
+    data = None
+    if range_header is None or (gzipped and not send_gzipped):
+        data = job_state.artifact_store.load(artifact_hash)
+        if gzipped and not send_gzipped:
+            data = gzip.decompress(data)
+        size = len(data)
+    else:
+        size = job_state.artifact_store.size(artifact_hash)
+
+    byte_range = parse_byte_range(range_header, size) if range_header is not None else None
+    if byte_range is None:
+        data = data if data is not None else job_state.artifact_store.load(artifact_hash)
+        return Response(data, media_type=media_type, headers=headers)
+    start, end = byte_range
+    if start >= size:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    data = data[start:end + 1] if data is not None else job_state.artifact_store.load(artifact_hash, start, end)
+    return Response(data, status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type, headers=headers)
+
+
+def run_artifacts(job_state: State) -> Dict[str, str]:
+    """
+        The job's outputs, and the manifest sent with the command when dbt did not write one. Other files sent
+        with the command (e.g. profiles.yml) are not served.
+    """
+    sent_manifest = {"manifest.json": job_state.artifacts["manifest.json"]} if "manifest.json" in (job_state.artifacts or {}) else {}
+    return {**sent_manifest, **job_state.outputs}
+
+
+def parse_byte_range(range_header: str, size: int) -> Tuple[int, int] | None:
+    """
+        (first byte, last byte) of a single `bytes=` range. Other ranges (several, other units) and invalid
+        ones (last byte before the first) are ignored, and the whole content is sent, as RFC 9110 requires.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":  # Suffix range: the last N bytes
+        return max(size - int(match.group(2)), 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if match.group(2) and end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@app.get("/job/{uuid}/stream", status_code=status.HTTP_200_OK)
+async def stream_job_logs(uuid: str, last_event_id: str | None = Header(None), accept_encoding: str | None = Header(None)):
+    if last_event_id and not (last_event_id.isascii() and last_event_id.isdigit()):
+        raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID, expected a byte offset: {last_event_id}")
+    job_state = await run_in_threadpool(State.from_uuid, uuid)
+    await run_in_threadpool(job_state.refresh)  # 404 for unknown jobs, before the stream starts
+
+    offset = int(last_event_id) if last_event_id else 0
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept-Encoding"}
+    events = log_events(job_state, offset)
+    if accepts_gzip(accept_encoding):
+        events = gzip_events(events)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+
+async def gzip_events(events: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """
+        Gzips the event stream as a single gzip member. The compressor is flushed after each chunk
+        of events, so that none of them waits in its buffer, while keeping its history across chunks.
+    """
+    compressor = zlib.compressobj(LOG_COMPRESSION_LEVEL, wbits=zlib.MAX_WBITS | 16)  # | 16: gzip header and trailer
+    async for chunk in events:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def log_events(job_state: State, offset: int) -> AsyncIterator[str]:
+    """
+        Server-Sent Events stream of a job's logs. Each log line is sent as a message whose id is the
+        byte offset right after it, so that clients can resume with the Last-Event-ID header.
+        The run status is only read when no new logs are available, and an `end` event is sent once
+        the run is over and no new logs were written for LOG_STREAM_END_GRACE seconds.
+        While no new logs are written, the poll interval doubles up to LOG_STREAM_MAX_POLL_INTERVAL.
+    """
+    last_sent_at = time.monotonic()
+    idle_since = None
+    poll_interval = LOG_STREAM_POLL_INTERVAL
+
+    while True:
+        logs, byte_length = await run_in_threadpool(job_state.run_logs.get, offset)
+
+        if byte_length != 0:
+            events = []
+            for log in logs:
+                offset += len(log.encode('utf-8')) + 1
+                # A \r ends an event's data line: each part of the line is sent in its own one
+                data = "".join(f"data: {part}\n" for part in log.split("\r"))
+                events.append(f"id: {offset}\n{data}\n")
+            yield "".join(events)  # One chunk per poll
+            last_sent_at = time.monotonic()
+            idle_since = None
+            poll_interval = LOG_STREAM_POLL_INTERVAL
+        else:
+            snapshot = await run_in_threadpool(job_state.refresh)
+            if snapshot.run_status in TERMINAL_RUN_STATUSES:
+                idle_since = time.monotonic() if idle_since is None else idle_since
+                if time.monotonic() - idle_since >= LOG_STREAM_END_GRACE:
+                    yield f"event: end\nid: {offset}\ndata: {snapshot.run_status}\n\n"
+                    return
+
+            if time.monotonic() - last_sent_at >= LOG_STREAM_HEARTBEAT:
+                yield ": keep-alive\n\n"
+                last_sent_at = time.monotonic()
+            poll_interval = min(poll_interval * 2, LOG_STREAM_MAX_POLL_INTERVAL)
+
+        await asyncio.sleep(poll_interval)
+
+
+@app.post("/artifacts/missing", status_code=status.HTTP_200_OK)
+def get_missing_artifacts(hashes: List[str] = Body(..., embed=True)):
+    artifact_store = ArtifactStore(CloudStorage(bucket_name=BUCKET_NAME))
+    try:
+        missing = artifact_store.missing(hashes)
+    except InvalidArtifact as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    return {"missing": missing}
 
 
 @app.post("/schedule", status_code=status.HTTP_201_CREATED)
-async def schedule_run(scheduled_dbt_command: ScheduledDbtCommand = Depends()):
+def schedule_run(background_tasks: BackgroundTasks, scheduled_dbt_command: ScheduledDbtCommand = Depends()):
     logger = DbtLogger(server=True)
     logger.log("INFO", f"Received scheduled command: {scheduled_dbt_command.user_command}")
 
     state = State(scheduled_dbt_command)
     logger.log("INFO", f"Assigned job id: '{state.uuid}'")
     logger.state = state
-    state.extract_artifacts(scheduled_dbt_command.zipped_artifacts)
+    try:
+        state.extract_artifacts(scheduled_dbt_command.zipped_artifacts, scheduled_dbt_command.artifacts)
+        if scheduled_dbt_command.manifest_delta is not None:
+            state.apply_manifest_delta(scheduled_dbt_command.manifest_delta, scheduled_dbt_command.manifest_hash)
+        else:
+            state.save_manifest_msgpack()
+    except (InvalidArtifact, MissingArtifacts) as e:
+        traceback_str = traceback.format_exc()
+        raise HTTPException(status_code=400, detail=f"{e.args[0]}\n{traceback_str}")
 
     scheduler = CloudScheduler(project_id=PROJECT_ID, location=LOCATION, service_account_email=SERVICE_ACCOUNT)
     job_to_schedule = SchedulerHTTPJobSpec(
@@ -109,18 +442,32 @@ async def schedule_run(scheduled_dbt_command: ScheduledDbtCommand = Depends()):
         description=f"{SCHEDULED_JOB_DESC_PREFIX}{scheduled_dbt_command.user_command}"
     )
     scheduler.create_http_scheduled_job(job_to_schedule)
+    state.schedule_name = job_to_schedule.job_name
+    background_tasks.add_task(warm_package_cache, scheduled_dbt_command, logger)
 
 
     return {
         "uuid": state.uuid,
+        "manifest_hash": state.artifacts.get("manifest.json"),
         "message": f"Job {scheduled_dbt_command.user_command} scheduled at {scheduled_dbt_command.schedule} ({get_description(scheduled_dbt_command.schedule)}) with uuid: {state.uuid}",
         "links": {
             "start": f"{scheduled_dbt_command.server_url}schedule/{state.uuid}/start",
         }
     }
 
+def warm_package_cache(dbt_command: DbtCommand, logger: DbtLogger):
+    """
+        Installs the schedule's dbt packages once, so that its runs unpack them instead of running `dbt deps`.
+    """
+    packages_yml = yaml.dump(dbt_command.packages).encode('utf-8')
+    try:
+        PackageCache(CloudStorage(bucket_name=BUCKET_NAME)).warm(dbt_command.dbt_project, dbt_command.profiles, packages_yml)
+    except Exception:
+        logger.logger.warning(f"Could not pre-warm the dbt package cache:\n{traceback.format_exc()}")
+
+
 @app.get("/schedule", status_code=status.HTTP_200_OK)
-async def list_schedules():
+def list_schedules():
     scheduler = CloudScheduler(project_id=PROJECT_ID, location=LOCATION, service_account_email=SERVICE_ACCOUNT)
     schedules = scheduler.list()
 
@@ -138,7 +485,7 @@ async def list_schedules():
     }
 
 @app.delete("/schedule/{name}", status_code=status.HTTP_200_OK)
-async def list_schedules(name):
+def list_schedules(name):
     scheduler = CloudScheduler(project_id=PROJECT_ID, location=LOCATION, service_account_email=SERVICE_ACCOUNT)
     deleted = scheduler.delete(name)
 
@@ -147,34 +494,45 @@ async def list_schedules(name):
     }
 
 @app.post("/schedule/{uuid}/start", status_code=status.HTTP_200_OK)
-async def start_scheduled_run(uuid: str):
+@tracer.start_as_current_span("start_scheduled_run")
+def start_scheduled_run(uuid: str):
     state = State.from_schedule_uuid(uuid)
+    trace.get_current_span().set_attribute("dbt.uuid", state.uuid)
     logger = DbtLogger(server=True)
     logger.state = state
     logger.log("INFO", f"Assigned job id: '{state.uuid}'")
     logger.log("INFO", f"Starting scheduled job with command: {state.user_command}")
 
     try:
-        job_conf = DbtCloudRunJobConfig(
-            uuid=state.uuid,
-            dbt_command=state.user_command,
-            project_id=PROJECT_ID,
-            location=LOCATION,
-            service_account=SERVICE_ACCOUNT,
-            job_docker_image=DOCKER_IMAGE,
-            artifacts_bucket_name=BUCKET_NAME
-        )
-        DbtCloudRunJobStarter(job_conf, logger).start()
-    except (DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed) as e:
+        state.resolve_remote_state()
+        job_starter = get_job_starter_for(state, logger)
+        started = job_queue.submit(state.uuid, state.concurrency_key or "unknown", SCHEDULED_PRIORITY, with_current_context(job_starter.start))
+        job_watcher.watch(state.uuid)
+    except (DbtCloudRunJobCreationFailed, DbtCloudRunJobStartFailed, DbtLocalJobStartFailed, RemoteStateNotFound) as e:
         traceback_str = traceback.format_exc()
         raise HTTPException(status_code=400, detail=f"{e.args[0]}\n{traceback_str}")
 
     return {
         "uuid": state.uuid,
-        "message": f"Job created with uuid: {state.uuid}",
+        "message": f"Job {'created' if started else 'queued'} with uuid: {state.uuid}",
     }
 
 
+@app.get("/metrics", status_code=status.HTTP_200_OK)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/queue", status_code=status.HTTP_200_OK)
+async def queue_stats():
+    return job_queue.stats()
+
+
+@app.get("/local_jobs/dispatch", status_code=status.HTTP_200_OK)
+async def local_jobs_dispatch():
+    return {"executor": JOB_EXECUTOR, "warm_workers": LOCAL_JOB_WARM_WORKERS, "dispatch_latency": dispatch_stats.summary()}
+
+
 @app.get("/check", status_code=status.HTTP_200_OK)
 async def check():
     return { "response": f"Running dbt-server on port {PORT}"}
@@ -0,0 +1,185 @@
+import asyncio
+import io
+from pathlib import Path
+import threading
+import time
+from types import SimpleNamespace
+import zipfile
+
+import httpx
+import pytest
+
+from dbt_server import server
+from dbt_server.lib import state
+from dbt_server.lib.artifact_store import ArtifactStore, InvalidArtifact, MissingArtifacts, hash_bytes
+from dbt_server.lib.gcs import CloudStorage
+from dbt_server.lib.state import State, StateSnapshot
+
+
+class FakeBlob:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def download_to_filename(self, file_name):
+        Path(file_name).write_bytes(self.client.blobs[self.name])
+
+    def exists(self):
+        return self.name in self.client.blobs
+
+    def upload_from_string(self, data, **kwargs):
+        self.client.blobs[self.name] = data if isinstance(data, bytes) else data.encode('utf-8')
+
+    def upload_from_file(self, file_obj, size=None, **kwargs):
+        with self.client.lock:
+            self.client.uploading += 1
+            self.client.max_uploading = max(self.client.max_uploading, self.client.uploading)
+        time.sleep(0.02)
+        self.client.blobs[self.name] = file_obj.read()
+        self.client.streamed.append(self.name)
+        with self.client.lock:
+            self.client.uploading -= 1
+
+
+class FakeStorageClient:
+    def __init__(self, blobs=None):
+        self.blobs = blobs if blobs is not None else {}
+        self.streamed = []
+        self.lock = threading.Lock()
+        self.uploading = 0
+        self.max_uploading = 0
+
+    def bucket(self, bucket_name):
+        return SimpleNamespace(blob=lambda name: FakeBlob(self, name))
+
+    def list_blobs(self, bucket_name, prefix):
+        return [FakeBlob(self, name) for name in self.blobs if name.startswith(prefix)]
+
+
+def test_identical_artifacts_are_written_to_each_path(tmp_path):
+    seed, project = b"id,name\n1,a\n", b"name: p\n"
+    artifacts = {"seeds/a.csv": hash_bytes(seed), "seeds/b.csv": hash_bytes(seed), "dbt_project.yml": hash_bytes(project)}
+    client = FakeStorageClient({f"artifacts/{hash_bytes(seed)}": seed, f"artifacts/{hash_bytes(project)}": project})
+
+    ArtifactStore(CloudStorage("bucket", client)).download_all(artifacts, tmp_path)
+
+    assert (tmp_path / "seeds/a.csv").read_bytes() == seed
+    assert (tmp_path / "seeds/b.csv").read_bytes() == seed
+    assert (tmp_path / "dbt_project.yml").read_bytes() == b"name: p\n"
+
+
+def test_download_folder_keeps_relative_paths_and_filters(tmp_path):
+    client = FakeStorageClient({
+        "run/": b"",
+        "run/manifest.json": b"{}",
+        "run/seeds/a.csv": b"1\n",
+        "run/seeds/b.csv": b"1\n",
+        "run/logs/dbt.log": b"log",
+        "run/../escape.txt": b"",
+        "other/manifest.json": b"{}",
+    })
+
+    downloaded = CloudStorage("bucket", client).download_folder("run", tmp_path, exclude=["logs/*"])
+
+    assert sorted(path.relative_to(tmp_path).as_posix() for path in downloaded) == ["manifest.json", "seeds/a.csv", "seeds/b.csv"]
+    assert (tmp_path / "seeds/a.csv").read_bytes() == (tmp_path / "seeds/b.csv").read_bytes() == b"1\n"
+    assert not (tmp_path / "logs").exists()
+    assert not (tmp_path.parent / "escape.txt").exists()
+
+
+class FakeCollection:
+    def document(self, uuid):
+        return self
+
+    def update(self, fields):
+        pass
+
+
+def new_state(client):
+    job_state = State.__new__(State)
+    job_state.uuid = "uuid"
+    job_state.dbt_collection = FakeCollection()
+    job_state.artifact_store = ArtifactStore(CloudStorage("bucket", client))
+    job_state._snapshot = StateSnapshot(
+        uuid="uuid", run_status="created", user_command="run", dbt_native_params_overrides={}, cloud_storage_folder="folder", artifacts={},
+    )
+    return job_state
+
+
+def zipped(files):
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        for path, data in files.items():
+            zip_file.writestr(path, data)
+    return SimpleNamespace(file=zip_buffer)
+
+
+def test_zip_members_are_streamed_as_bytes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    latin1_seed = "id,name\n1,Zoë\n".encode('latin-1')
+    client = FakeStorageClient()
+    job_state = new_state(client)
+
+    job_state.extract_artifacts(zipped({"seeds/names.csv": latin1_seed, "models/model.sql": b"select 1"}))
+
+    assert job_state.artifacts == {"seeds/names.csv": hash_bytes(latin1_seed), "models/model.sql": hash_bytes(b"select 1")}
+    assert client.blobs[f"artifacts/{hash_bytes(latin1_seed)}"] == latin1_seed
+    assert sorted(client.streamed) == sorted(f"artifacts/{artifact_hash}" for artifact_hash in job_state.artifacts.values())
+    assert list(tmp_path.iterdir()) == []  # Nothing extracted to disk
+
+
+def test_uploads_are_bounded_by_the_worker_count(monkeypatch):
+    monkeypatch.setattr(state, "ARTIFACT_UPLOAD_WORKERS", 2)
+    client = FakeStorageClient()
+
+    new_state(client).extract_artifacts(zipped({f"models/model_{i}.sql": f"select {i}" for i in range(8)}))
+
+    assert len(client.streamed) == 8
+    assert client.max_uploading == 2
+
+
+def test_declared_artifacts_are_referenced_by_hash():
+    stored_seed = b"id\n1\n"
+    client = FakeStorageClient({f"artifacts/{hash_bytes(stored_seed)}": stored_seed})
+    job_state = new_state(client)
+
+    job_state.extract_artifacts(
+        zipped({"models/model.sql": b"select 1"}),
+        {"seeds/seed.csv": hash_bytes(stored_seed), "models/model.sql": hash_bytes(b"select 1")},
+    )
+
+    assert job_state.artifacts == {"seeds/seed.csv": hash_bytes(stored_seed), "models/model.sql": hash_bytes(b"select 1")}
+    assert client.streamed == [f"artifacts/{hash_bytes(b'select 1')}"]
+
+
+def test_declared_artifacts_neither_uploaded_nor_stored_are_rejected():
+    job_state = new_state(FakeStorageClient())
+
+    with pytest.raises(MissingArtifacts):
+        job_state.extract_artifacts(zipped({}), {"seeds/seed.csv": "c" * 64})
+    with pytest.raises(InvalidArtifact):
+        job_state.extract_artifacts(zipped({}), {"seeds/seed.csv": "not a hash"})
+    with pytest.raises(InvalidArtifact):
+        job_state.extract_artifacts(zipped({"../seed.csv": b"1"}))
+    assert job_state.artifacts == {}
+
+
+def post_missing(monkeypatch, client, hashes):
+    monkeypatch.setattr(server, "CloudStorage", lambda bucket_name: CloudStorage(bucket_name, client))
+
+    async def request():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+            return await http_client.post("/artifacts/missing", json={"hashes": hashes})
+
+    return asyncio.run(request())
+
+
+def test_missing_artifacts_handshake(monkeypatch):
+    client = FakeStorageClient({f"artifacts/{'a' * 64}": b"stored"})
+
+    response = post_missing(monkeypatch, client, ["a" * 64, "b" * 64, "b" * 64])
+
+    assert response.status_code == 200
+    assert response.json() == {"missing": ["b" * 64]}
+    assert post_missing(monkeypatch, client, ["../a"]).status_code == 400
@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+
+import pytest
+from google.api_core.exceptions import AlreadyExists, NotFound, PermissionDenied
+
+from dbt_server.lib import dbt_cloud_run_job
+from dbt_server.lib.dbt_cloud_run_job import (
+    DbtCloudRunJobConfig, DbtCloudRunJobCreationFailed, DbtCloudRunJobStarter, DbtCloudRunJobStartFailed,
+)
+
+
+class FakeJobsClient:
+    def __init__(self, existing_jobs=(), get_error=None, create_error=None, run_error=None):
+        self.jobs = set(existing_jobs)
+        self.get_error = get_error
+        self.create_error = create_error
+        self.run_error = run_error
+        self.gets, self.creates, self.runs = [], [], []
+
+    def get_job(self, name):
+        self.gets.append(name)
+        if self.get_error is not None:
+            raise self.get_error
+        if name not in self.jobs:
+            raise NotFound(name)
+        return SimpleNamespace(name=name)
+
+    def create_job(self, request):
+        self.creates.append(request)
+        if self.create_error is not None:
+            raise self.create_error
+        name = f"{request.parent}/jobs/{request.job_id}"
+        self.jobs.add(name)
+        return SimpleNamespace(result=lambda: SimpleNamespace(name=name))
+
+    def run_job(self, request):
+        self.runs.append(request)
+        if self.run_error is not None:
+            raise self.run_error
+
+
+class FakeLogger:
+    def log(self, severity, message):
+        pass
+
+
+@pytest.fixture
+def jobs_client(monkeypatch):
+    jobs_client = FakeJobsClient()
+    monkeypatch.setattr(dbt_cloud_run_job, "get_jobs_client", lambda: jobs_client)
+    monkeypatch.setattr(dbt_cloud_run_job, "known_runner_jobs", set())
+    return jobs_client
+
+
+def starter(uuid, dbt_command="run", reuse_job=True):
+    config = DbtCloudRunJobConfig(
+        uuid=uuid,
+        dbt_command=dbt_command,
+        project_id="project",
+        location="europe-west1",
+        service_account="runner@project.iam.gserviceaccount.com",
+        job_docker_image="europe-west1-docker.pkg.dev/project/repository/server-image",
+        artifacts_bucket_name="bucket",
+        reuse_job=reuse_job,
+    )
+    return DbtCloudRunJobStarter(config, FakeLogger(), SimpleNamespace(uuid=uuid, run_status="scheduled"))
+
+
+def env(container):
+    return {variable.name: variable.value for variable in container.env}
+
+
+def test_runs_reuse_one_runner_job_with_their_own_env(jobs_client):
+    first, second = starter("uuid-1", "run"), starter("uuid-2", "build --select my_model")
+
+    first.start()
+    second.start()
+
+    assert len(jobs_client.creates) == 1
+    runner_job = jobs_client.creates[0]
+    assert runner_job.job_id == first.runner_job_id()
+    assert env(runner_job.job.template.template.containers[0]) == {"SCRIPT": "dbt_server/dbt_run_job.py", "BUCKET_NAME": "bucket"}
+    assert len(jobs_client.gets) == 1  # The second run knows the runner job exists
+
+    runs = [(request.name, env(request.overrides.container_overrides[0])) for request in jobs_client.runs]
+    assert [name for name, _ in runs] == [f"projects/project/locations/europe-west1/jobs/{first.runner_job_id()}"] * 2
+    assert [(run_env["UUID"], run_env["DBT_COMMAND"]) for _, run_env in runs] == [("uuid-1", "run"), ("uuid-2", "build --select my_model")]
+    assert first.state.run_status == second.state.run_status == "running"
+
+
+def test_existing_runner_job_is_not_created_again(jobs_client):
+    job_starter = starter("uuid")
+    jobs_client.jobs.add(f"{job_starter.parent}/jobs/{job_starter.runner_job_id()}")
+
+    job_starter.start()
+
+    assert jobs_client.creates == []
+    assert len(jobs_client.runs) == 1
+
+
+def test_runner_job_created_concurrently_is_used(jobs_client):
+    jobs_client.create_error = AlreadyExists("runner job")
+
+    starter("uuid").start()
+
+    assert len(jobs_client.runs) == 1
+
+
+def test_runner_job_lookup_errors_fail_the_creation(jobs_client):
+    jobs_client.get_error = PermissionDenied("runner job")
+
+    with pytest.raises(DbtCloudRunJobCreationFailed):
+        starter("uuid").start()
+    assert jobs_client.runs == []
+
+
+def test_runner_jobs_differ_by_image_service_account_and_bucket(jobs_client):
+    job_starter = starter("uuid")
+    other_bucket = starter("uuid")
+    other_bucket.dbt_job_config.artifacts_bucket_name = "other-bucket"
+
+    assert job_starter.runner_job_id() == starter("other-uuid").runner_job_id()
+    assert job_starter.runner_job_id() != other_bucket.runner_job_id()
+
+
+def test_without_reuse_each_run_creates_its_job(jobs_client):
+    starter("12345678-aaaa", "run", reuse_job=False).start()
+
+    create, = jobs_client.creates
+    assert create.job_id == "u12345678aaaa"
+    assert env(create.job.template.template.containers[0])["DBT_COMMAND"] == "run"
+    run, = jobs_client.runs
+    assert run.name.endswith("/jobs/u12345678aaaa")
+    assert not run.overrides.container_overrides
+
+
+def test_start_failure_does_not_mark_the_run_running(jobs_client):
+    jobs_client.run_error = PermissionDenied("run")
+    job_starter = starter("uuid")
+
+    with pytest.raises(DbtCloudRunJobStartFailed):
+        job_starter.start()
+    assert job_starter.state.run_status == "scheduled"
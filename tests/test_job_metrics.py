@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+from prometheus_client import REGISTRY
+
+from dbt_server import dbt_run_job, server
+from dbt_server.lib import job_watcher
+from dbt_server.lib.job_watcher import JobWatcher
+
+
+JOB_METRICS = {"run_status": "success", "duration_seconds": 12.0, "log_lines": 3, "log_bytes": 40, "dropped_log_lines": 0}
+
+
+class FakeJobState:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **fields):
+        self.updates.append(fields)
+
+
+class FakeLogShipper:
+    def stats(self):
+        return {"shipped_lines": 3, "shipped_bytes": 40, "dropped_lines": 0}
+
+
+class FinishedState:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.run_status = "success"
+        self.metrics = JOB_METRICS
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+    def get_logs(self, offset=0, limit=None):
+        return [], offset
+
+
+def reported_jobs():
+    return REGISTRY.get_sample_value("dbt_server_job_duration_seconds_count", {"run_status": "success"}) or 0
+
+
+def test_final_status_is_written_with_the_run_metrics(monkeypatch):
+    job_state = FakeJobState()
+    monkeypatch.setattr(dbt_run_job, "state", job_state)
+    monkeypatch.setattr(dbt_run_job, "log_shipper", FakeLogShipper())
+
+    dbt_run_job.finish_run("success", 12.0)
+
+    assert job_state.updates == [{"run_status": "success", "metrics": JOB_METRICS}]
+
+
+def test_metrics_of_a_run_nobody_reads_are_reported_when_it_ends(monkeypatch):
+    run_statuses = {"watched-uuid": "running", "stuck-uuid": "running"}
+
+    class WatchedState(FinishedState):
+        def refresh(self):
+            self.run_status = run_statuses[self.uuid]
+            return self
+
+    monkeypatch.setattr(job_watcher, "State", WatchedState)
+    watcher = JobWatcher(poll_interval=3600, timeout=60)
+    watcher.watch("watched-uuid")
+    watcher.watch("stuck-uuid")
+    watcher.watched["stuck-uuid"] -= 120
+    before = reported_jobs()
+
+    watcher.report_finished()
+    assert reported_jobs() == before
+    assert list(watcher.watched) == ["watched-uuid"]
+
+    run_statuses["watched-uuid"] = "success"
+    watcher.report_finished()
+    watcher.report_finished()
+    assert reported_jobs() == before + 1
+    assert watcher.watched == {}
+
+
+def test_reading_the_logs_of_a_finished_run_does_not_report_it(monkeypatch):
+    monkeypatch.setattr(server, "State", FinishedState)
+
+    async def requests():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/job/read-uuid")
+            await client.get("/job/read-uuid/logs")
+
+    before = reported_jobs()
+    asyncio.run(requests())
+
+    assert reported_jobs() == before
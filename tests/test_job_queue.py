@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from dbt_server.lib import job_queue
+from dbt_server.lib.job_queue import AD_HOC_PRIORITY, SCHEDULED_PRIORITY, JobQueue
+
+
+class FakeDocument:
+    def __init__(self, documents, uuid):
+        self.documents = documents
+        self.uuid = uuid
+
+    def set(self, document):
+        self.documents[self.uuid] = dict(document)
+
+    def delete(self):
+        self.documents.pop(self.uuid, None)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+
+    def document(self, uuid):
+        return FakeDocument(self.documents, uuid)
+
+    def stream(self):
+        return [SimpleNamespace(to_dict=lambda document=document: dict(document)) for document in self.documents.values()]
+
+
+class FakeState:
+    run_statuses = {}
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+    @property
+    def run_status(self):
+        return self.run_statuses.get(self.uuid)
+
+    @run_status.setter
+    def run_status(self, run_status):
+        self.run_statuses[self.uuid] = run_status
+
+    def refresh(self):
+        return SimpleNamespace(uuid=self.uuid, run_status=self.run_status, metrics=None)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    FakeState.run_statuses = {}
+    monkeypatch.setattr(job_queue, "get_collection", lambda collection_name: collection)
+    monkeypatch.setattr(job_queue, "State", FakeState)
+    return collection
+
+
+def new_queue():
+    return JobQueue(max_running=1, poll_interval=3600)
+
+
+def test_queued_jobs_are_stored_until_they_end(collection):
+    queue = new_queue()
+    started = []
+
+    assert queue.submit("first", "target", AD_HOC_PRIORITY, lambda: started.append("first"))
+    assert not queue.submit("second", "target", AD_HOC_PRIORITY, lambda: started.append("second"))
+
+    assert {uuid: document["status"] for uuid, document in collection.documents.items()} == {"first": "running", "second": "queued"}
+    FakeState.run_statuses["first"] = "success"
+    queue.release_finished()
+    queue.dispatch()
+    assert started == ["first", "second"]
+    assert {uuid: document["status"] for uuid, document in collection.documents.items()} == {"second": "running"}
+
+
+def test_restarted_server_readmits_stored_jobs(collection):
+    previous_queue = new_queue()
+    previous_queue.submit("running", "target", AD_HOC_PRIORITY, lambda: None)
+    previous_queue.submit("ad hoc", "target", AD_HOC_PRIORITY, lambda: None)
+    previous_queue.submit("scheduled", "target", SCHEDULED_PRIORITY, lambda: None)
+    started = []
+
+    queue = new_queue()
+    assert queue.restore(lambda uuid: lambda: started.append(uuid)) == 2
+    queue.dispatch()
+    assert started == []  # The job running before the restart still holds the slot
+
+    for uuid in ["running", "scheduled"]:
+        FakeState.run_statuses[uuid] = "success"
+        queue.release_finished()
+        queue.dispatch()
+    assert started == ["scheduled", "ad hoc"]
+    assert list(collection.documents) == ["ad hoc"]
+
+
+def test_nothing_is_stored_without_limits(collection):
+    queue = JobQueue()
+
+    assert queue.submit("uuid", "target", AD_HOC_PRIORITY, lambda: None)
+    assert queue.restore(lambda uuid: lambda: None) == 0
+    assert collection.documents == {}
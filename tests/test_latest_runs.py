@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+import json
+
+import pytest
+
+from dbt_server.lib.latest_runs import REMOTE_STATE_FOLDER, LatestRuns, RemoteStateNotFound, reference_key, run_keys
+from dbt_server.lib.state import State, StateSnapshot
+
+
+STARTED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeStorage:
+    def __init__(self):
+        self.blobs = {}  # {name: (data, generation)}
+        self.generations = 0
+
+    def load(self, file_name, start_byte=0):
+        return self.blobs.get(file_name, (b'', 0))[0][start_byte:]
+
+    def load_with_generation(self, file_name):
+        return self.blobs.get(file_name, (b'', 0))
+
+    def save_if_generation(self, file_name, data, generation, metadata=None):
+        if self.blobs.get(file_name, (b'', 0))[1] != generation:
+            return False
+        self.generations += 1
+        self.blobs[file_name] = (data.encode('utf-8'), self.generations)
+        return True
+
+
+class RacedStorage(FakeStorage):
+    """
+        Another run replaces the pointer between the first read and write of this run.
+    """
+
+    def __init__(self, other_run):
+        super().__init__()
+        self.other_run = other_run
+
+    def load_with_generation(self, file_name):
+        current = super().load_with_generation(file_name)
+        if self.other_run is not None:
+            other_run, self.other_run = self.other_run, None
+            super().save_if_generation(file_name, json.dumps(other_run), current[1])
+        return current
+
+
+class FakeCollection:
+    def document(self, uuid):
+        return self
+
+    def update(self, fields):
+        pass
+
+
+def recorded_uuid(storage, key):
+    return json.loads(storage.load(LatestRuns(storage).blob_name(key)))["uuid"]
+
+
+def new_state(storage, remote_state, concurrency_key):
+    state = State.__new__(State)
+    state.uuid = "uuid"
+    state.gcs = storage
+    state.dbt_collection = FakeCollection()
+    state._snapshot = StateSnapshot(
+        uuid="uuid",
+        run_status="scheduled",
+        user_command="build --select state:modified+",
+        dbt_native_params_overrides={},
+        cloud_storage_folder="folder",
+        artifacts={"manifest.json": "a" * 64},
+        concurrency_key=concurrency_key,
+        remote_state=remote_state,
+    )
+    return state
+
+
+def test_reference_key():
+    assert reference_key("prod", "my_profile") == "target/my_profile/prod"
+    assert reference_key("schedule:nightly", "my_profile") == "schedule/nightly"
+    assert reference_key("schedule:nightly", None) == "schedule/nightly"
+    with pytest.raises(RemoteStateNotFound):
+        reference_key("prod", None)
+
+
+def test_run_keys():
+    assert run_keys("my_profile/prod") == ["target/my_profile/prod"]
+    assert run_keys("my_profile/prod", "nightly") == ["target/my_profile/prod", "schedule/nightly"]
+
+
+def test_run_ending_after_a_later_run_keeps_the_later_one():
+    storage = FakeStorage()
+    latest_runs = LatestRuns(storage)
+
+    latest_runs.record(["target/p/prod"], "later", "b" * 64, STARTED_AT + timedelta(minutes=5))
+    latest_runs.record(["target/p/prod"], "earlier", "a" * 64, STARTED_AT)
+
+    assert recorded_uuid(storage, "target/p/prod") == "later"
+
+
+def test_pointer_replaced_concurrently_is_read_again():
+    later_run = {"uuid": "later", "manifest": "b" * 64, "started_at": (STARTED_AT + timedelta(minutes=5)).isoformat()}
+    storage = RacedStorage(later_run)
+    latest_runs = LatestRuns(storage)
+
+    latest_runs.record(["target/p/prod"], "earlier", "a" * 64, STARTED_AT)
+
+    assert recorded_uuid(storage, "target/p/prod") == "later"
+
+
+def test_resolve_remote_state_adds_the_reference_manifest():
+    storage = FakeStorage()
+    LatestRuns(storage).record(["target/my_profile/prod"], "prod-run", "c" * 64, STARTED_AT)
+    state = new_state(storage, "prod", "my_profile/ci")
+
+    state.resolve_remote_state()
+
+    assert state.artifacts[f"{REMOTE_STATE_FOLDER}/manifest.json"] == "c" * 64
+    assert state.user_command == f"build --select state:modified+ --state {REMOTE_STATE_FOLDER}"
+
+
+def test_resolve_remote_state_without_a_recorded_run():
+    with pytest.raises(RemoteStateNotFound):
+        new_state(FakeStorage(), "prod", "my_profile/ci").resolve_remote_state()
+
+
+def test_resolve_remote_state_of_a_run_without_concurrency_key():
+    storage = FakeStorage()
+    LatestRuns(storage).record(["schedule/nightly"], "nightly-run", "c" * 64, STARTED_AT)
+
+    with pytest.raises(RemoteStateNotFound):
+        new_state(storage, "prod", None).resolve_remote_state()
+    state = new_state(storage, "schedule:nightly", None)
+    state.resolve_remote_state()
+    assert state.artifacts[f"{REMOTE_STATE_FOLDER}/manifest.json"] == "c" * 64
@@ -0,0 +1,164 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import dbt_server
+from dbt_server.lib import dbt_local_job
+from dbt_server.lib.dbt_local_job import DbtLocalJobStarter, DbtLocalJobStartFailed, run_local_job
+
+
+class FakeState:
+    documents = {}
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+    @property
+    def run_status(self):
+        return self.documents[self.uuid]
+
+    @run_status.setter
+    def run_status(self, run_status):
+        self.documents[self.uuid] = run_status
+
+    def refresh(self):
+        return self
+
+
+class FakeLogger:
+    def log(self, severity, message):
+        pass
+
+
+class FakePool:
+    """
+        Runs the job when it is submitted: it ends before the starter gets its future back.
+    """
+
+    def __init__(self, broken=False, job=None):
+        self.broken = broken
+        self.job = job or (lambda uuid: {"warm": True, "dispatch_seconds": 0.5, "failed": False})
+        self.submitted = []
+
+    def submit(self, function, uuid, *args):
+        if self.broken:
+            raise BrokenProcessPool("A worker process died")
+        self.submitted.append(uuid)
+        job = Future()
+        try:
+            job.set_result(self.job(uuid))
+        except BaseException as e:
+            job.set_exception(e)
+        return job
+
+
+@pytest.fixture
+def states(monkeypatch):
+    FakeState.documents = {}
+    monkeypatch.setattr(dbt_local_job, "State", FakeState)
+    monkeypatch.setattr(dbt_local_job, "dispatch_stats", dbt_local_job.DispatchStats())
+    return FakeState.documents
+
+
+def cached_pool(*pools):
+    """
+        Stand-in for get_local_pool: returns the given pools in turn, the next one after each cache_clear().
+    """
+    pools = list(pools)
+
+    def get_local_pool():
+        return pools[0]
+
+    def cache_clear():
+        if len(pools) > 1:
+            pools.pop(0)
+        else:
+            pools[0] = FakePool()
+
+    get_local_pool.cache_clear = cache_clear
+    return get_local_pool
+
+
+def start(monkeypatch, uuid, *pools):
+    monkeypatch.setattr(dbt_local_job, "get_local_pool", cached_pool(*pools))
+    FakeState.documents[uuid] = "scheduled"
+    DbtLocalJobStarter(SimpleNamespace(uuid=uuid, dbt_command="run"), FakeLogger(), FakeState(uuid)).start()
+
+
+def test_job_ending_before_start_returns_keeps_its_status(states, monkeypatch):
+    def job(uuid):
+        assert states[uuid] == "running"
+        states[uuid] = "success"
+        return {"warm": True, "dispatch_seconds": 0.5, "failed": False}
+
+    start(monkeypatch, "uuid", FakePool(job=job))
+
+    assert states["uuid"] == "success"
+    assert dbt_local_job.dispatch_stats.summary()["warm"]["jobs"] == 1
+
+
+def test_crashed_jobs_are_marked_failed(states, monkeypatch):
+    def job(uuid):
+        if uuid == "died":
+            raise BrokenProcessPool("A worker process died")
+        return {"warm": False, "dispatch_seconds": 2.0, "failed": True}
+
+    start(monkeypatch, "died", FakePool(job=job))
+    start(monkeypatch, "raised", FakePool(job=job))
+
+    assert states == {"died": "failed", "raised": "failed"}
+
+
+def test_failed_job_keeps_the_status_it_reached(states, monkeypatch):
+    def job(uuid):
+        states[uuid] = "success"  # Written by dbt_run_job before the cleanup failed
+        return {"warm": True, "dispatch_seconds": 0.5, "failed": True}
+
+    start(monkeypatch, "uuid", FakePool(job=job))
+
+    assert states["uuid"] == "success"
+
+
+def test_broken_pool_is_replaced(states, monkeypatch):
+    broken_pool, new_pool = FakePool(broken=True), FakePool()
+
+    start(monkeypatch, "uuid", broken_pool, new_pool)
+
+    assert broken_pool.submitted == []
+    assert new_pool.submitted == ["uuid"]
+    assert states["uuid"] == "running"
+
+
+def test_start_failure_marks_the_job_failed(states, monkeypatch):
+    with pytest.raises(DbtLocalJobStartFailed):
+        start(monkeypatch, "uuid", FakePool(broken=True), FakePool(broken=True))
+    assert states["uuid"] == "failed"
+
+
+def test_run_local_job_reports_failures_and_cleans_up(tmp_path, monkeypatch):
+    def run_job(uuid, dbt_command, traceparent):
+        open("target.log", "w").close()
+        if dbt_command == "fail":
+            raise SystemExit(1)
+
+    fake_run_job = SimpleNamespace(run_job=run_job)
+    monkeypatch.setattr(dbt_local_job, "preload_dbt_runtime", lambda: None)
+    monkeypatch.setitem(sys.modules, "dbt_server.dbt_run_job", fake_run_job)
+    monkeypatch.setattr(dbt_server, "dbt_run_job", fake_run_job, raising=False)
+    cwd = os.getcwd()
+
+    succeeded = run_local_job("ok", "run", str(tmp_path / "ok"), 0.0)
+    failed = run_local_job("fail", "fail", str(tmp_path / "fail"), 0.0)
+
+    assert (succeeded["warm"], succeeded["failed"]) == (True, False)
+    assert failed["failed"] is True
+    assert os.getcwd() == cwd
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from dbt_server.lib.log_shipper import LogShipper
+
+
+class FakeRunLogs:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.segments = []
+
+    def log(self, logs):
+        if self.fail:
+            return False
+        self.segments.append(list(logs))
+        return True
+
+    def lines(self):
+        return [line for segment in self.segments for line in segment]
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_flushes_as_soon_as_flush_size_is_pending():
+    run_logs = FakeRunLogs()
+    shipper = LogShipper(run_logs, flush_interval_ms=60000, flush_size_bytes=10).start()
+
+    for line in ["1234", "5678", "9012"]:  # 5 bytes each with the newline
+        shipper.submit(line)
+
+    assert wait_for(lambda: run_logs.segments == [["1234", "5678"]])
+    shipper.close()
+    assert run_logs.segments == [["1234", "5678"], ["9012"]]
+
+
+def test_flushes_pending_lines_every_interval():
+    run_logs = FakeRunLogs()
+    shipper = LogShipper(run_logs, flush_interval_ms=20).start()
+
+    shipper.submit("line")
+
+    assert wait_for(lambda: run_logs.segments == [["line"]])
+    shipper.close()
+
+
+def test_counts_lines_dropped_on_a_full_queue():
+    run_logs = FakeRunLogs()
+    shipper = LogShipper(run_logs, max_queue_size=1)  # Not started: nothing drains the queue
+
+    assert shipper.submit("kept")
+    assert not shipper.submit("dropped")
+
+    stats = shipper.stats()
+    assert stats["dropped_lines"] == 1
+    assert stats["backpressure_events"] == 1
+    assert stats["queued_lines"] == 1
+
+
+def test_counts_lines_of_failed_flushes_as_dropped():
+    shipper = LogShipper(FakeRunLogs(fail=True)).start()
+
+    shipper.submit("first")
+    shipper.submit("second")
+    shipper.close()
+
+    stats = shipper.stats()
+    assert stats["failed_flushes"] == 1
+    assert stats["dropped_lines"] == 2
+    assert stats["shipped_lines"] == 0
+
+
+def test_close_drains_the_queue_and_later_lines_are_written_directly():
+    run_logs = FakeRunLogs()
+    shipper = LogShipper(run_logs, flush_interval_ms=60000).start()
+
+    shipper.submit("queued")
+    shipper.close()
+    shipper.submit("after close")
+    shipper.close()
+
+    assert run_logs.segments == [["queued"], ["after close"]]
+    assert shipper.stats()["shipped_lines"] == 2
+
+
+def test_no_line_is_lost_when_closed_while_submitting():
+    run_logs = FakeRunLogs()
+    shipper = LogShipper(run_logs, flush_interval_ms=1).start()
+    submitters = [
+        threading.Thread(target=lambda worker=worker: [shipper.submit(f"{worker}-{i}") for i in range(2000)])
+        for worker in range(4)
+    ]
+
+    for submitter in submitters:
+        submitter.start()
+    shipper.close()
+    for submitter in submitters:
+        submitter.join()
+
+    assert len(run_logs.lines()) + shipper.stats()["dropped_lines"] == 8000
@@ -0,0 +1,147 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+import zlib
+
+import httpx
+
+from dbt_server import server
+from dbt_server.lib.state import JobNotFound
+from dbt_server.server import accepts_gzip, gzip_events
+
+
+class FakeRunLogs:
+    def __init__(self, logs):
+        self.logs = logs
+
+    def get(self, offset=0, limit=None):
+        data = "".join(f"{log}\n" for log in self.logs).encode('utf-8')[offset:]
+        return data.decode('utf-8').split("\n")[:-1], len(data)
+
+
+class FakeState:
+    logs = []
+    metrics = None
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.run_logs = FakeRunLogs(self.logs)
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+    @property
+    def run_status(self):
+        return "success"
+
+    def get_logs(self, offset=0, limit=None):
+        logs, byte_length = self.run_logs.get(offset)
+        logs = logs[:limit]
+        return logs, offset + sum(len(log.encode('utf-8')) + 1 for log in logs)
+
+    def refresh(self):
+        return SimpleNamespace(uuid=self.uuid, run_status="success", metrics=None)
+
+
+class UnknownState:
+    """
+        A job without a Firestore document: reading its State raises JobNotFound.
+    """
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+    def __getattr__(self, name):
+        raise JobNotFound(f"Job {self.uuid} not found")
+
+
+def get(path, headers=None):
+    async def request():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(request())
+
+
+def test_unknown_jobs_are_404s(monkeypatch):
+    monkeypatch.setattr(server, "State", UnknownState)
+
+    for path in ["", "/logs", "/last_logs", "/stream", "/profile", "/artifacts", "/artifacts/run_results.json"]:
+        response = get(f"/job/unknown{path}")
+        assert response.status_code == 404, path
+        assert response.json() == {"detail": "Job unknown not found"}
+
+
+def test_stream_rejects_an_invalid_last_event_id(monkeypatch):
+    monkeypatch.setattr(server, "State", FakeState)
+
+    assert get("/job/uuid/stream", headers={"Last-Event-ID": "abc"}).status_code == 400
+    assert get("/job/uuid/stream", headers={"Last-Event-ID": "-1"}).status_code == 400
+
+
+def test_stream_sends_carriage_return_separated_parts_as_data_lines(monkeypatch):
+    monkeypatch.setattr(server, "State", type("RunState", (FakeState,), {"logs": ["50%\r100%", "done"]}))
+    monkeypatch.setattr(server, "LOG_STREAM_END_GRACE", 0)
+
+    response = get("/job/uuid/stream")
+
+    assert response.text.split("\n\n")[:3] == ["id: 9\ndata: 50%\ndata: 100%", "id: 14\ndata: done", "event: end\nid: 14\ndata: success"]
+
+
+def test_only_full_log_pages_are_cached(monkeypatch):
+    monkeypatch.setattr(server, "State", type("RunState", (FakeState,), {"logs": ["first", "second", "third"]}))
+
+    full_page = get("/job/uuid/logs?offset=0&limit=2")
+    last_page = get("/job/uuid/logs?offset=13&limit=2")  # The run is over, but its last lines may still be written
+
+    assert full_page.json()["run_logs"] == ["first", "second"]
+    assert "immutable" in full_page.headers["Cache-Control"]
+    assert "run_status" not in full_page.json()  # It changes, and the page is cached
+    assert last_page.json()["run_logs"] == ["third"]
+    assert last_page.headers["Cache-Control"] == "no-cache"
+    assert last_page.json()["run_status"] == "success"
+
+
+def test_accepts_gzip():
+    assert accepts_gzip("gzip")
+    assert accepts_gzip("deflate, gzip;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip(None)
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("gzip; q=0.0, identity")
+    assert not accepts_gzip("*;q=0")
+    assert not accepts_gzip("br, *;q=0")
+
+
+def test_gzipped_events_can_be_decoded_as_they_arrive():
+    events = ["id: 6\ndata: first\n\n", "id: 13\ndata: second\n\n"]
+
+    async def event_stream():
+        for event in events:
+            yield event
+
+    async def collect():
+        return [chunk async for chunk in gzip_events(event_stream())]
+
+    chunks = asyncio.run(collect())
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+
+    assert [decompressor.decompress(chunk).decode('utf-8') for chunk in chunks[:2]] == events
+    assert gzip.decompress(b"".join(chunks)).decode('utf-8') == "".join(events)
+
+
+def test_stream_is_not_gzipped_when_refused(monkeypatch):
+    monkeypatch.setattr(server, "State", type("RunState", (FakeState,), {"logs": ["done"]}))
+    monkeypatch.setattr(server, "LOG_STREAM_END_GRACE", 0)
+
+    response = get("/job/uuid/stream", headers={"Accept-Encoding": "gzip;q=0, identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.text.startswith("id: 5\ndata: done\n\n")
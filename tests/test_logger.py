@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+from dbt_server.lib import logger
+from dbt_server.lib.logger import DbtLogger
+
+
+class FakeCloudLoggingHandler(logging.Handler):
+    def __init__(self, client, resource=None, labels=None):
+        super().__init__()
+        self.resource = resource
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def metadata_lookups(monkeypatch):
+    metadata_lookups = []
+
+    def retrieve_metadata_server(key):
+        metadata_lookups.append(key)
+        return "projects/123/regions/europe-west1" if key == logger._REGION_ID else "project"
+
+    monkeypatch.delenv("LOCAL", raising=False)
+    monkeypatch.setattr(logger, "get_logging_client", lambda: object())
+    monkeypatch.setattr(logger, "CloudLoggingHandler", FakeCloudLoggingHandler)
+    monkeypatch.setattr(logger, "retrieve_metadata_server", retrieve_metadata_server)
+    dbt_logger = logging.getLogger(logger.__name__)
+    handlers, filters, level = list(dbt_logger.handlers), list(dbt_logger.filters), dbt_logger.level
+    dbt_logger.setLevel(logging.INFO)
+    logger.init_logger.cache_clear()
+    logger.get_resource_labels.cache_clear()
+    yield metadata_lookups
+    dbt_logger.handlers, dbt_logger.filters = handlers, filters
+    dbt_logger.setLevel(level)
+    logger.init_logger.cache_clear()
+    logger.get_resource_labels.cache_clear()
+
+
+def cloud_handlers():
+    return [handler for handler in logging.getLogger(logger.__name__).handlers if isinstance(handler, FakeCloudLoggingHandler)]
+
+
+def test_loggers_share_one_handler(metadata_lookups):
+    for _ in range(3):
+        DbtLogger(server=True).log("INFO", "Received command")
+
+    handler, = cloud_handlers()
+    assert [record.getMessage() for record in handler.records] == ["Initialized logger"] + ["Received command"] * 3
+    assert len([log_filter for log_filter in logging.getLogger(logger.__name__).filters if isinstance(log_filter, logger.JobContextFilter)]) == 1
+
+
+def test_metadata_server_is_queried_once(metadata_lookups):
+    labels = [logger.get_resource_labels() for _ in range(3)]
+
+    assert labels == [{"location": "europe-west1", "project_id": "project"}] * 3
+    assert len(metadata_lookups) == 2  # Region and project
+
+
+def test_job_handler_uses_the_cached_resource_labels(metadata_lookups, monkeypatch):
+    monkeypatch.setenv("UUID", "uuid")
+    monkeypatch.setenv("CLOUD_RUN_JOB", "dbt-server-runner")
+    logger.get_resource_labels()
+
+    DbtLogger().log("INFO", "Running dbt")
+
+    handler, = cloud_handlers()
+    assert handler.resource.labels == {"job_name": "dbt-server-runner", "location": "europe-west1", "project_id": "project", "uuid": "uuid"}
+    assert len(metadata_lookups) == 2
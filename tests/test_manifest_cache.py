@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+from dbt.contracts.graph.manifest import Manifest
+from dbt.contracts.graph.nodes import ModelNode
+
+from dbt_server import dbt_run_job
+
+
+class FakeLogger:
+    def log(self, severity, message):
+        pass
+
+
+def model(name, materialized="view"):
+    return ModelNode.from_dict({
+        "resource_type": "model",
+        "name": name,
+        "unique_id": f"model.project.{name}",
+        "package_name": "project",
+        "path": f"{name}.sql",
+        "original_file_path": f"models/{name}.sql",
+        "fqn": ["project", name],
+        "schema": "dataset",
+        "database": "project",
+        "alias": name,
+        "checksum": {"name": "sha256", "checksum": name},
+        "raw_code": "select 1",
+        "language": "sql",
+        "config": {"materialized": materialized},
+    })
+
+
+@pytest.fixture
+def job_context(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dbt_run_job, "manifest_cache", type(dbt_run_job.manifest_cache)())
+    monkeypatch.setattr(dbt_run_job, "logger", FakeLogger())
+    monkeypatch.setattr(dbt_run_job, "state", SimpleNamespace(artifacts={"manifest.msgpack": "a" * 64}))
+    nodes = [model("base", materialized="ephemeral"), model("uses_base")]
+    manifest = Manifest(nodes={node.unique_id: node for node in nodes})
+    (tmp_path / "manifest.msgpack").write_bytes(manifest.to_msgpack())
+    return tmp_path
+
+
+def test_jobs_on_the_same_manifest_get_their_own_copy(job_context):
+    first_job_manifest = dbt_run_job.get_manifest()
+    first_job_manifest.build_flat_graph()  # What the first job's run does to it
+    compiled = first_job_manifest.nodes["model.project.uses_base"]
+    compiled.extra_ctes_injected = True
+    compiled.compiled_code = "with base as (select 1) select * from base"
+    (job_context / "manifest.msgpack").unlink()
+
+    second_job_manifest = dbt_run_job.get_manifest()
+
+    assert second_job_manifest is not first_job_manifest
+    assert second_job_manifest.flat_graph == {}
+    assert not second_job_manifest.nodes["model.project.uses_base"].extra_ctes_injected
+    assert second_job_manifest.nodes["model.project.uses_base"].compiled_code is None
+    assert set(second_job_manifest.nodes) == {"model.project.base", "model.project.uses_base"}
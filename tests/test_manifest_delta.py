@@ -0,0 +1,161 @@
+import hashlib
+import io
+import json
+from types import SimpleNamespace
+import zipfile
+
+import pytest
+
+from dbt_remote.src import manifest_delta as client
+from dbt_remote.src.dbt_server import DbtServer, DbtServerCommand
+from dbt_server.lib import manifest_delta as server
+from dbt_server.lib.artifact_store import InvalidArtifact
+from dbt_server.lib.state import State, StateSnapshot
+
+
+BASE_MANIFEST = {
+    "metadata": {"dbt_version": "1.7.9", "generated_at": "2024-01-01T00:00:00Z"},
+    "nodes": {"model.p.a": {"raw_code": "select 1"}, "model.p.c": {"raw_code": "select 3"}},
+    "sources": {"source.p.raw": {"name": "raw"}},
+    "exposures": {},
+}
+
+
+def test_manifest_rebuilt_from_a_delta_has_the_clients_hash():
+    manifest = {
+        "metadata": {"dbt_version": "1.7.9", "generated_at": "2024-01-02T00:00:00Z"},
+        "nodes": {"model.p.a": {"raw_code": "select 1"}, "model.p.b": {"raw_code": "select 2"}, "model.p.c": {"raw_code": "select 33"}},
+        "exposures": {},
+        "semantic_models": {},
+    }
+    delta = client.compute_manifest_delta(BASE_MANIFEST, manifest, "base-hash")
+
+    rebuilt = server.apply_manifest_delta(BASE_MANIFEST, delta)
+
+    assert rebuilt == manifest
+    assert hashlib.sha256(server.serialize_manifest(rebuilt)).hexdigest() == hashlib.sha256(client.serialize_manifest(manifest)).hexdigest()
+
+
+MANIFEST = {**BASE_MANIFEST, "nodes": {**BASE_MANIFEST["nodes"], "model.p.b": {"raw_code": "select 2"}}}
+
+
+def manifest_hash(manifest):
+    return hashlib.sha256(client.serialize_manifest(manifest)).hexdigest()
+
+
+class FakeArtifactStore:
+    def __init__(self, *manifests):
+        self.blobs = {manifest_hash(manifest): client.serialize_manifest(manifest) for manifest in manifests}
+
+    def missing(self, hashes):
+        return [artifact_hash for artifact_hash in hashes if artifact_hash not in self.blobs]
+
+    def load(self, artifact_hash):
+        return self.blobs[artifact_hash]
+
+    def save(self, data):
+        self.blobs[hashlib.sha256(data).hexdigest()] = data
+        return hashlib.sha256(data).hexdigest()
+
+    def get_derived(self, artifact_hash, kind):
+        return None
+
+    def set_derived(self, artifact_hash, kind, derived_hash):
+        pass
+
+
+class FakeCollection:
+    def document(self, uuid):
+        return self
+
+    def update(self, fields):
+        pass
+
+
+def new_state(artifact_store):
+    job_state = State.__new__(State)
+    job_state.uuid = "uuid"
+    job_state.dbt_collection = FakeCollection()
+    job_state.artifact_store = artifact_store
+    job_state._snapshot = StateSnapshot(
+        uuid="uuid", run_status="created", user_command="run", dbt_native_params_overrides={}, cloud_storage_folder="folder", artifacts={},
+    )
+    return job_state
+
+
+def uploaded_delta(manifest):
+    delta = client.compute_manifest_delta(BASE_MANIFEST, manifest, manifest_hash(BASE_MANIFEST))
+    return SimpleNamespace(file=io.BytesIO(json.dumps(delta).encode('utf-8')))
+
+
+def test_state_rebuilds_the_manifest_with_the_expected_hash():
+    artifact_store = FakeArtifactStore(BASE_MANIFEST)
+    job_state = new_state(artifact_store)
+
+    job_state.apply_manifest_delta(uploaded_delta(MANIFEST), manifest_hash(MANIFEST))
+
+    assert job_state.artifacts["manifest.json"] == manifest_hash(MANIFEST)
+    assert json.loads(artifact_store.blobs[manifest_hash(MANIFEST)]) == MANIFEST
+
+
+def test_state_rejects_a_rebuilt_manifest_with_another_hash():
+    artifact_store = FakeArtifactStore(BASE_MANIFEST)
+    job_state = new_state(artifact_store)
+
+    with pytest.raises(InvalidArtifact):
+        job_state.apply_manifest_delta(uploaded_delta(MANIFEST), manifest_hash(BASE_MANIFEST | {"nodes": {}}))
+    assert job_state.artifacts == {}
+    assert list(artifact_store.blobs) == [manifest_hash(BASE_MANIFEST)]
+
+
+class FakeSession:
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.commands = []
+
+    def post(self, url, data=None, files=None, **kwargs):
+        if url.endswith("artifacts/missing"):
+            return SimpleNamespace(status_code=200, raise_for_status=lambda: None, json=lambda: {"missing": [manifest_hash(MANIFEST)]})
+        self.commands.append((data, files))
+        status_code = self.status_codes.pop(0)
+        body = {"detail": "Manifest rebuilt from the delta does not match"} if status_code == 400 else {"uuid": "uuid", "manifest_hash": data.get("manifest_hash", manifest_hash(MANIFEST))}
+        return SimpleNamespace(status_code=status_code, text=json.dumps(body))
+
+
+def send(tmp_path, status_codes):
+    (tmp_path / "dbt_project.yml").write_text("name: p\nprofile: p\n")
+    (tmp_path / "profiles.yml").write_text("p:\n  target: dev\n")
+    (tmp_path / "seeds").mkdir()
+    (tmp_path / "manifest.json").write_text(json.dumps(MANIFEST, indent=2))
+    base_manifest = tmp_path / "base_manifest.json"
+    base_manifest.write_text(json.dumps(BASE_MANIFEST))
+    client.ManifestBaseCache(tmp_path / "cache").save(manifest_hash(BASE_MANIFEST), base_manifest)
+
+    command = DbtServerCommand(
+        user_command="run", dbt_native_params_overrides="{}", dbt_project=tmp_path / "dbt_project.yml", profiles=tmp_path / "profiles.yml",
+        packages=None, manifest=tmp_path / "manifest.json", seeds=tmp_path / "seeds", cache_dir=tmp_path / "cache",
+    )
+    dbt_server = DbtServer.__new__(DbtServer)
+    dbt_server.server_url = "http://server/"
+    dbt_server.auth_session = FakeSession(status_codes)
+    dbt_server.send_command(command)
+    return dbt_server.auth_session.commands
+
+
+def test_client_sends_the_delta_with_the_manifest_hash(tmp_path):
+    (data, files), = send(tmp_path, [202])
+
+    assert data["manifest_hash"] == manifest_hash(MANIFEST)
+    assert "manifest.json" not in json.loads(data["artifacts"])
+    assert "manifest_delta" in files
+    assert client.ManifestBaseCache(tmp_path / "cache").hash == manifest_hash(MANIFEST)
+
+
+def test_client_sends_the_whole_manifest_when_the_delta_is_rejected(tmp_path):
+    (_, delta_files), (data, files) = send(tmp_path, [400, 202])
+
+    assert "manifest_delta" in delta_files
+    assert "manifest_hash" not in data and "manifest_delta" not in files
+    assert json.loads(data["artifacts"])["manifest.json"] == manifest_hash(MANIFEST)
+    with zipfile.ZipFile(files["zipped_artifacts"]) as zipped_artifacts:
+        assert json.loads(zipped_artifacts.read("manifest.json")) == MANIFEST
@@ -0,0 +1,42 @@
+from dbt_server.lib import package_cache
+from dbt_server.lib.package_cache import PackageCache, is_pinned
+
+
+PINNED = b"""
+packages:
+  - package: dbt-labs/dbt_utils
+    version: 1.1.1
+  - git: https://github.com/dbt-labs/dbt-audit-helper.git
+    revision: 0123456789abcdef0123456789abcdef01234567
+  - local: ../shared
+"""
+
+VERSION_RANGE = b"""
+packages:
+  - package: dbt-labs/dbt_utils
+    version: [">=1.0.0", "<2.0.0"]
+"""
+
+GIT_BRANCH = b"""
+packages:
+  - git: https://github.com/dbt-labs/dbt-audit-helper.git
+    revision: main
+"""
+
+
+def test_only_exact_versions_and_commits_are_pinned():
+    assert is_pinned(PINNED)
+    assert not is_pinned(VERSION_RANGE)
+    assert not is_pinned(GIT_BRANCH)
+
+
+def test_unpinned_packages_get_a_new_key_every_period(monkeypatch):
+    cache = PackageCache(gcs=None)
+    keys = {}
+    for now in [0, 1, package_cache.PACKAGE_CACHE_TTL]:
+        monkeypatch.setattr(package_cache.time, "time", lambda: now)
+        keys[now] = (cache.key(PINNED), cache.key(VERSION_RANGE))
+
+    assert keys[0] == keys[1]
+    assert keys[0][0] == keys[package_cache.PACKAGE_CACHE_TTL][0]
+    assert keys[0][1] != keys[package_cache.PACKAGE_CACHE_TTL][1]
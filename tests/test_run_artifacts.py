@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+
+import httpx
+
+from dbt_server import server
+from dbt_server.server import parse_byte_range
+
+
+RUN_RESULTS = b'{"results": []}' * 10
+RUN_RESULTS_HASH = "a" * 64
+MANIFEST = b'{"nodes": {}}'
+MANIFEST_HASH = "b" * 64
+
+
+class FakeArtifactStore:
+    blobs = {RUN_RESULTS_HASH: gzip.compress(RUN_RESULTS), MANIFEST_HASH: MANIFEST}
+
+    def __init__(self):
+        self.reads = []
+
+    def load(self, artifact_hash, start_byte=0, end_byte=None):
+        self.reads.append((start_byte, end_byte))
+        data = self.blobs[artifact_hash]
+        return data[start_byte:] if end_byte is None else data[start_byte:end_byte + 1]
+
+    def size(self, artifact_hash):
+        return len(self.blobs[artifact_hash])
+
+
+class FakeState:
+    artifact_store = None
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.outputs = {"run_results.json": RUN_RESULTS_HASH}
+        self.artifacts = {"manifest.json": MANIFEST_HASH}
+
+    @classmethod
+    def from_uuid(cls, uuid):
+        return cls(uuid)
+
+
+def get(monkeypatch, path, headers=None):
+    artifact_store = FakeArtifactStore()
+    monkeypatch.setattr(server, "State", type("RunState", (FakeState,), {"artifact_store": artifact_store}))
+
+    async def request():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"Accept-Encoding": "identity", **(headers or {})})
+
+    return asyncio.run(request()), artifact_store.reads
+
+
+def test_parse_byte_range():
+    assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+    assert parse_byte_range("bytes=90-", 100) == (90, 99)
+    assert parse_byte_range("bytes=90-200", 100) == (90, 99)
+    assert parse_byte_range("bytes=-10", 100) == (90, 99)
+    assert parse_byte_range("bytes=-200", 100) == (0, 99)
+    assert parse_byte_range("bytes=100-", 100) == (100, 99)  # Unsatisfiable, answered with a 416
+
+
+def test_unsupported_ranges_are_ignored():
+    assert parse_byte_range("bytes=-", 100) is None
+    assert parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert parse_byte_range("items=0-1", 100) is None
+    assert parse_byte_range("bytes=10-5", 100) is None
+
+
+def test_outputs_are_sent_gzipped_only_to_clients_accepting_gzip(monkeypatch):
+    identity, _ = get(monkeypatch, "/job/uuid/artifacts/run_results.json")
+    gzipped, _ = get(monkeypatch, "/job/uuid/artifacts/run_results.json", {"Accept-Encoding": "gzip"})
+
+    assert identity.content == RUN_RESULTS
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.content == RUN_RESULTS  # Decoded by httpx
+    assert identity.headers["ETag"] == f'"{RUN_RESULTS_HASH}-identity"'
+    assert gzipped.headers["ETag"] == f'"{RUN_RESULTS_HASH}"'
+
+
+def test_unchanged_artifact_is_a_304_without_reading_it(monkeypatch):
+    response, reads = get(monkeypatch, "/job/uuid/artifacts/manifest.json", {"If-None-Match": f'"other", "{MANIFEST_HASH}"'})
+
+    assert response.status_code == 304
+    assert reads == []
+
+
+def test_range_of_stored_bytes_is_read_from_storage(monkeypatch):
+    response, reads = get(monkeypatch, "/job/uuid/artifacts/manifest.json", {"Range": "bytes=-3"})
+
+    assert response.status_code == 206
+    assert response.content == MANIFEST[-3:]
+    assert response.headers["Content-Range"] == f"bytes {len(MANIFEST) - 3}-{len(MANIFEST) - 1}/{len(MANIFEST)}"
+    assert reads == [(len(MANIFEST) - 3, len(MANIFEST) - 1)]
+
+
+def test_range_of_a_decompressed_output(monkeypatch):
+    response, _ = get(monkeypatch, "/job/uuid/artifacts/run_results.json", {"Range": "bytes=5-14"})
+
+    assert response.status_code == 206
+    assert response.content == RUN_RESULTS[5:15]
+    assert response.headers["Content-Range"] == f"bytes 5-14/{len(RUN_RESULTS)}"
+
+
+def test_range_past_the_end_is_a_416(monkeypatch):
+    response, reads = get(monkeypatch, "/job/uuid/artifacts/manifest.json", {"Range": f"bytes={len(MANIFEST)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(MANIFEST)}"
+    assert reads == []
+
+
+def test_invalid_range_sends_the_whole_artifact(monkeypatch):
+    for byte_range in ["bytes=0-1,4-5", "bytes=5-3"]:
+        response, _ = get(monkeypatch, "/job/uuid/artifacts/manifest.json", {"Range": byte_range})
+
+        assert response.status_code == 200
+        assert response.content == MANIFEST
@@ -0,0 +1,161 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+from dbt_server.lib import state
+from dbt_server.lib.state import DbtRunLogs, State, StateSnapshot, segment_size
+
+
+class FakeStorage:
+    def __init__(self):
+        self.blobs = {}
+
+    def create(self, file_name, data, metadata=None):
+        if file_name in self.blobs:
+            return False
+        self.blobs[file_name] = (data, metadata)
+        return True
+
+    def load(self, file_name, start_byte=0):
+        return self.blobs[file_name][0][start_byte:]
+
+    def list(self, prefix):
+        return [
+            SimpleNamespace(name=name, size=len(data), metadata=metadata)
+            for name, (data, metadata) in sorted(self.blobs.items()) if name.startswith(prefix)
+        ]
+
+
+class RetriedStorage(FakeStorage):
+    """
+        The first upload succeeds but its response is lost, so that its retry fails on the precondition.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.uploads = 0
+
+    def create(self, file_name, data, metadata=None):
+        self.uploads += 1
+        created = super().create(file_name, data, metadata)
+        return created and self.uploads > 1
+
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+
+    def document(self, uuid):
+        return self
+
+    def update(self, fields):
+        self.updates.append(fields)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(state, "CloudStorage", lambda bucket_name: storage)
+    return storage
+
+
+def offset_of(logs, line_number):
+    return sum(len(log.encode('utf-8')) + 1 for log in logs[:line_number])
+
+
+def test_offsets_are_byte_offsets_across_segments(storage):
+    run_logs = DbtRunLogs("uuid")
+    run_logs.log(["first", "second"])
+    run_logs.log(["third", "fourth é"])
+    run_logs.log(["fifth"])
+    all_logs = ["first", "second", "third", "fourth é", "fifth"]
+
+    assert run_logs.get() == (all_logs, offset_of(all_logs, 5))
+    assert run_logs.get(offset_of(all_logs, 3)) == (all_logs[3:], offset_of(all_logs, 5) - offset_of(all_logs, 3))
+    assert run_logs.get(offset_of(all_logs, 1), limit=2) == (all_logs[1:3], offset_of(all_logs, 3) - offset_of(all_logs, 1))
+    assert run_logs.get(offset_of(all_logs, 5)) == ([], 0)
+
+
+def test_read_segments_starts_within_a_segment(storage):
+    run_logs = DbtRunLogs("uuid")
+    run_logs.log(["a1", "a2"])
+    run_logs.log(["b1"])
+
+    assert list(run_logs.read_segments(3)) == [b"a2\n", b"b1\n"]
+    assert list(run_logs.read_segments(6)) == [b"b1\n"]
+
+
+def test_late_writer_appends_after_segments_already_read(storage):
+    server_logs, job_logs = DbtRunLogs("uuid"), DbtRunLogs("uuid")
+    server_logs.log(["server 1"])
+    job_logs.log(["job 1"])
+    logs, next_offset = server_logs.get()
+
+    server_logs.log(["server 2"])
+    job_logs.log(["job 2"])
+
+    assert logs == ["server 1", "job 1"]
+    assert server_logs.get(next_offset)[0] == ["server 2", "job 2"]
+
+
+def test_retried_upload_is_not_written_twice(monkeypatch):
+    storage = RetriedStorage()
+    monkeypatch.setattr(state, "CloudStorage", lambda bucket_name: storage)
+    run_logs = DbtRunLogs("uuid")
+
+    run_logs.log(["first"])
+    run_logs.log(["second"])
+
+    assert run_logs.get()[0] == ["first", "second"]
+
+
+def test_lines_are_only_split_on_newlines(storage):
+    run_logs = DbtRunLogs("uuid")
+    all_logs = ["progress\r50%\r100%", "form\x0cfeed", "line\u2028separator", "next"]
+    run_logs.log(all_logs)
+
+    assert run_logs.get() == (all_logs, offset_of(all_logs, 4))
+    assert run_logs.get(offset_of(all_logs, 3)) == (all_logs[3:], offset_of(all_logs, 4) - offset_of(all_logs, 3))
+
+
+def test_segment_size_is_the_uncompressed_size():
+    segment = SimpleNamespace(name="logs/uuid/00000000000000000000.txt.gz", size=30, metadata={"size": "120", "writer": "w"})
+
+    assert segment_size(segment) == 120
+
+
+def test_log_file_of_runs_created_before_segments_is_read(storage):
+    run_logs = DbtRunLogs("uuid")
+    storage.blobs["logs/uuid.txt"] = (b"first\nsecond\nthird", None)  # No trailing newline
+    all_logs = ["first", "second", "third"]
+
+    assert run_logs.get() == (all_logs, offset_of(all_logs, 3))
+    assert list(run_logs.read_segments(offset_of(all_logs, 1))) == [b"second\nthird\n"]
+    assert run_logs.get(offset_of(all_logs, 2)) == (all_logs[2:], offset_of(all_logs, 3) - offset_of(all_logs, 2))
+    assert run_logs.get(offset_of(all_logs, 3)) == ([], 0)
+
+
+def test_last_logs_cursor_is_kept_in_the_state(storage):
+    job_state = State.__new__(State)
+    job_state.uuid = "uuid"
+    job_state.run_logs = DbtRunLogs("uuid")
+    job_state.dbt_collection = FakeCollection()
+    job_state._snapshot = StateSnapshot.from_document({"uuid": "uuid", "run_status": "running"})
+    job_state.run_logs.log(["first", "second"])
+
+    assert job_state.get_last_logs() == ["first", "second"]
+    assert job_state.get_last_logs() == []
+    job_state.run_logs.log(["third"])
+    assert job_state.get_last_logs() == ["third"]
+    assert job_state.dbt_collection.updates == [{"log_starting_byte": 13}, {"log_starting_byte": 19}]
+
+
+def test_gzipped_segments_are_stored_compressed(storage):
+    run_logs = DbtRunLogs("uuid")
+    run_logs.log(["line"] * 100)
+
+    (data, metadata), = storage.blobs.values()
+    assert len(data) < 500
+    assert gzip.decompress(data) == b"line\n" * 100
+    assert metadata["size"] == "500"
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from dbt_server.lib.run_profile import RunProfile, critical_path
+
+
+def node(start, duration, depends_on=()):
+    return {"type": "model", "start": start, "duration": duration, "status": "success", "depends_on": list(depends_on)}
+
+
+def node_event(name, unique_id, node_status="success"):
+    node_info = SimpleNamespace(unique_id=unique_id, resource_type="model", node_status=node_status)
+    return SimpleNamespace(info=SimpleNamespace(name=name), data=SimpleNamespace(node_info=node_info))
+
+
+def test_critical_path_follows_the_slowest_dependency_chain():
+    nodes = {
+        "model.p.a": node(0, 5),
+        "model.p.b": node(0, 1),
+        "model.p.c": node(5, 2, ["model.p.a", "model.p.b"]),
+        "model.p.d": node(1, 4, ["model.p.b"]),
+        "model.p.e": node(7, 1, ["model.p.c"]),
+    }
+    assert critical_path(nodes) == ["model.p.a", "model.p.c", "model.p.e"]
+
+
+def test_critical_path_of_an_empty_run():
+    assert critical_path({}) == []
+
+
+def test_profile_only_keeps_finished_nodes():
+    profile = RunProfile()
+    profile.manifest = SimpleNamespace(nodes={
+        "model.p.b": SimpleNamespace(depends_on=SimpleNamespace(nodes=["model.p.a", "source.p.raw"])),
+    })
+    with profile.stage("invoke"):
+        for event in [node_event("NodeStart", "model.p.a"), node_event("NodeFinished", "model.p.a"),
+                      node_event("NodeStart", "model.p.b"), node_event("NodeFinished", "model.p.b", "error"),
+                      node_event("NodeStart", "model.p.c"), node_event("MainReportVersion", "")]:
+            profile.on_event(event)
+
+    result = profile.to_dict("uuid", "failed")
+
+    assert set(result["nodes"]) == {"model.p.a", "model.p.b"}
+    assert result["nodes"]["model.p.b"]["depends_on"] == ["model.p.a"]
+    assert result["nodes"]["model.p.b"]["status"] == "error"
+    assert "invoke" in result["stages"]
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+
+from dbt_server import server
+
+
+SUBMISSIONS = 5
+JOB_START_DURATION = 1.0
+
+
+class FakeState:
+    def __init__(self, dbt_command):
+        self.uuid = "00000000-0000-0000-0000-000000000000"
+
+        self.artifacts = {}
+        self.user_command = dbt_command.user_command
+
+    def extract_artifacts(self, zipped_artifacts, artifacts):
+        pass
+
+    def save_manifest_msgpack(self):
+        pass
+
+    def resolve_remote_state(self):
+        pass
+
+
+class FakeLogger:
+    def __init__(self, server=False):
+        self.state = None
+
+    def log(self, severity, message):
+        pass
+
+
+class SlowJobStarter:
+    def __init__(self, job_conf, logger, state=None):
+        pass
+
+    def start(self):
+        # Blocks like run_v2.JobsClient().create_job(...).result() does
+        time.sleep(JOB_START_DURATION)
+
+
+def test_check_stays_responsive_while_jobs_are_submitted(monkeypatch):
+    monkeypatch.setattr(server, "State", FakeState)
+    monkeypatch.setattr(server, "DbtLogger", FakeLogger)
+    monkeypatch.setattr(server, "get_job_starter", lambda executor, dbt_command: SlowJobStarter)
+    monkeypatch.setattr(server.job_watcher, "watch", lambda uuid: None)
+
+    async def submit(client):
+        return await client.post(
+            "/dbt",
+            data={
+                "server_url": "http://test/",
+                "user_command": "run",
+                "dbt_project": "{}",
+                "profiles": "{}",
+            },
+            files={"zipped_artifacts": ("artifacts.zip", b"", "application/zip")},
+        )
+
+    async def timed_check(client):
+        await asyncio.sleep(JOB_START_DURATION / 4)
+        start = time.monotonic()
+        response = await client.get("/check")
+        return response, time.monotonic() - start
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.monotonic()
+            *submissions, (check, check_duration) = await asyncio.gather(
+                *[submit(client) for _ in range(SUBMISSIONS)],
+                timed_check(client),
+            )
+            return submissions, check, check_duration, time.monotonic() - start
+
+    submissions, check, check_duration, total_duration = asyncio.run(scenario())
+
+    assert all(response.status_code == 202 for response in submissions)
+    assert check.status_code == 200
+    assert check_duration < JOB_START_DURATION / 4
+    assert total_duration < JOB_START_DURATION * SUBMISSIONS / 2
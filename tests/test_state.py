@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from dbt_server.lib import state
+from dbt_server.lib.state import JobNotFound, State
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, uuid):
+        self.collection = collection
+        self.uuid = uuid
+
+    def get(self):
+        self.collection.reads += 1
+        document = self.collection.documents.get(self.uuid)
+        return SimpleNamespace(to_dict=lambda: dict(document) if document is not None else None)
+
+    def set(self, document):
+        self.collection.writes += 1
+        self.collection.documents[self.uuid] = dict(document)
+
+    def update(self, fields):
+        self.collection.writes += 1
+        self.collection.documents[self.uuid].update(fields)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+        self.reads = 0
+        self.writes = 0
+
+    def document(self, uuid):
+        return FakeDocumentReference(self, uuid)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    collection.documents["uuid"] = {
+        "uuid": "uuid",
+        "run_status": "running",
+        "user_command": "run",
+        "dbt_native_params_overrides": {"threads": 4},
+        "cloud_storage_folder": "2026-01-01-uuid",
+        "artifacts": {"manifest.json": "a" * 64},
+    }
+    monkeypatch.setattr(state, "get_collection", lambda collection_name: collection)
+    monkeypatch.setattr(state, "CloudStorage", lambda bucket_name: None)
+    return collection
+
+
+def test_document_is_read_once_for_all_properties(collection):
+    job_state = State.from_uuid("uuid")
+    assert collection.reads == 0
+
+    assert job_state.run_status == "running"
+    assert job_state.user_command == "run"
+    assert job_state.dbt_native_params_overrides == {"threads": 4}
+    assert job_state.cloud_storage_folder == "2026-01-01-uuid"
+    assert job_state.artifacts == {"manifest.json": "a" * 64}
+    assert job_state.outputs == {}
+
+    assert collection.reads == 1
+
+
+def test_setters_write_through_to_firestore_and_the_snapshot(collection):
+    job_state = State.from_uuid("uuid")
+    job_state.snapshot
+
+    job_state.run_status = "success"
+    job_state.update(metrics={"duration_seconds": 1.0}, outputs={"run_results.json": "b" * 64})
+
+    assert collection.writes == 2
+    assert collection.reads == 1
+    assert job_state.run_status == "success"
+    assert job_state.metrics == {"duration_seconds": 1.0}
+    assert collection.documents["uuid"]["run_status"] == "success"
+    assert collection.documents["uuid"]["outputs"] == {"run_results.json": "b" * 64}
+
+
+def test_write_before_any_read_does_not_read(collection):
+    job_state = State.from_uuid("uuid")
+
+    job_state.run_status = "success"
+
+    assert collection.reads == 0
+    assert job_state.run_status == "success"
+    assert collection.reads == 1
+
+
+def test_other_processes_changes_are_only_seen_after_refresh(collection):
+    job_state = State.from_uuid("uuid")
+    assert job_state.run_status == "running"
+
+    collection.documents["uuid"]["run_status"] = "success"  # Written by the job
+
+    assert job_state.run_status == "running"
+    assert job_state.refresh().run_status == "success"
+    assert job_state.run_status == "success"
+    assert collection.reads == 2
+
+
+def test_refresh_of_an_unknown_job(collection):
+    with pytest.raises(JobNotFound):
+        State.from_uuid("unknown").refresh()
@@ -0,0 +1,59 @@
+import threading
+from types import SimpleNamespace
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from dbt_server.lib.tracing import DbtNodeSpans, context_from_traceparent, current_traceparent, tracer
+
+
+exporter = InMemorySpanExporter()
+provider = TracerProvider()
+provider.add_span_processor(SimpleSpanProcessor(exporter))
+trace.set_tracer_provider(provider)
+
+
+def node_event(name, unique_id, node_status):
+    node_info = SimpleNamespace(unique_id=unique_id, resource_type="model", materialized="table", node_status=node_status)
+    return SimpleNamespace(info=SimpleNamespace(name=name), data=SimpleNamespace(node_info=node_info))
+
+
+def finished_spans():
+    return {span.name: span for span in exporter.get_finished_spans()}
+
+
+def test_job_spans_continue_the_server_trace():
+    exporter.clear()
+    with tracer.start_as_current_span("run_command") as server_span:
+        traceparent = current_traceparent()
+
+    with tracer.start_as_current_span("run_job", context=context_from_traceparent(traceparent)):
+        pass
+
+    spans = finished_spans()
+    assert spans["run_job"].context.trace_id == server_span.get_span_context().trace_id
+    assert spans["run_job"].parent.span_id == server_span.get_span_context().span_id
+
+
+def test_dbt_nodes_become_children_of_the_invoke_span():
+    exporter.clear()
+    with tracer.start_as_current_span("dbt.invoke") as invoke_span:
+        node_spans = DbtNodeSpans()
+
+        def run_nodes():  # dbt sends node events from its worker threads
+            node_spans.on_event(node_event("NodeStart", "model.project.orders", "started"))
+            node_spans.on_event(node_event("NodeStart", "model.project.customers", "started"))
+            node_spans.on_event(node_event("NodeFinished", "model.project.orders", "success"))
+
+        worker = threading.Thread(target=run_nodes)
+        worker.start()
+        worker.join()
+        node_spans.end()
+
+    spans = finished_spans()
+    for node in ["model.project.orders", "model.project.customers"]:
+        assert spans[node].parent.span_id == invoke_span.get_span_context().span_id
+    assert spans["model.project.orders"].attributes["dbt.node_status"] == "success"
+    assert "dbt.node_status" not in spans["model.project.customers"].attributes